@@ -0,0 +1,88 @@
+"""
+Measures the memory used by existing and generated time entries, and by their diff, per time entry.
+
+Usage: PYTHONPATH=src python benchmarks/entries_memory.py [number of entries]
+"""
+import gc
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from kiss.clockify_model import ClockifyTimeEntry, ClockifyTimeNewEntry, ClockifyTimeInterval
+from kiss.time_entries_diff import TimeEntryDiff
+from kiss.time_entries_file import DateTimeInterval
+from kiss.time_entries_generator import GeneratedTimeEntry
+from kiss.utils import from_datetime_to_zulu_string
+
+
+def create_existing_entries(nb: int):
+    start = datetime(2020, 1, 1, 8)
+
+    return [
+        ClockifyTimeEntry.map({
+            'id': f'{index:024x}',
+            'description': 'TASK',
+            'projectId': '5e1c3a5d7a1b2c3d4e5f6a7b',
+            'tagIds': ['5e1c3a5d7a1b2c3d4e5f6a7c'],
+            'taskId': None,
+            'timeInterval': {
+                'start': from_datetime_to_zulu_string(start + timedelta(hours=index)),
+                'end': from_datetime_to_zulu_string(start + timedelta(hours=index + 1))
+            },
+            'workspaceId': '5e1c3a5d7a1b2c3d4e5f6a7d',
+            'userId': '5e1c3a5d7a1b2c3d4e5f6a7e'
+        })
+        for index in range(nb)
+    ]
+
+
+def create_diffs(nb: int):
+    start = datetime(2020, 1, 1, 8)
+    diffs = []
+
+    for index in range(nb):
+        interval = DateTimeInterval(start + timedelta(hours=index), start + timedelta(hours=index + 1))
+        diff = TimeEntryDiff(GeneratedTimeEntry(
+            'DEV_PRJ_Mobile whitelabel',
+            None,
+            None,
+            interval,
+            ['@ Office'],
+            ClockifyTimeNewEntry(
+                f'{index:024x}',
+                'TASK',
+                '5e1c3a5d7a1b2c3d4e5f6a7b',
+                '5e1c3a5d7a1b2c3d4e5f6a7e',
+                None,
+                ['5e1c3a5d7a1b2c3d4e5f6a7c'],
+                ClockifyTimeInterval(from_datetime_to_zulu_string(interval.from_date),
+                                     from_datetime_to_zulu_string(interval.to_date)),
+                '5e1c3a5d7a1b2c3d4e5f6a7d'
+            )
+        ))
+        diffs.append(diff)
+
+    return diffs
+
+
+def measure(name: str, create, nb: int) -> None:
+    gc.collect()
+    tracemalloc.start()
+
+    created = create(nb)
+
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{name}: {size / len(created):.0f} bytes per entry ({len(created)} entries)')
+
+
+def main():
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    measure('Existing time entries', create_existing_entries, nb)
+    measure('Generated time entries and their diff', create_diffs, nb)
+
+
+if __name__ == '__main__':
+    main()
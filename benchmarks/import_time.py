@@ -0,0 +1,101 @@
+"""
+Measures the startup of the command line: the time to import kiss, and to display the help. Modules only needed by
+commands (requests, tzlocal, the generator, the diff, ...) must not be imported at startup, the benchmark fails if one
+of them is, or if the import takes more than the optional budget.
+
+Usage: PYTHONPATH=src python benchmarks/import_time.py [number of runs] [budget in ms]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# modules that must only be imported by the commands needing them
+LAZY_MODULES = [
+    'requests',
+    'aiohttp',
+    'tzlocal',
+    'pytz',
+    'concurrent.futures.process',
+    'kiss.clockify_api',
+    'kiss.clockify_session',
+    'kiss.batch',
+    'kiss.fake_server',
+    'kiss.time_entries_generator',
+    'kiss.time_entries_diff',
+    'kiss.time_entries_checker',
+    'kiss.time_entries_reporter',
+    'kiss.user_settings',
+]
+
+
+def run(arguments) -> subprocess.CompletedProcess:
+    # no config file is needed to start, the help must work without it
+    env = dict(os.environ, HOME=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'no-home'))
+
+    return subprocess.run([sys.executable] + arguments, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def measure(arguments, nb_runs: int) -> float:
+    durations = []
+
+    for _ in range(nb_runs):
+        start = time.perf_counter()
+        result = run(arguments)
+        durations.append(time.perf_counter() - start)
+
+        if result.returncode != 0:
+            raise Exception(f'Command {arguments} failed: {result.stderr}')
+
+    return statistics.median(durations) * 1000
+
+
+def find_imported_modules():
+    """
+    Returns the cumulative import time in microseconds of every module imported by "import kiss" (see -X importtime).
+    """
+    result = run(['-X', 'importtime', '-c', 'import kiss'])
+    modules = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+
+    return modules
+
+
+def main():
+    nb_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    interpreter = measure(['-c', 'pass'], nb_runs)
+    import_kiss = measure(['-c', 'import kiss'], nb_runs)
+    help_kiss = measure(['-c', 'import kiss; kiss.main()', '--help'], nb_runs)
+
+    print(f'interpreter: {interpreter:.1f} ms')
+    print(f'import kiss: {import_kiss:.1f} ms ({import_kiss - interpreter:.1f} ms above the interpreter)')
+    print(f'clockifyKiss --help: {help_kiss:.1f} ms ({help_kiss - interpreter:.1f} ms above the interpreter)')
+
+    modules = find_imported_modules()
+    print(f'import kiss (-X importtime): {modules.get("kiss", 0) / 1000:.1f} ms')
+
+    for name, cumulative in sorted(modules.items(), key=lambda module: -module[1])[:10]:
+        print(f'\t{name}: {cumulative / 1000:.1f} ms')
+
+    eager_modules = [name for name in LAZY_MODULES if name in modules]
+    if len(eager_modules) > 0:
+        print(f'Modules imported at startup: {", ".join(eager_modules)}')
+        exit(1)
+
+    if budget is not None and import_kiss - interpreter > budget:
+        print(f'Import of kiss above the budget of {budget:.1f} ms')
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+"""
+Times the fill pipeline stage by stage: TimeEntriesGenerator.generate, TimeEntriesDiffComputer.compute,
+TimeEntriesChecker.generate_report and TimeEntriesReporter.create_report, on synthetic time entries of growing size
+(from 1 month to 5 years, from 1 to 200 tasks per day, with public and personal holidays every month).
+
+Clockify is replaced by the fake server, run in another process so that it's not part of the measures. It's seeded
+with a catalogue matching the time entries, and with existing time entries for the first half of the period, some of
+them outdated, so that the diff has entries to keep, update, add and delete. The diff stage includes the download of
+existing time entries from the fake, the catalogue is downloaded beforehand.
+
+The median time of every stage and its peak of memory (traced in a separate run) are compared to the baseline, the
+benchmark fails when a stage is slower or uses more memory than the baseline, beyond the tolerance and the noise
+floors. Baselines depend on the machine, so none is committed: save one on the machine first, from the reference
+revision, then compare the changes against it:
+
+    PYTHONPATH=src python benchmarks/pipeline.py --save-baseline
+    PYTHONPATH=src python benchmarks/pipeline.py
+
+Without a baseline, results are only displayed.
+
+Usage: PYTHONPATH=src python benchmarks/pipeline.py [-s scenario]... [-r repeat] [--baseline file] [--save-baseline]
+       [--tolerance ratio]
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from kiss.catalogue_prefetcher import CataloguePrefetcher
+from kiss.clockify_api import ClockifyApi
+from kiss.fake_server import FakeClockifyServer, FakeClockifyState
+from kiss.time_entries_checker import TimeEntriesChecker, TimeEntriesCheckOption
+from kiss.time_entries_diff import TimeEntriesDiffComputer
+from kiss.time_entries_file import TimeEntriesFile
+from kiss.time_entries_generator import TimeEntriesGenerator
+from kiss.time_entries_reporter import TimeEntriesReporter
+from kiss.user_settings import UserSettings
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline-baseline.json')
+
+STAGES = ['generate', 'diff', 'check', 'report']
+
+# name: (number of months, number of tasks per day)
+SCENARIOS = {
+    'month-1': (1, 1),
+    'month-200': (1, 200),
+    'year-20': (12, 20),
+    'years-5-10': (60, 10),
+    'years-5-200': (60, 200),
+}
+DEFAULT_SCENARIOS = ['month-1', 'month-200', 'year-20', 'years-5-10']
+
+FROM_DATE = date(2020, 1, 1)
+NB_PROJECTS = 50
+NB_OTHER_PROJECTS = 500
+NB_OTHER_TAGS = 100
+
+# regressions smaller than this (in seconds, in bytes) are noise: a few milliseconds depend on the load of the machine
+MIN_COMPARED_TIME = 0.05
+MIN_COMPARED_MEMORY = 1024 * 1024
+
+TOKEN = 'benchmark'
+
+
+def create_settings(endpoint: str) -> UserSettings:
+    return UserSettings.load_user_settings(json.dumps({
+        'token': TOKEN,
+        'publicHoliday': {'project': 'ALL_Absence', 'task': 'Public Holiday', 'description': 'OFF', 'tags': ['@ Home']},
+        'personalHoliday': {'project': 'ALL_Absence', 'task': 'Vacations', 'description': 'OFF', 'tags': ['@ Home']},
+        'day': {'startAt': '08:00:00', 'endAt': '16:00:00'},
+        'http': {'endpoint': endpoint, 'pageSize': 1000, 'maxPageSize': 5000},
+        'cache': {'enabled': False, 'memorySize': 4096}
+    }))
+
+
+def create_catalogue() -> dict:
+    projects = [{'name': 'ALL_Absence', 'tasks': [{'name': 'Public Holiday'}, {'name': 'Vacations'}]},
+                {'name': 'DEFAULT'}]
+    projects += [{'name': f'PROJECT_{index:03d}'} for index in range(NB_PROJECTS)]
+    projects += [{'name': f'OTHER_{index:03d}'} for index in range(NB_OTHER_PROJECTS)]
+
+    tags = [{'name': '@ Home'}, {'name': '@ Office'}] + [{'name': f'@ Other {index}'} for index in range(NB_OTHER_TAGS)]
+
+    return {'projects': projects, 'tags': tags}
+
+
+def add_months(day: date, nb_months: int) -> date:
+    month = day.month - 1 + nb_months
+
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def create_time_entries(nb_months: int, nb_tasks_per_day: int) -> TimeEntriesFile:
+    """
+    Every month has a public holiday (the first weekday), two days of personal holidays and a half-day of personal
+    holiday. Other weekdays have the specified number of tasks, gaps between them are filled by the default task.
+    """
+    to_date = add_months(FROM_DATE, nb_months) - timedelta(days=1)
+    public_holidays = []
+    personal_holidays = []
+    tasks = []
+
+    day = FROM_DATE
+    while day <= to_date:
+        if day.weekday() >= 5:
+            pass
+        elif len(public_holidays) == 0 or public_holidays[-1].month != day.month:
+            public_holidays.append(day)
+        elif day.day in [10, 20]:
+            personal_holidays.append(create_interval(day, 8 * 3600, 16 * 3600))
+        elif day.day == 15:
+            personal_holidays.append(create_interval(day, 8 * 3600, 12 * 3600))
+        else:
+            tasks += create_day_tasks(day, nb_tasks_per_day)
+
+        day += timedelta(days=1)
+
+    return TimeEntriesFile.load_time_entries(json.dumps({
+        'period': {'fromDate': FROM_DATE.isoformat(), 'toDate': to_date.isoformat()},
+        'publicHolidays': [public_holiday.isoformat() for public_holiday in public_holidays],
+        'personalHolidays': [{'interval': interval} for interval in personal_holidays],
+        'tasks': tasks,
+        'defaultTasks': [{
+            'project': 'DEFAULT',
+            'interval': {'fromDate': FROM_DATE.isoformat(), 'toDate': to_date.isoformat()},
+            'tags': ['@ Office']
+        }]
+    }))
+
+
+def create_day_tasks(day: date, nb_tasks: int) -> List[dict]:
+    start = 8 * 3600
+    slot = 8 * 3600 // nb_tasks
+
+    return [
+        {
+            'project': f'PROJECT_{(day.toordinal() + index) % NB_PROJECTS:03d}',
+            'description': f'Task {index}',
+            'interval': create_interval(day, start + index * slot, start + index * slot + slot * 3 // 4),
+            'tags': ['@ Office'] if index % 2 == 0 else ['@ Home']
+        }
+        for index in range(nb_tasks)
+    ]
+
+
+def create_interval(day: date, from_secs: int, to_secs: int) -> dict:
+    midnight = datetime(day.year, day.month, day.day)
+
+    return {
+        'fromDate': (midnight + timedelta(seconds=from_secs)).strftime('%Y-%m-%d %H:%M:%S'),
+        'toDate': (midnight + timedelta(seconds=to_secs)).strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def create_existing_time_entries(time_entries: TimeEntriesFile) -> List[dict]:
+    """
+    Generates the time entries against an in-process fake having the same catalogue, and returns the ones of the first
+    half of the period as existing time entries: every 10th one is outdated (to update), every 25th one is missing
+    (to add), and there is an unknown time entry at night every 50 time entries (to delete).
+    """
+    with FakeClockifyServer(FakeClockifyState.parse_from_dict(create_catalogue())) as server:
+        settings = create_settings(server.get_endpoint())
+        api = ClockifyApi(settings)
+        days = TimeEntriesGenerator(time_entries, api, settings).generate()
+
+    half = time_entries.period.from_date + (time_entries.period.to_date - time_entries.period.from_date) / 2
+    existing = []
+
+    for index, time_entry in enumerate([time_entry for day in days.get_days_time_entries() if day.day <= half
+                                        for time_entry in day.time_entries]):
+        body = time_entry.clockify_entry.__dict__()
+
+        if index % 25 == 0:
+            continue
+        elif index % 10 == 0:
+            body['description'] = 'OUTDATED'
+
+        existing.append(body)
+
+        if index % 50 == 1:
+            night = body['start'][:11]
+            existing.append(dict(body, id=None, description='UNKNOWN', start=f'{night}22:00:00Z',
+                                 end=f'{night}23:00:00Z'))
+
+    return existing
+
+
+def find_free_port() -> int:
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+
+        return free_socket.getsockname()[1]
+
+
+def start_fake_server(fixtures_file: str) -> (subprocess.Popen, str):
+    port = find_free_port()
+    process = subprocess.Popen([sys.executable, '-c', 'import kiss; kiss.main()', 'fake-server', '-f', fixtures_file,
+                                '--port', str(port)], stdout=subprocess.DEVNULL)
+
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    return process, f'http://127.0.0.1:{port}/api/v1/'
+
+
+class PipelineRun:
+    """
+    Everything needed to run the stages once: every stage starts from the result of the previous one.
+    """
+
+    def __init__(self, time_entries: TimeEntriesFile, api: ClockifyApi, settings: UserSettings):
+        self.time_entries = time_entries
+        self.api = api
+        self.settings = settings
+
+        self.days = None
+        self.diff = None
+        self.check_report = None
+        self.report = None
+
+    def run_stage(self, stage: str) -> None:
+        if stage == 'generate':
+            self.days = TimeEntriesGenerator(self.time_entries, self.api, self.settings).generate()
+        elif stage == 'diff':
+            # existing time entries aren't cached, they're downloaded on every run
+            self.diff = TimeEntriesDiffComputer(self.api, self.settings).compute(self.days)
+        elif stage == 'check':
+            self.check_report = TimeEntriesChecker(self.settings, TimeEntriesCheckOption(False)) \
+                .generate_report(self.diff)
+        elif stage == 'report':
+            self.report = TimeEntriesReporter(self.api, self.settings).create_report(self.diff, self.check_report)
+
+
+def run_scenario(name: str, nb_repeats: int) -> dict:
+    nb_months, nb_tasks_per_day = SCENARIOS[name]
+    time_entries = create_time_entries(nb_months, nb_tasks_per_day)
+
+    fixtures = dict(create_catalogue(), timeEntries=[])
+    user_id = FakeClockifyState.parse_from_dict(fixtures).get_user(TOKEN)['id']
+    fixtures['timeEntries'] = [dict(time_entry, userId=user_id)
+                               for time_entry in create_existing_time_entries(time_entries)]
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as fixtures_file:
+        json.dump(fixtures, fixtures_file)
+
+    process, endpoint = start_fake_server(fixtures_file.name)
+
+    try:
+        settings = create_settings(endpoint)
+        api = ClockifyApi(settings)
+
+        generator = TimeEntriesGenerator(time_entries, api, settings)
+        CataloguePrefetcher(api).prefetch(generator.get_time_entries_names())
+
+        times = {stage: [] for stage in STAGES}
+        for _ in range(nb_repeats):
+            run = PipelineRun(time_entries, api, settings)
+
+            for stage in STAGES:
+                start = time.perf_counter()
+                run.run_stage(stage)
+                times[stage].append(time.perf_counter() - start)
+
+        peak_memories = {}
+        run = PipelineRun(time_entries, api, settings)
+        for stage in STAGES:
+            tracemalloc.start()
+            run.run_stage(stage)
+            peak_memories[stage] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        nb_entries = len(run.diff.get_time_entries())
+    finally:
+        process.terminate()
+        process.wait()
+        os.remove(fixtures_file.name)
+
+    return {
+        'entries': nb_entries,
+        'stages': {stage: {'time': statistics.median(times[stage]), 'peakMemory': peak_memories[stage]} for stage in STAGES}
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns regressions of the result compared to the baseline of the same scenario.
+    """
+    regressions = []
+
+    for stage in STAGES:
+        measures = result['stages'][stage]
+        baseline_measures = baseline['stages'].get(stage)
+
+        if baseline_measures is None:
+            continue
+
+        for measure, minimum in [('time', MIN_COMPARED_TIME), ('peakMemory', MIN_COMPARED_MEMORY)]:
+            value = measures[measure]
+            baseline_value = baseline_measures[measure]
+
+            if value > baseline_value * (1 + tolerance) and value - baseline_value > minimum:
+                regressions.append(f'{stage} {measure}: {format_measure(measure, value)} '
+                                   f'(baseline {format_measure(measure, baseline_value)})')
+
+    return regressions
+
+
+def format_measure(measure: str, value: float) -> str:
+    if measure == 'time':
+        return f'{value * 1000:.1f} ms'
+    else:
+        return f'{value / (1024 * 1024):.1f} MB'
+
+
+def format_delta(value: float, baseline_value: float) -> str:
+    if baseline_value is None or baseline_value == 0:
+        return ''
+
+    return f'{(value - baseline_value) * 100 / baseline_value:+.0f}%'
+
+
+def print_result(name: str, result: dict, baseline: dict) -> None:
+    print(f'{name} ({result["entries"]} time entries)')
+
+    for stage in STAGES:
+        measures = result['stages'][stage]
+        baseline_measures = baseline['stages'].get(stage, {}) if baseline is not None else {}
+
+        time_delta = format_delta(measures['time'], baseline_measures.get('time'))
+        memory_delta = format_delta(measures['peakMemory'], baseline_measures.get('peakMemory'))
+
+        print(f'\t{stage:<10}{format_measure("time", measures["time"]):>12} {time_delta:>6}'
+              f'{format_measure("peakMemory", measures["peakMemory"]):>12} {memory_delta:>6}')
+
+
+def load_baseline(file: str) -> Dict[str, dict]:
+    if not os.path.exists(file):
+        return {}
+
+    with open(file) as baseline_file:
+        return json.load(baseline_file)['scenarios']
+
+
+def save_baseline(file: str, results: Dict[str, dict]) -> None:
+    scenarios = load_baseline(file)
+    scenarios.update(results)
+
+    with open(file, 'w') as baseline_file:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'scenarios': scenarios
+        }, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times the stages of the fill pipeline.')
+    parser.add_argument('-s', '--scenario', dest='scenarios', action='append', choices=list(SCENARIOS.keys()),
+                        help=f'scenario to run, can be repeated (default: {", ".join(DEFAULT_SCENARIOS)})')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=5,
+                        help='number of timed runs, their median is compared')
+    parser.add_argument('--baseline', dest='baseline', default=DEFAULT_BASELINE, help='baseline file')
+    parser.add_argument('--save-baseline', dest='save_baseline', action='store_true',
+                        help='save the results as the baseline, rather than comparing them')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=0.25,
+                        help='accepted ratio of regression compared to the baseline')
+    arguments = parser.parse_args()
+
+    baseline = load_baseline(arguments.baseline)
+    results = {}
+
+    if len(baseline) == 0 and not arguments.save_baseline:
+        print(f'No baseline in {arguments.baseline}, results are not compared (save one with --save-baseline)')
+
+    regressions = []
+
+    for name in arguments.scenarios or DEFAULT_SCENARIOS:
+        results[name] = run_scenario(name, arguments.repeat)
+        print_result(name, results[name], baseline.get(name))
+
+        if not arguments.save_baseline and name in baseline:
+            regressions += [f'{name} {regression}'
+                            for regression in compare(results[name], baseline[name], arguments.tolerance)]
+
+    if arguments.save_baseline:
+        save_baseline(arguments.baseline, results)
+        print(f'Baseline saved in {arguments.baseline}')
+    elif len(regressions) > 0:
+        print('Regressions:\n' + '\n'.join([f'\t{regression}' for regression in regressions]))
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares the parsing and formatting of Clockify timestamps with strptime/strftime and pytz, to the timestamps module.
+
+Usage: PYTHONPATH=src python benchmarks/timestamps.py [number of iterations]
+"""
+import sys
+import timeit
+from datetime import datetime, timezone
+
+import pytz
+import tzlocal
+
+from kiss.clockify_model import ClockifyTimeInterval
+from kiss.timestamps import parse_zulu, from_epoch_to_local, from_epoch_to_zulu, from_zulu_to_epoch
+
+START = '2020-01-06T08:00:00Z'
+END = '2020-01-06T12:00:00Z'
+EPOCH = from_zulu_to_epoch(START)
+
+
+def legacy_parse_to_local():
+    return datetime.strptime(START, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=pytz.utc).astimezone(tzlocal.get_localzone())
+
+
+def legacy_format():
+    return datetime.fromtimestamp(EPOCH, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def interval_as_datetime_interval(interval: ClockifyTimeInterval):
+    return interval.as_datetime_interval()
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    interval = ClockifyTimeInterval(START, END)
+
+    benchmarks = [
+        ('parse (strptime)', lambda: datetime.strptime(START, '%Y-%m-%dT%H:%M:%SZ')),
+        ('parse (timestamps)', lambda: parse_zulu(START)),
+        ('parse to local (strptime, pytz)', legacy_parse_to_local),
+        ('epoch to local (timestamps)', lambda: from_epoch_to_local(EPOCH)),
+        ('format (strftime)', legacy_format),
+        ('format (timestamps)', lambda: from_epoch_to_zulu(EPOCH)),
+        ('interval as datetime interval (memoized)', lambda: interval_as_datetime_interval(interval)),
+    ]
+
+    for name, benchmark in benchmarks:
+        duration = timeit.timeit(benchmark, number=number)
+        print(f'{name}: {duration * 1e9 / number:.0f} ns per call')
+
+
+if __name__ == '__main__':
+    main()
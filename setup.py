@@ -18,6 +18,9 @@ setup(
         'urllib3==1.24.2',
         'tzlocal==2.0.0'
     ],
+    extras_require={
+        'async': ['aiohttp>=3.6'],
+    },
     entry_points={
         'console_scripts': [
             'clockifyKiss=kiss:main',
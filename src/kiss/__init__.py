@@ -1,33 +1,60 @@
 import json
 import os
+import sys
 
 import click
 
-from kiss.clockify_api import ClockifyApi
-from kiss.time_entries_checker import TimeEntriesChecker, TimeEntriesCheckOption
-from kiss.time_entries_diff import TimeEntriesDiffComputer
-from kiss.time_entries_file import TimeEntriesFile, Month, Task, DateInterval
-from kiss.time_entries_generator import TimeEntriesGenerator
-from kiss.time_entries_reporter import TimeEntriesReporter
-from kiss.user_settings import UserSettings
-
 VERBOSE = False
 
+# choices of TimeEntriesDiffComputer.FETCH_WINDOWS and TimeEntriesReporter.FORMATS, repeated here so that the options
+# can be declared without importing the modules
+FETCH_WINDOWS = ['day', 'week', 'month']
+REPORT_FORMATS = ['text', 'jsonl', 'csv']
+PROFILE_FORMATS = ['table', 'json']
+
 config_file_path = '~/.clockify.cfg'
-config_file = os.path.expanduser(config_file_path)
-if os.path.exists(config_file):
-    with open(config_file) as f:
-        user_settings = UserSettings.load_user_settings(f.read())
-else:
-    raise Exception(f'Missing config file {config_file_path}')
 
-api = ClockifyApi(user_settings)
+# loaded on first use, so that the help and commands not needing them start without reading the config, settings
+# isn't named user_settings since importing the module kiss.user_settings sets this attribute of the package
+settings = None
+api = None
+fake_clockify = None
+
+
+def get_user_settings():
+    global settings
+
+    if settings is None:
+        from kiss.user_settings import UserSettings
+
+        config_file = os.path.expanduser(config_file_path)
+        if not os.path.exists(config_file):
+            raise Exception(f'Missing config file {config_file_path}')
+
+        with open(config_file) as f:
+            settings = UserSettings.load_user_settings(f.read())
+
+    return settings
+
+
+def get_api():
+    global api
+
+    if api is None:
+        from kiss.clockify_api import ClockifyApi
+
+        api = ClockifyApi(get_user_settings())
+
+    return api
 
 
 #
 # Technical
 #
 def default_serializer(o):
+    if hasattr(o, '__slots__'):
+        return {name: getattr(o, name) for name in getattr(o, 'serialized_fields', o.__slots__)}
+
     return o.__dict__
 
 
@@ -35,11 +62,59 @@ def print_json(input_json):
     click.echo(json.dumps(input_json, indent=2, default=default_serializer))
 
 
+def print_cache_stats():
+    if api is not None:
+        click.echo(api.metadata_cache.get_stats(), err=True)
+
+
+def flush_cache():
+    if api is not None:
+        api.metadata_cache.flush()
+
+
+def start_fake_clockify(fixtures: str):
+    """
+    Starts a local fake of Clockify seeded from the fixtures and points the settings to it. Nothing is cached on the
+    disk, so that elements of the fake are never mixed with the ones of Clockify.
+    """
+    global fake_clockify
+    from kiss.fake_server import FakeClockifyServer, FakeClockifyState
+
+    fake_clockify = FakeClockifyServer(FakeClockifyState.load(fixtures)).start()
+
+    user_settings = get_user_settings()
+    user_settings.http.endpoint = fake_clockify.get_endpoint()
+    user_settings.http.max_page_size = fake_clockify.settings.max_page_size
+    user_settings.cache.enabled = False
+
+
+def stop_fake_clockify():
+    if VERBOSE:
+        click.echo(fake_clockify.stats, err=True)
+
+    fake_clockify.stop()
+
+
+def print_profile(profile_format: str, trace_file: str = None):
+    from kiss.profiler import PROFILER
+
+    PROFILER.disable()
+
+    if profile_format == 'json':
+        click.echo(json.dumps(PROFILER.to_dict(), indent=2), err=True)
+    else:
+        click.echo(PROFILER.create_table(), err=True)
+
+    if trace_file is not None:
+        PROFILER.write_chrome_trace(trace_file)
+
+
 #
 # Commands
 #
 @click.command('user', short_help='Show current user')
 def get_user():
+    api = get_api()
     user = api.get_user()
     if VERBOSE:
         print_json(user)
@@ -49,6 +124,7 @@ def get_user():
 
 @click.command('workspaces', short_help='Show all workspaces')
 def get_workspaces():
+    api = get_api()
     workspaces = api.get_workspaces()
     if VERBOSE:
         print_json(workspaces)
@@ -61,6 +137,7 @@ def get_workspaces():
 @click.option('-w', '--workspace', 'workspace', help='workspace id')
 @click.option('-n', '--name', 'name', help='project name (can be a regex)')
 def get_projects(workspace, name):
+    api = get_api()
     if name is not None:
         projects = api.get_projects_by_name(name, workspace)
     else:
@@ -77,6 +154,7 @@ def get_projects(workspace, name):
 @click.option('-w', '--workspace', 'workspace', help='workspace id')
 @click.option('-n', '--name', 'name', help='tag name (can be a regex)')
 def get_tags(workspace, name):
+    api = get_api()
     if name is not None:
         tags = api.get_tags_by_name(name, workspace)
     else:
@@ -94,6 +172,7 @@ def get_tags(workspace, name):
 @click.option('-n', '--name', 'name', help='task name (can be a regex)')
 @click.argument('project')
 def get_tasks(workspace, project, name):
+    api = get_api()
     tasks: []
     if name is not None:
         tasks = api.get_project_task_by_name(project, name, workspace)
@@ -112,6 +191,7 @@ def get_tasks(workspace, project, name):
 @click.option('-s', '--start', 'start', help='the beginning of the period to look for in ISO-8601 format (eg. "2019-04-16T05:15:32.999Z")')
 @click.option('-e', '--end', 'end', help='the beginning of the period to look for in ISO-8601 format (eg. "2019-04-16T05:15:32.999Z")')
 def find_time_entries(workspace, start, end):
+    api = get_api()
     entries = api.find_time_entries(workspace, start, end)
     if VERBOSE:
         print_json(entries)
@@ -123,36 +203,213 @@ def find_time_entries(workspace, start, end):
 @click.command('fill-time-entries', short_help='Fill time entries a period')
 @click.argument('file')
 @click.option('--partial', is_flag=True, help="specify that the time entries are partially completed", required=False)
-def fill_entries(file, partial: bool = None):
+@click.option('-j', '--parallelism', 'parallelism', default=4, type=click.IntRange(min=1),
+              help='number of concurrent requests to Clockify')
+@click.option('--fetch-window', 'fetch_window', default='month', type=click.Choice(FETCH_WINDOWS),
+              help='existing time entries are fetched concurrently by window of this duration')
+@click.option('--update/--no-update', 'update', default=True,
+              help='update an existing time entry having the same interval, rather than deleting it and adding a new one')
+@click.option('--incremental', is_flag=True,
+              help='only fill days whose inputs changed since the last fill of the period, or whose state is stale')
+@click.option('--format', 'output_format', default='text', type=click.Choice(REPORT_FORMATS),
+              help='format of the report, with jsonl and csv one record per time entry is written on the standard '
+                   'output, everything else is written on the standard error')
+def fill_entries(file,
+                 partial: bool = None,
+                 parallelism: int = 4,
+                 fetch_window: str = 'month',
+                 update: bool = True,
+                 incremental: bool = False,
+                 output_format: str = 'text'):
+    from kiss.catalogue_prefetcher import CataloguePrefetcher
+    from kiss.time_entries_checker import TimeEntriesChecker, TimeEntriesCheckOption
+    from kiss.time_entries_diff import TimeEntriesDiffComputer
+    from kiss.time_entries_file import TimeEntriesFile
+    from kiss.time_entries_generator import TimeEntriesGenerator
+    from kiss.time_entries_reporter import TimeEntriesReporter
+    from kiss.time_entries_state import TimeEntriesState
+    from kiss.utils import COLOR_RED, RESET_FORMAT
+
+    api = get_api()
+    user_settings = get_user_settings()
+
     with open(file) as jsonFile:
         time_entries = TimeEntriesFile.load_time_entries(jsonFile.read())
 
         generator = TimeEntriesGenerator(time_entries, api, user_settings)
-        tasks_diff_computer = TimeEntriesDiffComputer(api, user_settings)
+        tasks_diff_computer = TimeEntriesDiffComputer(api, user_settings, fetch_window, parallelism, update)
         reporter = TimeEntriesReporter(api, user_settings)
         checker = TimeEntriesChecker(user_settings, TimeEntriesCheckOption(partial))
 
-        days_tasks = generator.generate()
+        state = None
+        days = None
+        days_inputs_hash = None
+        if incremental:
+            state = TimeEntriesState.create(user_settings, time_entries.period.from_date, time_entries.period.to_date)
+            days_inputs_hash = generator.get_days_inputs_hash()
+            days = state.find_days_to_fill(days_inputs_hash, tasks_diff_computer)
+
+            click.echo(f'{len(days_inputs_hash) - len(days)} day(s) unchanged since the last fill, skipped.',
+                       err=output_format != 'text')
+
+            if len(days) == 0:
+                return
+
+        CataloguePrefetcher(api, parallelism).prefetch(generator.get_time_entries_names())
+
+        days_tasks = generator.generate(days)
 
         tasks_diff = tasks_diff_computer.compute(days_tasks)
 
         check_report = checker.generate_report(tasks_diff)
 
-        print(reporter.create_report(tasks_diff, check_report))
+        reporter.write(tasks_diff, check_report, output_format, sys.stdout, sys.stderr)
 
         if check_report.can_apply_diff() is False:
             exit(1)
 
-        if click.confirm('Do you want to apply those time entries?', abort=True):
-            tasks_diff_computer.apply(tasks_diff)
+        if click.confirm('Do you want to apply those time entries?', abort=True, err=output_format != 'text'):
+            with click.progressbar(length=tasks_diff.get_nb_changes(),
+                                   label='Applying time entries',
+                                   file=sys.stderr if output_format != 'text' else None) as progress:
+                apply_report = tasks_diff_computer.apply(tasks_diff, parallelism, lambda time_entry: progress.update(1))
+
+            if state is not None:
+                state.record_diff(tasks_diff, days_inputs_hash)
+
+            for failure in apply_report.failures:
+                click.echo(f'{COLOR_RED}[ERROR]\t\t{failure}{RESET_FORMAT}', err=True)
+
+            if apply_report.is_successful() is False:
+                exit(1)
+
+
+@click.command('batch', short_help='Fill time entries of several users')
+@click.argument('path')
+@click.option('--partial', is_flag=True, help="specify that the time entries are partially completed", required=False)
+@click.option('-j', '--parallelism', 'parallelism', default=4, type=click.IntRange(min=1),
+              help='number of users processed concurrently')
+@click.option('-p', '--processes', 'processes', default=None, type=click.IntRange(min=1),
+              help='number of processes generating and comparing time entries, the number of CPUs by default')
+@click.option('--fetch-window', 'fetch_window', default='month', type=click.Choice(FETCH_WINDOWS),
+              help='existing time entries are fetched concurrently by window of this duration')
+@click.option('--update/--no-update', 'update', default=True,
+              help='update an existing time entry having the same interval, rather than deleting it and adding a new one')
+def fill_batch(path,
+               partial: bool = None,
+               parallelism: int = 4,
+               processes: int = None,
+               fetch_window: str = 'month',
+               update: bool = True):
+    """
+    PATH is either a directory where every settings file "<user>.cfg" comes with its time entries file "<user>.json",
+    or a JSON manifest: {"users": [{"name": "john", "settings": "john.cfg", "timeEntries": "john.json"}]}
+    """
+    from kiss.batch import BatchRunner, BatchUser
+
+    runner = BatchRunner(BatchUser.load_users(path), parallelism, processes, partial, fetch_window, update)
+
+    try:
+        runner.load()
+        runner.compute()
+
+        click.echo(runner.create_summary())
+
+        if runner.get_nb_changes() > 0 and \
+                click.confirm(f'Do you want to apply {runner.get_nb_changes()} change(s) of valid users?', abort=True):
+            runner.apply()
+
+            click.echo(runner.create_summary())
+    finally:
+        runner.close()
+
+    if not runner.is_successful():
+        exit(1)
 
 
 @click.group()
 @click.option('--verbose', is_flag=True, help="Enable verbose output")
-def cli(verbose):
+@click.option('--refresh-cache', 'refresh_cache', is_flag=True,
+              help="Ignore cached workspaces, projects, tasks and tags and download them again")
+@click.option('--fake-clockify', 'fake_clockify_fixtures', type=click.Path(exists=True, dir_okay=False),
+              help="Run against a local fake of Clockify seeded from this JSON file, rather than Clockify")
+@click.option('--profile', is_flag=True,
+              help="Print the time spent in every stage, the requests per endpoint and the hits of caches")
+@click.option('--profile-format', 'profile_format', default='table', type=click.Choice(PROFILE_FORMATS),
+              help="format of the profile printed on the error output")
+@click.option('--trace', 'trace_file', type=click.Path(dir_okay=False, writable=True),
+              help="Write stages and requests to this file in the Chrome trace format (enables the profile)")
+@click.pass_context
+def cli(ctx, verbose, refresh_cache, fake_clockify_fixtures, profile, profile_format, trace_file):
     global VERBOSE
     VERBOSE = verbose
 
+    if profile or trace_file is not None:
+        from kiss.profiler import PROFILER
+
+        PROFILER.enable()
+        ctx.call_on_close(lambda: print_profile(profile_format, trace_file))
+
+    if fake_clockify_fixtures is not None:
+        start_fake_clockify(fake_clockify_fixtures)
+        ctx.call_on_close(stop_fake_clockify)
+
+    if refresh_cache:
+        get_api().metadata_cache.clear()
+
+    # the catalogue downloaded by the command is written on the disk once, at the end
+    ctx.call_on_close(flush_cache)
+
+    if VERBOSE:
+        ctx.call_on_close(print_cache_stats)
+
+
+@click.command('fake-server', short_help='Run a local fake of Clockify')
+@click.option('-f', '--fixtures', 'fixtures', type=click.Path(exists=True, dir_okay=False),
+              help='JSON file the fake is seeded from (workspaces, users, projects, tasks, tags and time entries)')
+@click.option('--host', 'host', default='127.0.0.1', help='interface to listen on')
+@click.option('--port', 'port', default=8080, type=click.IntRange(min=0), help='port to listen on')
+@click.option('--latency', 'latency', default=0.0, type=float, help='seconds waited before answering every request')
+@click.option('--max-page-size', 'max_page_size', default=5000, type=click.IntRange(min=1),
+              help='maximum number of elements of a page, whatever the page size requested by the client '
+                   '(set maxPageSize in the http section of the client to the same value)')
+@click.option('--rate-limit-ratio', 'rate_limit_ratio', default=0.0, type=float,
+              help='ratio of requests rejected with 429 (Too Many Requests), between 0 and 1')
+@click.option('--retry-after', 'retry_after', default=None, type=click.IntRange(min=0),
+              help='value of the Retry-After header of rejected requests')
+@click.option('--seed', 'seed', default=0, type=int, help='seed of the random rejection of requests')
+def run_fake_server(fixtures: str = None,
+                    host: str = '127.0.0.1',
+                    port: int = 8080,
+                    latency: float = 0,
+                    max_page_size: int = 5000,
+                    rate_limit_ratio: float = 0,
+                    retry_after: int = None,
+                    seed: int = 0):
+    """
+    Runs a local fake of the Clockify API until interrupted. Set "endpoint" in the "http" section of the settings to
+    the displayed URL to use it.
+    """
+    from kiss.fake_server import FakeClockifyServer, FakeClockifySettings, FakeClockifyState
+
+    server = FakeClockifyServer(FakeClockifyState.load(fixtures) if fixtures is not None else None,
+                                FakeClockifySettings(latency, max_page_size, rate_limit_ratio, retry_after, seed),
+                                host,
+                                port)
+
+    click.echo(f'Fake Clockify listening on {server.get_endpoint()}, press Ctrl+C to stop.')
+    click.echo(f'Pages have at most {max_page_size} element(s), set "maxPageSize": {max_page_size} in the "http" section '
+               f'of the client.')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    click.echo(server.stats)
+
 
 #
 # Commands Registration
@@ -164,6 +421,8 @@ cli.add_command(get_tags)
 cli.add_command(get_tasks)
 cli.add_command(find_time_entries)
 cli.add_command(fill_entries)
+cli.add_command(fill_batch)
+cli.add_command(run_fake_server)
 
 
 def main():
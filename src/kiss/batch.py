@@ -0,0 +1,344 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Executor
+from typing import List, Dict, Hashable, Tuple
+
+from kiss.catalogue_prefetcher import CataloguePrefetcher
+from kiss.clockify_api import ClockifyApi
+from kiss.clockify_model import ClockifyTimeEntry
+from kiss.clockify_session import ClockifySession
+from kiss.lru_cache import LruCache
+from kiss.metadata_cache import MetadataCache
+from kiss.time_entries_checker import TimeEntriesChecker, TimeEntriesCheckOption, TimeEntriesCheckReport
+from kiss.time_entries_diff import TimeEntriesDiffComputer, DaysTimeEntriesDiff, TimeEntriesApplyReport
+from kiss.time_entries_file import TimeEntriesFile
+from kiss.time_entries_generator import TimeEntriesGenerator
+from kiss.user_settings import UserSettings
+from kiss.utils import COLOR_RED, COLOR_YELLOW, COLOR_GREEN, RESET_FORMAT, BOLD
+
+CATALOGUE_KINDS = ['projects', 'tags', 'tasks']
+
+# number of elements cached in memory for every user of the batch: user, workspaces and catalogue
+MEMORY_ELEMENTS_PER_USER = 64
+
+
+class BatchUser:
+    name: str
+    settings_file: str
+    time_entries_file: str
+
+    user_settings: UserSettings
+    time_entries: TimeEntriesFile
+    api: ClockifyApi
+    diff_computer: TimeEntriesDiffComputer
+
+    diff: DaysTimeEntriesDiff
+    check_report: TimeEntriesCheckReport
+    apply_report: TimeEntriesApplyReport
+    error: Exception
+
+    def __init__(self, name: str, settings_file: str, time_entries_file: str):
+        self.name = name
+        self.settings_file = settings_file
+        self.time_entries_file = time_entries_file
+
+        self.user_settings = None
+        self.time_entries = None
+        self.api = None
+        self.diff_computer = None
+
+        self.diff = None
+        self.check_report = None
+        self.apply_report = None
+        self.error = None
+
+    def load(self) -> None:
+        with open(self.settings_file) as settings_file:
+            self.user_settings = UserSettings.load_user_settings(settings_file.read())
+
+        with open(self.time_entries_file) as time_entries_file:
+            self.time_entries = TimeEntriesFile.load_time_entries(time_entries_file.read())
+
+    def can_apply(self) -> bool:
+        return self.error is None and self.check_report is not None and self.check_report.can_apply_diff()
+
+    def get_status(self) -> str:
+        if self.error is not None:
+            return 'FAILED'
+        elif not self.check_report.can_apply_diff():
+            return 'INVALID'
+        elif self.apply_report is not None and not self.apply_report.is_successful():
+            return 'PARTIAL'
+        elif self.apply_report is not None:
+            return 'APPLIED'
+        elif self.diff.get_nb_changes() == 0:
+            return 'UP-TO-DATE'
+        else:
+            return 'PENDING'
+
+    def is_successful(self) -> bool:
+        return self.get_status() in ['APPLIED', 'UP-TO-DATE', 'PENDING']
+
+    @staticmethod
+    def load_users(path: str) -> List['BatchUser']:
+        """
+        Loads users from a manifest (see parse_manifest), or from a directory where every settings file "<name>.cfg"
+        comes with its time entries file "<name>.json".
+        """
+        if os.path.isdir(path):
+            users = []
+
+            for file_name in sorted(os.listdir(path)):
+                name, extension = os.path.splitext(file_name)
+
+                if extension == '.cfg':
+                    time_entries_file = os.path.join(path, f'{name}.json')
+
+                    if not os.path.exists(time_entries_file):
+                        raise Exception(f'Missing time entries file {time_entries_file} for the settings {file_name}.')
+
+                    users.append(BatchUser(name, os.path.join(path, file_name), time_entries_file))
+
+            return users
+
+        with open(path) as manifest_file:
+            return BatchUser.parse_manifest(manifest_file.read(), os.path.dirname(os.path.abspath(path)))
+
+    @staticmethod
+    def parse_manifest(file_content: str, directory: str) -> List['BatchUser']:
+        """
+        Parses a manifest like {"users": [{"name": "john", "settings": "john.cfg", "timeEntries": "john.json"}]},
+        relative paths are relative to the directory of the manifest.
+        """
+        users = []
+
+        for user in json.loads(file_content)['users']:
+            settings_file = os.path.join(directory, os.path.expanduser(user['settings']))
+            time_entries_file = os.path.join(directory, os.path.expanduser(user['timeEntries']))
+            name = user.get('name', os.path.splitext(os.path.basename(settings_file))[0])
+
+            users.append(BatchUser(name, settings_file, time_entries_file))
+
+        return users
+
+
+def compute_diff(user_settings: UserSettings,
+                 time_entries: TimeEntriesFile,
+                 cached_elements: Dict[Hashable, object],
+                 existing_entries: List[ClockifyTimeEntry],
+                 partial: bool,
+                 fetch_window: str,
+                 update: bool) -> Tuple[DaysTimeEntriesDiff, TimeEntriesCheckReport]:
+    """
+    Generates, compares and checks time entries of a user, possibly in another process. The catalogue is expected in
+    the cached elements, Clockify is only called for missing ones.
+    """
+    api = ClockifyApi(user_settings)
+    api.memory_cache.put_all(cached_elements)
+
+    days_time_entries = TimeEntriesGenerator(time_entries, api, user_settings).generate()
+    diff = TimeEntriesDiffComputer(api, user_settings, fetch_window, 1, update) \
+        .compute(days_time_entries, existing_entries)
+    api.metadata_cache.flush()
+
+    return diff, TimeEntriesChecker(user_settings, TimeEntriesCheckOption(partial)).generate_report(diff)
+
+
+class BatchRunner:
+    """
+    Fills time entries of several users. Clients of all the users share the same connection pool, rate limit and
+    caches, so the catalogue of a workspace is downloaded once. Time entries are generated and compared in a pool of
+    processes, changes of different users are applied concurrently.
+    """
+    users: List[BatchUser]
+    parallelism: int
+    processes: int
+    partial: bool
+    fetch_window: str
+    update: bool
+
+    session: ClockifySession
+    metadata_cache: MetadataCache
+    memory_cache: LruCache
+
+    def __init__(self,
+                 users: List[BatchUser],
+                 parallelism: int = 4,
+                 processes: int = None,
+                 partial: bool = False,
+                 fetch_window: str = 'month',
+                 update: bool = True):
+        self.users = users
+        self.parallelism = parallelism
+        self.processes = processes if processes is not None else (os.cpu_count() or 1)
+        self.partial = partial
+        self.fetch_window = fetch_window
+        self.update = update
+
+        self.session = None
+        self.metadata_cache = None
+        self.memory_cache = None
+
+    def load(self) -> None:
+        for user in self.users:
+            try:
+                user.load()
+            except Exception as ex:
+                user.error = ex
+
+        loaded = [user for user in self.users if user.error is None]
+        if len(loaded) == 0:
+            return
+
+        # HTTP and cache settings of the first user apply to the whole batch
+        settings = loaded[0].user_settings
+        self.session = ClockifySession(settings.http)
+        self.metadata_cache = MetadataCache(os.path.join(settings.cache.get_directory(), 'shared.json'), settings.cache)
+        self.memory_cache = LruCache(max(settings.cache.memory_size, MEMORY_ELEMENTS_PER_USER * len(loaded)),
+                                     settings.cache.memory_ttl)
+
+        for user in loaded:
+            user.api = ClockifyApi(user.user_settings, self.session, self.metadata_cache, self.memory_cache)
+            user.diff_computer = TimeEntriesDiffComputer(user.api, user.user_settings, self.fetch_window, 1,
+                                                         self.update)
+
+    def compute(self) -> None:
+        """
+        Fetches concurrently what every user needs, then generates and compares time entries in the pool of processes.
+        """
+        with ThreadPoolExecutor(max_workers=max(self.parallelism, 1)) as executor:
+            prefetched = list(executor.map(self.prefetch, self.users))
+
+        if self.processes > 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                self.compute_diffs(executor, prefetched)
+        else:
+            self.compute_diffs(None, prefetched)
+
+    def prefetch(self, user: BatchUser) -> Tuple[Dict[Hashable, object], List[ClockifyTimeEntry]]:
+        """
+        Returns the cached catalogue of the user and its existing time entries, both sent to the process computing the
+        diff of the user.
+        """
+        if user.error is not None:
+            return None
+
+        try:
+            generator = TimeEntriesGenerator(user.time_entries, user.api, user.user_settings)
+            CataloguePrefetcher(user.api, 2).prefetch(generator.get_time_entries_names())
+
+            return self.memory_cache.snapshot(self.get_user_keys_predicate(user)), \
+                user.diff_computer.find_existing_entries([user.time_entries.period])
+        except Exception as ex:
+            user.error = ex
+            return None
+
+    def compute_diffs(self,
+                      executor: Executor,
+                      prefetched: List[Tuple[Dict[Hashable, object], List[ClockifyTimeEntry]]]) -> None:
+        futures = {}
+
+        for user, user_prefetched in zip(self.users, prefetched):
+            if user.error is not None:
+                continue
+
+            snapshot, existing_entries = user_prefetched
+            arguments = (user.user_settings, user.time_entries, snapshot, existing_entries, self.partial,
+                         self.fetch_window, self.update)
+
+            if executor is not None:
+                futures[user] = executor.submit(compute_diff, *arguments)
+            else:
+                try:
+                    user.diff, user.check_report = compute_diff(*arguments)
+                except Exception as ex:
+                    user.error = ex
+
+        for user, future in futures.items():
+            try:
+                user.diff, user.check_report = future.result()
+            except Exception as ex:
+                user.error = ex
+
+    def apply(self) -> None:
+        """
+        Applies changes of valid users, users are applied concurrently, but changes of a user are applied in order.
+        """
+        users = [user for user in self.users if user.can_apply() and user.diff.get_nb_changes() > 0]
+
+        with ThreadPoolExecutor(max_workers=max(self.parallelism, 1)) as executor:
+            for user, apply_report in zip(users, executor.map(lambda u: u.diff_computer.apply(u.diff, 1), users)):
+                user.apply_report = apply_report
+
+    def create_summary(self) -> str:
+        """
+        Returns one line per user with its status and its changes, followed by errors and warnings of every user.
+        """
+        lines = []
+        details = []
+
+        for user in self.users:
+            status = user.get_status()
+            color = COLOR_GREEN if user.is_successful() else COLOR_RED
+
+            if user.diff is not None:
+                changes = self.get_changes_summary(user)
+            else:
+                changes = ''
+
+            lines.append(f'{BOLD}{user.name}{RESET_FORMAT}\t{color}{status}{RESET_FORMAT}\t{changes}\n')
+
+            if user.error is not None:
+                details.append(f'{COLOR_RED}[ERROR]\t\t{user.name}: {user.error}{RESET_FORMAT}\n')
+
+            if user.check_report is not None:
+                for error in user.check_report.errors:
+                    details.append(f'{COLOR_RED}[ERROR]\t\t{user.name}: {error}{RESET_FORMAT}\n')
+
+                for warning in user.check_report.warnings:
+                    details.append(f'{COLOR_YELLOW}[WARNING]\t{user.name}: {warning}{RESET_FORMAT}\n')
+
+            if user.apply_report is not None:
+                for failure in user.apply_report.failures:
+                    details.append(f'{COLOR_RED}[ERROR]\t\t{user.name}: {failure}{RESET_FORMAT}\n')
+
+        return ''.join(details + ['\n'] + lines if len(details) > 0 else lines)
+
+    @staticmethod
+    def get_changes_summary(user: BatchUser) -> str:
+        time_entries = user.diff.get_time_entries()
+
+        nb_kept = len([time_entry for time_entry in time_entries if time_entry.is_to_keep()])
+        nb_added = len([time_entry for time_entry in time_entries if time_entry.is_to_add()])
+        nb_updated = len([time_entry for time_entry in time_entries if time_entry.is_to_update()])
+        nb_deleted = len([time_entry for time_entry in time_entries if time_entry.is_to_delete()])
+
+        return f'{nb_kept} kept, {nb_added} added, {nb_updated} updated, {nb_deleted} deleted'
+
+    def get_nb_changes(self) -> int:
+        return sum([user.diff.get_nb_changes() for user in self.users if user.can_apply()])
+
+    def is_successful(self) -> bool:
+        return all([user.is_successful() for user in self.users])
+
+    def close(self) -> None:
+        if self.metadata_cache is not None:
+            self.metadata_cache.flush()
+
+        if self.session is not None:
+            self.session.close()
+
+    @staticmethod
+    def get_user_keys_predicate(user: BatchUser):
+        account = user.api.account
+        workspace = user.api.get_user().default_workspace
+
+        def is_user_key(key: Hashable) -> bool:
+            if key[0] in ['user', 'workspaces']:
+                return key[1] == account
+            elif key[0] in CATALOGUE_KINDS:
+                return key[1] == workspace
+            else:
+                return False
+
+        return is_user_key
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from kiss.clockify_api import ClockifyApi
+from kiss.clockify_index import CatalogueIndex
+from kiss.clockify_model import ClockifyProject
+from kiss.profiler import profiled
+from kiss.time_entries_resolver import TimeEntryNames
+
+
+class CataloguePrefetcher:
+    """
+    Fetches concurrently the catalogue needed to generate time entries: projects, tasks of the used projects and tags.
+    They are then served from the caches of the api. Existing time entries aren't prefetched, they're streamed by the
+    diff computer.
+    """
+    api: ClockifyApi
+    parallelism: int
+
+    def __init__(self, api: ClockifyApi, parallelism: int = 4):
+        self.api = api
+        self.parallelism = parallelism
+
+    @profiled('prefetch')
+    def prefetch(self, names: List[TimeEntryNames]) -> None:
+        # the workspace of the user is needed by all the other requests
+        self.api.get_user()
+
+        with ThreadPoolExecutor(max_workers=max(self.parallelism, 1)) as executor:
+            projects = executor.submit(self.api.get_projects_index)
+            futures = [executor.submit(self.api.get_tags)]
+
+            # tasks can only be fetched once project ids are known, tags are still being fetched
+            for project in self.find_projects_with_tasks(projects.result(), names):
+                futures.append(executor.submit(self.api.get_project_tasks, project.id))
+
+            for future in futures:
+                future.result()
+
+    def find_projects_with_tasks(self, projects: CatalogueIndex, names: List[TimeEntryNames]) -> List[ClockifyProject]:
+        found = {}
+
+        for project_name, task_name, tag_names in names:
+            if task_name is None:
+                continue
+
+            matching_projects = projects.find_by_name(project_name)
+
+            # names that cannot be resolved are skipped, they are reported by the resolver
+            if len(matching_projects) == 1:
+                found[matching_projects[0].id] = matching_projects[0]
+
+        return list(found.values())
@@ -1,159 +1,352 @@
 import json
-import re
-from typing import List
-
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Iterator, Callable, Optional, Tuple
 
+from kiss.clockify_index import CatalogueIndex
 from kiss.clockify_model import ClockifyWorkspace, ClockifyProject, ClockifyTimeEntry, ClockifyTask, ClockifyUser, \
     ClockifyTag, ClockifyTimeNewEntry
+from kiss.clockify_session import ClockifySession
+from kiss.lru_cache import LruCache
+from kiss.metadata_cache import MetadataCache, MetadataCacheEntry
+from kiss.profiler import PROFILER
 from kiss.user_settings import UserSettings
 
-ENDPOINT = "https://api.clockify.me/api/v1/"
-
 
-class ClockifyApi:
+class ClockifyApiBase:
+    """
+    Caches, pagination and error handling shared by the synchronous and the asynchronous Clockify clients, everything
+    but the HTTP calls.
+    """
     headers: object
-
-    cached_user: ClockifyUser = None
-    cached_workspaces = []
-    cached_workspace_projects = {}
-    cached_workspace_tags = {}
-    cached_project_tasks = {}
-
-    def __init__(self, user_settings: UserSettings):
+    endpoint: str
+    account: str
+    metadata_cache: MetadataCache
+    memory_cache: LruCache
+    page_size: int
+    max_page_size: Optional[int]
+
+    def __init__(self,
+                 user_settings: UserSettings,
+                 metadata_cache: MetadataCache = None,
+                 memory_cache: LruCache = None):
+        """
+        Caches can be shared by clients of several users, elements specific to a user (the user and its workspaces)
+        are cached by account.
+        """
         self.headers = {"X-Api-Key": user_settings.token, "content-type": "application/json"}
+        self.endpoint = user_settings.http.endpoint
+        self.account = user_settings.get_token_hash()
+        self.metadata_cache = metadata_cache if metadata_cache is not None else MetadataCache.create(user_settings)
+        self.memory_cache = memory_cache if memory_cache is not None \
+            else LruCache(user_settings.cache.memory_size, user_settings.cache.memory_ttl)
+        self.max_page_size = user_settings.http.get_max_page_size()
+        self.page_size = min(user_settings.http.page_size, self.max_page_size) if self.max_page_size is not None \
+            else user_settings.http.page_size
+
+        if PROFILER.enabled:
+            PROFILER.register_cache('metadata cache (disk)', self.metadata_cache)
+            PROFILER.register_cache('memory cache', self.memory_cache)
+
+    def get_page_params(self, query_params: Optional[dict], page: int) -> dict:
+        params = dict(query_params) if query_params is not None else {}
+        params['page'] = page
+        params['page-size'] = self.page_size
+
+        return params
+
+    def is_last_page(self, items: List) -> bool:
+        """
+        A page shorter than the requested size is the last one only if the server is known to honor the size, it may
+        return smaller pages otherwise: then only an empty page ends the list.
+        """
+        return len(items) == 0 or (self.max_page_size is not None and len(items) < self.page_size)
+
+    def find_cached_catalogue(self, kind: str, key: str) -> Tuple[Optional[MetadataCacheEntry], bool]:
+        """
+        Returns the cached entry, if any, and whether it's fresh enough to be used without revalidation.
+        """
+        entry = self.metadata_cache.get(kind, key)
+
+        if entry is not None and self.metadata_cache.is_fresh(kind, entry):
+            self.metadata_cache.record_hit()
+            return entry, True
+
+        return entry, False
+
+    def revalidate_catalogue(self, kind: str, key: str, entry: MetadataCacheEntry):
+        self.metadata_cache.record_revalidation()
+        self.metadata_cache.touch(kind, key)
+
+        return entry.content
+
+    def store_catalogue(self, kind: str, key: str, content, response_headers, complete: bool):
+        self.metadata_cache.record_miss()
+
+        if complete:
+            self.metadata_cache.put(kind, key, content, response_headers.get('ETag'), response_headers.get('Last-Modified'))
+        else:
+            # validators only cover the first page, so elements spread over several pages cannot be revalidated
+            self.metadata_cache.put(kind, key, content)
+
+        return content
+
+    def invalidate_workspace(self, workspace: str):
+        """
+        Drops everything cached in memory about the specified workspace.
+        """
+        self.memory_cache.invalidate_matching(lambda key: len(key) > 1 and key[1] == workspace)
+
+    @staticmethod
+    def get_time_entries_params(start: str = None, end: str = None) -> dict:
+        query_params = {}
 
-    def get_user(self) -> ClockifyUser:
-        if self.cached_user is not None:
-            return self.cached_user
+        if start is not None:
+            query_params['start'] = start
+
+        if end is not None:
+            query_params['end'] = end
 
-        r = requests.get(ENDPOINT + '/user', headers=self.headers)
-        if r.status_code != 200:
-            raise Exception(f'Error while retrying the current user. Returned message: {r.json()["message"]}, '
-                            f'status code: {r.status_code}.')
+        return query_params
 
-        self.cached_user = ClockifyUser.map(r.json())
+    @staticmethod
+    def check_response(r, expected_status: int, message: str):
+        if r.status_code != expected_status:
+            raise Exception(f'{message}. Returned message: {r.json()["message"]}, status code: {r.status_code}.')
 
-        return self.cached_user
 
-    def get_workspaces(self) -> List[ClockifyWorkspace]:
-        if self.cached_workspaces.__len__() > 0:
-            return self.cached_workspaces
+class ClockifyApi(ClockifyApiBase):
+    session: ClockifySession
 
-        r = requests.get(ENDPOINT + 'workspaces/', headers=self.headers)
-        if r.status_code != 200:
-            raise Exception(f'Error while retrying workspaces. Returned message: {r.json()["message"]}, '
-                            f'status code: {r.status_code}.')
+    def __init__(self,
+                 user_settings: UserSettings,
+                 session: ClockifySession = None,
+                 metadata_cache: MetadataCache = None,
+                 memory_cache: LruCache = None):
+        super().__init__(user_settings, metadata_cache, memory_cache)
+        self.session = session if session is not None else ClockifySession(user_settings.http)
 
-        self.cached_workspaces = [ClockifyWorkspace.map(workspace) for workspace in r.json()]
+    def get_user(self) -> ClockifyUser:
+        return self.memory_cache.get_or_compute(
+            ('user', self.account),
+            lambda: ClockifyUser.map(
+                self.fetch_catalogue('user', self.account, self.endpoint + 'user', 'the current user', paginated=False)
+            )
+        )
 
-        return self.cached_workspaces
+    def get_workspaces(self) -> List[ClockifyWorkspace]:
+        return self.memory_cache.get_or_compute(
+            ('workspaces', self.account),
+            lambda: [
+                ClockifyWorkspace.map(workspace)
+                for workspace in self.fetch_catalogue('workspaces', self.account, self.endpoint + 'workspaces/',
+                                                      'workspaces', paginated=False)
+            ]
+        )
 
     def get_projects(self, workspace: str = None) -> List[ClockifyProject]:
+        return self.get_projects_index(workspace).elements
+
+    def get_projects_index(self, workspace: str = None) -> CatalogueIndex:
         if workspace is None:
             workspace = self.get_user().default_workspace
 
-        if self.cached_workspace_projects.__contains__(workspace):
-            return self.cached_workspace_projects[workspace]
+        return self.get_catalogue_index(
+            ('projects', workspace),
+            lambda: [
+                ClockifyProject.map(project)
+                for project in self.fetch_catalogue('projects', workspace,
+                                                    self.endpoint + f'workspaces/{workspace}/projects/', 'projects')
+            ]
+        )
 
-        r = requests.get(ENDPOINT + f'workspaces/{workspace}/projects/?page-size=100', headers=self.headers)
-        if r.status_code != 200:
-            raise Exception(f'Error while retrying projects. Returned message: {r.json()["message"]}, '
-                            f'status code: {r.status_code}.')
+    def iter_projects(self, workspace: str = None) -> Iterator[ClockifyProject]:
+        if workspace is None:
+            workspace = self.get_user().default_workspace
 
-        self.cached_workspace_projects[workspace] = [ClockifyProject.map(project) for project in r.json()]
+        url = self.endpoint + f'workspaces/{workspace}/projects/'
 
-        return self.cached_workspace_projects[workspace]
+        for page in self.iter_pages(url, ClockifyProject.map, 'projects'):
+            yield from page
 
     def get_projects_by_name(self, project_name: str, workspace: str = None) -> List[ClockifyProject]:
-        pattern = re.compile(project_name)
-        return [project for project in self.get_projects(workspace) if pattern.match(project.name) is not None]
+        return self.get_projects_index(workspace).find_by_name(project_name)
 
     def get_project(self, project_id: str, workspace: str = None) -> ClockifyProject:
-        projects = [project for project in self.get_projects(workspace) if project_id == project.id]
+        project = self.get_projects_index(workspace).get_by_id(project_id)
 
-        if projects.__len__() != 1:
-            raise Exception(f'One and one project is expected for the id {project_id}, but found {projects.__len__()}')
+        if project is None:
+            raise Exception(f'One and one project is expected for the id {project_id}, but found 0')
 
-        return projects[0]
+        return project
 
     def get_tags(self, workspace: str = None) -> List[ClockifyTag]:
+        return self.get_tags_index(workspace).elements
+
+    def get_tags_index(self, workspace: str = None) -> CatalogueIndex:
         if workspace is None:
             workspace = self.get_user().default_workspace
 
-        if self.cached_workspace_tags.__contains__(workspace):
-            return self.cached_workspace_tags[workspace]
-
-        r = requests.get(ENDPOINT + f'workspaces/{workspace}/tags/', headers=self.headers)
-        if r.status_code != 200:
-            raise Exception(f'Error while retrying tags. Returned message: {r.json()["message"]}, '
-                            f'status code: {r.status_code}.')
+        return self.get_catalogue_index(
+            ('tags', workspace),
+            lambda: [
+                ClockifyTag.map(tag)
+                for tag in self.fetch_catalogue('tags', workspace, self.endpoint + f'workspaces/{workspace}/tags/',
+                                                'tags')
+            ]
+        )
 
-        self.cached_workspace_tags[workspace] = [ClockifyTag.map(tag) for tag in r.json()]
+    def iter_tags(self, workspace: str = None) -> Iterator[ClockifyTag]:
+        if workspace is None:
+            workspace = self.get_user().default_workspace
 
-        return self.cached_workspace_tags[workspace]
+        for page in self.iter_pages(self.endpoint + f'workspaces/{workspace}/tags/', ClockifyTag.map, 'tags'):
+            yield from page
 
     def get_tags_by_name(self, tag_name: str, workspace: str = None) -> List[ClockifyTag]:
-        pattern = re.compile(tag_name)
-        return [tag for tag in self.get_tags(workspace) if pattern.match(tag.name) is not None]
+        return self.get_tags_index(workspace).find_by_name(tag_name)
+
+    def get_tags_by_names(self, tag_names: List[str], workspace: str = None) -> List[ClockifyTag]:
+        return self.get_tags_index(workspace).get_by_names(tag_names)
+
+    def get_tags_by_ids(self, tag_ids: List[str], workspace: str = None) -> List[ClockifyTag]:
+        return self.get_tags_index(workspace).get_by_ids(tag_ids)
 
     def get_project_tasks(self, project: str, workspace: str = None) -> List[ClockifyTask]:
+        return self.get_project_tasks_index(project, workspace).elements
+
+    def get_project_tasks_index(self, project: str, workspace: str = None) -> CatalogueIndex:
         if workspace is None:
             workspace = self.get_user().default_workspace
 
-        if self.cached_project_tasks.__contains__(project):
-            return self.cached_project_tasks[project]
-
-        r = requests.get(ENDPOINT + f'workspaces/{workspace}/projects/{project}/tasks', headers=self.headers)
-        if r.status_code != 200:
-            raise Exception(f'Error while retrying tasks. Returned message: {r.json()["message"]}, '
-                            f'status code: {r.status_code}.')
-
-        self.cached_project_tasks[project] = [ClockifyTask.map(task) for task in r.json()]
+        return self.get_catalogue_index(
+            ('tasks', workspace, project),
+            lambda: [
+                ClockifyTask.map(task)
+                for task in self.fetch_catalogue('tasks', f'{workspace}/{project}',
+                                                 self.endpoint + f'workspaces/{workspace}/projects/{project}/tasks',
+                                                 'tasks')
+            ]
+        )
+
+    def iter_project_tasks(self, project: str, workspace: str = None) -> Iterator[ClockifyTask]:
+        if workspace is None:
+            workspace = self.get_user().default_workspace
 
-        return self.cached_project_tasks[project]
+        url = self.endpoint + f'workspaces/{workspace}/projects/{project}/tasks'
+        for page in self.iter_pages(url, ClockifyTask.map, 'tasks'):
+            yield from page
 
     def get_project_task(self, project_id: str, task_id: str, workspace: str = None) -> ClockifyTask:
-        tasks = [task for task in self.get_project_tasks(project_id, workspace) if task.id == task_id]
+        task = self.get_project_tasks_index(project_id, workspace).get_by_id(task_id)
 
-        if tasks.__len__() != 1:
-            raise Exception(f'One and one task is expected for the id {project_id}, but found {tasks.__len__()}')
+        if task is None:
+            raise Exception(f'One and one task is expected for the id {task_id}, but found 0')
 
-        return tasks[0]
+        return task
 
     def get_project_task_by_name(self, project: str, task_name: str, workspace: str = None) -> List[ClockifyTask]:
-        pattern = re.compile(task_name)
-        return [task for task in self.get_project_tasks(project, workspace) if pattern.match(task.name) is not None]
+        return self.get_project_tasks_index(project, workspace).find_by_name(task_name)
+
+    def get_catalogue_index(self, key: tuple, fetch: Callable[[], List]) -> CatalogueIndex:
+        # when the cached index expires, it's updated with the new catalogue rather than rebuilt
+        return self.memory_cache.get_or_compute(key, lambda: CatalogueIndex(fetch()), lambda index: index.update(fetch()))
 
     def find_time_entries(self, workspace: str = None, start: str = None, end: str = None) -> List[ClockifyTimeEntry]:
         if workspace is None:
             workspace = self.get_user().default_workspace
 
+        # time entries aren't cached: they're the data being compared, and they can grow with the period
+        return list(self.iter_time_entries(workspace, start, end))
+
+    def iter_time_entries(self,
+                          workspace: str = None,
+                          start: str = None,
+                          end: str = None) -> Iterator[ClockifyTimeEntry]:
+        if workspace is None:
+            workspace = self.get_user().default_workspace
+
         user = self.get_user().id
 
-        url = ENDPOINT + f'workspaces/{workspace}/user/{user}/time-entries'
-        query_params = {}
+        url = self.endpoint + f'workspaces/{workspace}/user/{user}/time-entries'
+        query_params = self.get_time_entries_params(start, end)
 
-        if start is not None:
-            query_params['start'] = start
+        for page in self.iter_pages(url, ClockifyTimeEntry.map, 'time entries', query_params):
+            yield from page
 
-        if end is not None:
-            query_params['end'] = end
+    def iter_pages(self,
+                   url: str,
+                   mapper: Optional[Callable],
+                   entity_name: str,
+                   query_params: dict = None,
+                   first_page: int = 1) -> Iterator[List]:
+        """
+        Iterates lazily over all the pages of the specified resource. The next page is fetched in the background while
+        the current one is mapped and consumed. Raw JSON elements are returned if there is no mapper.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page = first_page
+            next_page = executor.submit(self.fetch_page, url, entity_name, query_params, page)
+
+            while next_page is not None:
+                items = next_page.result()
 
-        r = requests.get(url, headers=self.headers, params=query_params)
-        if r.status_code != 200:
-            raise Exception(f'Error while retrying time entries. '
-                            f'Returned message: {r.json()["message"]}, status code: {r.status_code}.')
+                if self.is_last_page(items):
+                    next_page = None
+                else:
+                    page += 1
+                    next_page = executor.submit(self.fetch_page, url, entity_name, query_params, page)
 
-        return [ClockifyTimeEntry.map(entry) for entry in r.json()]
+                yield [mapper(item) for item in items] if mapper is not None else items
+
+    def fetch_page(self, url: str, entity_name: str, query_params: dict, page: int) -> List[dict]:
+        return self.fetch(url, entity_name, self.get_page_params(query_params, page)).json()
+
+    def fetch(self, url: str, entity_name: str, query_params: dict = None, headers: dict = None):
+        r = self.session.get(url, headers={**self.headers, **(headers or {})}, params=query_params)
+        if r.status_code != 304:
+            self.check_response(r, 200, f'Error while retrying {entity_name}')
+
+        return r
+
+    def fetch_catalogue(self, kind: str, key: str, url: str, entity_name: str, paginated: bool = True):
+        """
+        Returns the raw JSON of the specified catalogue element from the metadata cache, when it's fresh, or from
+        Clockify. Stale elements are revalidated with a conditional request when Clockify provided validators.
+        """
+        entry, fresh = self.find_cached_catalogue(kind, key)
+        if fresh:
+            return entry.content
+
+        query_params = self.get_page_params(None, 1) if paginated else None
+        headers = entry.get_conditional_headers() if entry is not None else None
+
+        r = self.fetch(url, entity_name, query_params, headers)
+        if r.status_code == 304:
+            return self.revalidate_catalogue(kind, key, entry)
+
+        content = r.json()
+        complete = not paginated or self.is_last_page(content)
+
+        if not complete:
+            next_pages = [item for page in self.iter_pages(url, None, entity_name, first_page=2) for item in page]
+
+            # validators of the first page still cover everything when the next pages are empty
+            complete = len(next_pages) == 0
+            content += next_pages
+
+        return self.store_catalogue(kind, key, content, r.headers, complete)
 
     def add_time_entry(self, time_entry: ClockifyTimeNewEntry) -> ClockifyTimeEntry:
-        url = ENDPOINT + f'/workspaces/{time_entry.workspaceId}/time-entries'
-        r = requests.post(url, json.dumps(time_entry.__dict__()), headers=self.headers)
+        url = self.endpoint + f'workspaces/{time_entry.workspaceId}/time-entries'
+        r = self.session.post(url, json.dumps(time_entry.__dict__()), headers=self.headers)
+        self.check_response(r, 201, 'Error while adding a time entry')
 
-        if r.status_code != 201:
-            raise Exception(f'Error while adding a time entry. '
-                            f'Returned message: {r.json()["message"]}, status code: {r.status_code}.')
+        return ClockifyTimeEntry.map(r.json())
+
+    def update_time_entry(self, time_entry_id: str, time_entry: ClockifyTimeNewEntry) -> ClockifyTimeEntry:
+        url = self.endpoint + f'workspaces/{time_entry.workspaceId}/time-entries/{time_entry_id}'
+        r = self.session.put(url, json.dumps(time_entry.__dict__()), headers=self.headers)
+        self.check_response(r, 200, 'Error while updating a time entry')
 
         return ClockifyTimeEntry.map(r.json())
 
@@ -161,9 +354,6 @@ class ClockifyApi:
         if workspace_id is None:
             workspace_id = self.get_user().default_workspace
 
-        url = ENDPOINT + f'/workspaces/{workspace_id}/time-entries/{time_entry_id}'
-        r = requests.delete(url, headers=self.headers)
-
-        if r.status_code != 204:
-            raise Exception(f'Error while deleting a time entry. '
-                            f'Returned message: {r.json()["message"]}, status code: {r.status_code}.')
+        url = self.endpoint + f'workspaces/{workspace_id}/time-entries/{time_entry_id}'
+        r = self.session.delete(url, headers=self.headers)
+        self.check_response(r, 204, 'Error while deleting a time entry')
@@ -0,0 +1,329 @@
+import asyncio
+import json
+from typing import List, Callable, Optional, AsyncIterator, Awaitable, Dict, Hashable
+
+from kiss.clockify_api import ClockifyApiBase
+from kiss.clockify_async_session import AsyncClockifySession
+from kiss.clockify_index import CatalogueIndex
+from kiss.clockify_model import ClockifyWorkspace, ClockifyProject, ClockifyTimeEntry, ClockifyTask, ClockifyUser, \
+    ClockifyTag, ClockifyTimeNewEntry
+from kiss.lru_cache import LruCache
+from kiss.metadata_cache import MetadataCache
+from kiss.user_settings import UserSettings
+
+
+class AsyncClockifyApi(ClockifyApiBase):
+    """
+    Asynchronous Clockify client, it offers the same methods as ClockifyApi, but as coroutines. Several instances can
+    share the same session, and so the same connection pool and rate limit.
+
+    Usage:
+        async with AsyncClockifyApi(user_settings) as api:
+            projects, entries = await asyncio.gather(api.get_projects(), api.find_time_entries(start=..., end=...))
+    """
+    session: AsyncClockifySession
+    pending: Dict[Hashable, asyncio.Future]
+
+    def __init__(self,
+                 user_settings: UserSettings,
+                 session: AsyncClockifySession = None,
+                 metadata_cache: MetadataCache = None,
+                 memory_cache: LruCache = None):
+        super().__init__(user_settings, metadata_cache, memory_cache)
+        self.session = session if session is not None else AsyncClockifySession(user_settings.http)
+        self.pending = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+        await asyncio.get_event_loop().run_in_executor(None, self.metadata_cache.flush)
+
+    async def get_user(self) -> ClockifyUser:
+        return await self.get_or_compute(
+            ('user', self.account),
+            lambda: self.map_catalogue(ClockifyUser.map, 'user', self.account, self.endpoint + 'user',
+                                       'the current user', paginated=False)
+        )
+
+    async def get_workspaces(self) -> List[ClockifyWorkspace]:
+        return await self.get_or_compute(
+            ('workspaces', self.account),
+            lambda: self.map_catalogue_elements(ClockifyWorkspace.map, 'workspaces', self.account,
+                                                self.endpoint + 'workspaces/', 'workspaces', paginated=False)
+        )
+
+    async def get_projects(self, workspace: str = None) -> List[ClockifyProject]:
+        return (await self.get_projects_index(workspace)).elements
+
+    async def get_projects_index(self, workspace: str = None) -> CatalogueIndex:
+        if workspace is None:
+            workspace = (await self.get_user()).default_workspace
+
+        return await self.get_catalogue_index(
+            ('projects', workspace),
+            lambda: self.map_catalogue_elements(ClockifyProject.map, 'projects', workspace,
+                                                self.endpoint + f'workspaces/{workspace}/projects/', 'projects')
+        )
+
+    async def iter_projects(self, workspace: str = None) -> AsyncIterator[ClockifyProject]:
+        if workspace is None:
+            workspace = (await self.get_user()).default_workspace
+
+        url = self.endpoint + f'workspaces/{workspace}/projects/'
+        async for page in self.iter_pages(url, ClockifyProject.map, 'projects'):
+            for project in page:
+                yield project
+
+    async def get_projects_by_name(self, project_name: str, workspace: str = None) -> List[ClockifyProject]:
+        return (await self.get_projects_index(workspace)).find_by_name(project_name)
+
+    async def get_project(self, project_id: str, workspace: str = None) -> ClockifyProject:
+        project = (await self.get_projects_index(workspace)).get_by_id(project_id)
+
+        if project is None:
+            raise Exception(f'One and one project is expected for the id {project_id}, but found 0')
+
+        return project
+
+    async def get_tags(self, workspace: str = None) -> List[ClockifyTag]:
+        return (await self.get_tags_index(workspace)).elements
+
+    async def get_tags_index(self, workspace: str = None) -> CatalogueIndex:
+        if workspace is None:
+            workspace = (await self.get_user()).default_workspace
+
+        return await self.get_catalogue_index(
+            ('tags', workspace),
+            lambda: self.map_catalogue_elements(ClockifyTag.map, 'tags', workspace,
+                                                self.endpoint + f'workspaces/{workspace}/tags/', 'tags')
+        )
+
+    async def iter_tags(self, workspace: str = None) -> AsyncIterator[ClockifyTag]:
+        if workspace is None:
+            workspace = (await self.get_user()).default_workspace
+
+        async for page in self.iter_pages(self.endpoint + f'workspaces/{workspace}/tags/', ClockifyTag.map, 'tags'):
+            for tag in page:
+                yield tag
+
+    async def get_tags_by_name(self, tag_name: str, workspace: str = None) -> List[ClockifyTag]:
+        return (await self.get_tags_index(workspace)).find_by_name(tag_name)
+
+    async def get_tags_by_names(self, tag_names: List[str], workspace: str = None) -> List[ClockifyTag]:
+        return (await self.get_tags_index(workspace)).get_by_names(tag_names)
+
+    async def get_tags_by_ids(self, tag_ids: List[str], workspace: str = None) -> List[ClockifyTag]:
+        return (await self.get_tags_index(workspace)).get_by_ids(tag_ids)
+
+    async def get_project_tasks(self, project: str, workspace: str = None) -> List[ClockifyTask]:
+        return (await self.get_project_tasks_index(project, workspace)).elements
+
+    async def get_project_tasks_index(self, project: str, workspace: str = None) -> CatalogueIndex:
+        if workspace is None:
+            workspace = (await self.get_user()).default_workspace
+
+        return await self.get_catalogue_index(
+            ('tasks', workspace, project),
+            lambda: self.map_catalogue_elements(ClockifyTask.map, 'tasks', f'{workspace}/{project}',
+                                                self.endpoint + f'workspaces/{workspace}/projects/{project}/tasks',
+                                                'tasks')
+        )
+
+    async def iter_project_tasks(self, project: str, workspace: str = None) -> AsyncIterator[ClockifyTask]:
+        if workspace is None:
+            workspace = (await self.get_user()).default_workspace
+
+        url = self.endpoint + f'workspaces/{workspace}/projects/{project}/tasks'
+        async for page in self.iter_pages(url, ClockifyTask.map, 'tasks'):
+            for task in page:
+                yield task
+
+    async def get_project_task(self, project_id: str, task_id: str, workspace: str = None) -> ClockifyTask:
+        task = (await self.get_project_tasks_index(project_id, workspace)).get_by_id(task_id)
+
+        if task is None:
+            raise Exception(f'One and one task is expected for the id {task_id}, but found 0')
+
+        return task
+
+    async def get_project_task_by_name(self,
+                                       project: str,
+                                       task_name: str,
+                                       workspace: str = None) -> List[ClockifyTask]:
+        return (await self.get_project_tasks_index(project, workspace)).find_by_name(task_name)
+
+    async def find_time_entries(self,
+                                workspace: str = None,
+                                start: str = None,
+                                end: str = None) -> List[ClockifyTimeEntry]:
+        user = await self.get_user()
+
+        if workspace is None:
+            workspace = user.default_workspace
+
+        return await self.collect(self.iter_time_entries(workspace, start, end))
+
+    async def iter_time_entries(self,
+                                workspace: str = None,
+                                start: str = None,
+                                end: str = None) -> AsyncIterator[ClockifyTimeEntry]:
+        user = await self.get_user()
+
+        if workspace is None:
+            workspace = user.default_workspace
+
+        url = self.endpoint + f'workspaces/{workspace}/user/{user.id}/time-entries'
+        query_params = self.get_time_entries_params(start, end)
+
+        async for page in self.iter_pages(url, ClockifyTimeEntry.map, 'time entries', query_params):
+            for time_entry in page:
+                yield time_entry
+
+    async def add_time_entry(self, time_entry: ClockifyTimeNewEntry) -> ClockifyTimeEntry:
+        url = self.endpoint + f'workspaces/{time_entry.workspaceId}/time-entries'
+        r = await self.session.post(url, json.dumps(time_entry.__dict__()), headers=self.headers)
+        self.check_response(r, 201, 'Error while adding a time entry')
+
+        return ClockifyTimeEntry.map(r.json())
+
+    async def update_time_entry(self, time_entry_id: str, time_entry: ClockifyTimeNewEntry) -> ClockifyTimeEntry:
+        url = self.endpoint + f'workspaces/{time_entry.workspaceId}/time-entries/{time_entry_id}'
+        r = await self.session.put(url, json.dumps(time_entry.__dict__()), headers=self.headers)
+        self.check_response(r, 200, 'Error while updating a time entry')
+
+        return ClockifyTimeEntry.map(r.json())
+
+    async def delete_time_entry(self, time_entry_id: str, workspace_id: str = None):
+        if workspace_id is None:
+            workspace_id = (await self.get_user()).default_workspace
+
+        url = self.endpoint + f'workspaces/{workspace_id}/time-entries/{time_entry_id}'
+        r = await self.session.delete(url, headers=self.headers)
+        self.check_response(r, 204, 'Error while deleting a time entry')
+
+    async def iter_pages(self,
+                         url: str,
+                         mapper: Optional[Callable],
+                         entity_name: str,
+                         query_params: dict = None,
+                         first_page: int = 1) -> AsyncIterator[List]:
+        """
+        Iterates lazily over all the pages of the specified resource. The next page is fetched concurrently while
+        the current one is mapped and consumed. Raw JSON elements are returned if there is no mapper.
+        """
+        page = first_page
+        next_page = asyncio.ensure_future(self.fetch_page(url, entity_name, query_params, page))
+
+        try:
+            while next_page is not None:
+                items = await next_page
+
+                if self.is_last_page(items):
+                    next_page = None
+                else:
+                    page += 1
+                    next_page = asyncio.ensure_future(self.fetch_page(url, entity_name, query_params, page))
+
+                yield [mapper(item) for item in items] if mapper is not None else items
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def fetch_page(self, url: str, entity_name: str, query_params: dict, page: int) -> List[dict]:
+        return (await self.fetch(url, entity_name, self.get_page_params(query_params, page))).json()
+
+    async def fetch(self, url: str, entity_name: str, query_params: dict = None, headers: dict = None):
+        r = await self.session.get(url, headers={**self.headers, **(headers or {})}, params=query_params)
+        if r.status_code != 304:
+            self.check_response(r, 200, f'Error while retrying {entity_name}')
+
+        return r
+
+    async def fetch_catalogue(self, kind: str, key: str, url: str, entity_name: str, paginated: bool = True):
+        """
+        Returns the raw JSON of the specified catalogue element from the metadata cache, when it's fresh, or from
+        Clockify. Stale elements are revalidated with a conditional request when Clockify provided validators. The
+        cache file is read in the default executor, and written by close, so that the event loop is never blocked.
+        """
+        loop = asyncio.get_event_loop()
+
+        entry, fresh = await loop.run_in_executor(None, self.find_cached_catalogue, kind, key)
+        if fresh:
+            return entry.content
+
+        query_params = self.get_page_params(None, 1) if paginated else None
+        headers = entry.get_conditional_headers() if entry is not None else None
+
+        r = await self.fetch(url, entity_name, query_params, headers)
+        if r.status_code == 304:
+            return await loop.run_in_executor(None, self.revalidate_catalogue, kind, key, entry)
+
+        content = r.json()
+        complete = not paginated or self.is_last_page(content)
+
+        if not complete:
+            next_pages = []
+            async for page in self.iter_pages(url, None, entity_name, first_page=2):
+                next_pages += page
+
+            # validators of the first page still cover everything when the next pages are empty
+            complete = len(next_pages) == 0
+            content += next_pages
+
+        return await loop.run_in_executor(None, self.store_catalogue, kind, key, content, r.headers, complete)
+
+    async def map_catalogue(self, mapper: Callable, kind: str, key: str, url: str, entity_name: str,
+                            paginated: bool = True):
+        return mapper(await self.fetch_catalogue(kind, key, url, entity_name, paginated))
+
+    async def map_catalogue_elements(self, mapper: Callable, kind: str, key: str, url: str, entity_name: str,
+                                     paginated: bool = True) -> List:
+        return [mapper(element) for element in await self.fetch_catalogue(kind, key, url, entity_name, paginated)]
+
+    async def get_catalogue_index(self, key: tuple, fetch: Callable[[], Awaitable[List]]) -> CatalogueIndex:
+        async def refresh(index: CatalogueIndex):
+            return index.update(await fetch())
+
+        async def compute():
+            return CatalogueIndex(await fetch())
+
+        # when the cached index expires, it's updated with the new catalogue rather than rebuilt
+        return await self.get_or_compute(key, compute, refresh)
+
+    async def get_or_compute(self,
+                             key: Hashable,
+                             compute: Callable[[], Awaitable],
+                             refresh: Callable[[object], Awaitable] = None):
+        """
+        Asynchronous counterpart of LruCache.get_or_compute, concurrent coroutines asking for the same missing element
+        wait for the same computation.
+        """
+        value, expired = self.memory_cache.get_with_expiration(key)
+
+        if value is not None and not expired:
+            return value
+
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(
+                refresh(value) if expired and refresh is not None else compute()
+            )
+
+        pending = self.pending[key]
+        try:
+            value = await asyncio.shield(pending)
+        finally:
+            if pending.done() and self.pending.get(key) is pending:
+                del self.pending[key]
+
+        self.memory_cache.put(key, value)
+
+        return value
+
+    @staticmethod
+    async def collect(iterator: AsyncIterator) -> List:
+        return [element async for element in iterator]
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+from typing import Optional, Mapping
+
+from kiss.clockify_session import TokenBucket, RetryPolicy
+from kiss.profiler import PROFILER, get_route
+from kiss.user_settings import HttpSettings
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class ClockifyResponse:
+    """
+    Response read from aiohttp, headers are case-insensitive like the ones of requests.
+    """
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+
+    def __init__(self, status_code: int, headers: Mapping[str, str], content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content) if len(self.content) > 0 else None
+
+
+class AsyncClockifySession:
+    """
+    Asynchronous counterpart of ClockifySession based on aiohttp: connections are pooled and re-used, requests are
+    retried and throttled the same way.
+    """
+    settings: HttpSettings
+    rate_limiter: TokenBucket
+    retry_policy: RetryPolicy
+
+    def __init__(self, settings: HttpSettings):
+        if aiohttp is None:
+            raise Exception('The asynchronous Clockify client requires aiohttp, '
+                            'please install it: pip install clockify_kiss[async]')
+
+        self.settings = settings
+        self.rate_limiter = TokenBucket(settings.requests_per_second)
+        self.retry_policy = RetryPolicy(settings)
+        self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def get(self, url: str, **kwargs) -> ClockifyResponse:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, data=None, **kwargs) -> ClockifyResponse:
+        return await self.request('POST', url, data=data, **kwargs)
+
+    async def put(self, url: str, data=None, **kwargs) -> ClockifyResponse:
+        return await self.request('PUT', url, data=data, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> ClockifyResponse:
+        return await self.request('DELETE', url, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs) -> ClockifyResponse:
+        attempt = 0
+
+        while True:
+            throttled = self.rate_limiter.reserve()
+            await asyncio.sleep(throttled)
+            start = time.perf_counter()
+
+            try:
+                async with self.get_session().request(method, url, **kwargs) as r:
+                    response = ClockifyResponse(r.status, r.headers.copy(), await r.read())
+            except aiohttp.ClientConnectionError:
+                if PROFILER.enabled:
+                    self.record_request(method, url, None, start, throttled, kwargs.get('data'))
+
+                if not self.retry_policy.can_retry(method, None, attempt):
+                    raise
+
+                await asyncio.sleep(self.retry_policy.get_backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            if PROFILER.enabled:
+                self.record_request(method, url, response, start, throttled, kwargs.get('data'))
+
+            if not self.retry_policy.can_retry(method, response.status_code, attempt):
+                return response
+
+            await asyncio.sleep(self.retry_policy.get_retry_delay(response.headers.get('Retry-After'), attempt))
+            attempt += 1
+
+    def record_request(self,
+                       method: str,
+                       url: str,
+                       response: Optional[ClockifyResponse],
+                       start: float,
+                       throttled: float,
+                       data) -> None:
+        PROFILER.record_request(get_route(self.settings.endpoint, method, url),
+                                response.status_code if response is not None else None,
+                                start,
+                                time.perf_counter() - start,
+                                len(data) if data is not None else 0,
+                                len(response.content) if response is not None else 0,
+                                throttled)
+
+    def get_session(self):
+        # the aiohttp session must be created from a running event loop
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.settings.pool_size))
+
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
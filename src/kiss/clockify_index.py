@@ -0,0 +1,99 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Iterable, Pattern
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> Pattern:
+    return re.compile(pattern)
+
+
+class CatalogueIndex:
+    """
+    Index of catalogue elements (projects, tasks, tags) having an id and a name. Elements are kept in the order of the
+    catalogue, lookups by id and by exact name are done in constant time, lookups by regex are memoized.
+    """
+    elements: List
+    by_id: Dict[str, object]
+    by_name: Dict[str, List]
+    positions: Dict[str, int]
+    matches: Dict[str, List]
+
+    def __init__(self, elements: Iterable = ()):
+        self.elements = []
+        self.by_id = {}
+        self.by_name = {}
+        self.positions = {}
+        self.matches = {}
+
+        self.update(elements)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def update(self, elements: Iterable):
+        """
+        Updates the index with the new content of the catalogue, only elements that have been added, renamed or
+        removed are re-indexed.
+        """
+        elements = list(elements)
+        ids = set()
+
+        for position, element in enumerate(elements):
+            ids.add(element.id)
+            previous = self.by_id.get(element.id)
+
+            if previous is None or previous.name != element.name:
+                if previous is not None:
+                    self.remove_name(previous)
+
+                self.by_name.setdefault(element.name, []).append(element)
+            elif previous is not element:
+                same_name = self.by_name[element.name]
+                same_name[same_name.index(previous)] = element
+
+            self.by_id[element.id] = element
+            self.positions[element.id] = position
+
+        for removed_id in [element_id for element_id in self.by_id if element_id not in ids]:
+            self.remove_name(self.by_id.pop(removed_id))
+            del self.positions[removed_id]
+
+        self.elements = elements
+        self.matches = {}
+
+        return self
+
+    def get_by_id(self, element_id: str):
+        return self.by_id.get(element_id)
+
+    def get_by_ids(self, element_ids: Iterable[str]) -> List:
+        return self.sort([self.by_id[element_id] for element_id in set(element_ids) if element_id in self.by_id])
+
+    def get_by_name(self, name: str) -> List:
+        return list(self.by_name.get(name, []))
+
+    def get_by_names(self, names: Iterable[str]) -> List:
+        return self.sort([element for name in set(names) for element in self.by_name.get(name, [])])
+
+    def find_by_name(self, pattern: str) -> List:
+        """
+        Returns elements whose name matches the regex from the beginning (see re.match).
+        """
+        if pattern not in self.matches:
+            compiled = compile_pattern(pattern)
+            self.matches[pattern] = [element for element in self.elements if compiled.match(element.name) is not None]
+
+        return list(self.matches[pattern])
+
+    def sort(self, elements: List) -> List:
+        elements.sort(key=lambda element: self.positions[element.id])
+
+        return elements
+
+    def remove_name(self, element) -> None:
+        same_name = self.by_name.get(element.name, [])
+        same_name[:] = [other for other in same_name if other.id != element.id]
+
+        if len(same_name) == 0:
+            self.by_name.pop(element.name, None)
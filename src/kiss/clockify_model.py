@@ -1,31 +1,104 @@
-from typing import List
+import sys
+from datetime import datetime
+from typing import List, Tuple, Optional
 
 from kiss.time_entries_file import DateTimeInterval
-from kiss.utils import from_z_datetime_to_local, parse_z_datetime
+from kiss.timestamps import from_zulu_to_epoch, from_epoch_to_zulu, from_datetime_to_epoch, from_epoch_to_local, \
+    get_local_zone
+
+
+# workspace, user, project, task, sorted tags, start and end epoch seconds (None while running), and description of a
+# time entry
+TimeEntryFingerprint = Tuple[str, str, str, str, Tuple[str, ...], int, int, str]
+
+
+def intern_id(element_id: Optional[str]) -> Optional[str]:
+    """
+    Ids are repeated in thousands of time entries, interned ids are stored only once.
+    """
+    return sys.intern(element_id) if element_id is not None else None
+
+
+def get_time_entry_fingerprint(workspace_id: str,
+                               user_id: str,
+                               project_id: str,
+                               task_id: str,
+                               tag_ids: List[str],
+                               time_interval,
+                               description: str) -> TimeEntryFingerprint:
+    return (workspace_id, user_id, project_id, task_id, tuple(sorted(tag_ids or [])),
+            time_interval.start_at, time_interval.end_at, description)
 
 
 class ClockifyTimeInterval:
-    start: str
-    end: str
+    """
+    Interval stored as epoch seconds, the ISO-8601 strings used by Clockify are computed when needed. The local
+    datetime interval is computed once. The end of a running timer is None.
+    """
+    __slots__ = ('start_at', 'end_at', 'datetime_interval')
+
+    # attributes serialized in JSON
+    serialized_fields = ('start', 'end')
+
+    start_at: int
+    end_at: Optional[int]
+    datetime_interval: DateTimeInterval
 
     def __init__(self,
                  start: str,
-                 end: str):
-        self.start = start
-        self.end = end
+                 end: Optional[str]):
+        self.start_at = from_zulu_to_epoch(start)
+        self.end_at = from_zulu_to_epoch(end) if end is not None else None
+        self.datetime_interval = None
+
+    @property
+    def start(self) -> str:
+        return from_epoch_to_zulu(self.start_at)
+
+    @property
+    def end(self) -> Optional[str]:
+        return from_epoch_to_zulu(self.end_at) if self.end_at is not None else None
+
+    def is_running(self) -> bool:
+        return self.end_at is None
 
     def as_datetime_interval(self) -> DateTimeInterval:
-        return DateTimeInterval(
-            from_z_datetime_to_local(parse_z_datetime(self.start)),
-            from_z_datetime_to_local(parse_z_datetime(self.end))
-        )
+        """
+        Returns the local interval, a running timer ends now (it's then computed again on every call).
+        """
+        if self.is_running():
+            start = from_epoch_to_local(self.start_at)
+            return DateTimeInterval(start, max(start, datetime.now(get_local_zone())))
+
+        if self.datetime_interval is None:
+            self.datetime_interval = DateTimeInterval(
+                from_epoch_to_local(self.start_at),
+                from_epoch_to_local(self.end_at)
+            )
+
+        return self.datetime_interval
 
     @staticmethod
     def map(json):
         return ClockifyTimeInterval(json['start'], json['end'])
 
+    @staticmethod
+    def from_epochs(start_at: int, end_at: Optional[int]):
+        interval = ClockifyTimeInterval.__new__(ClockifyTimeInterval)
+        interval.start_at = start_at
+        interval.end_at = end_at
+        interval.datetime_interval = None
+
+        return interval
+
+    @staticmethod
+    def from_datetimes(start: datetime, end: datetime):
+        return ClockifyTimeInterval.from_epochs(from_datetime_to_epoch(start), from_datetime_to_epoch(end))
+
 
 class ClockifyUser:
+    __slots__ = ('id', 'email', 'default_workspace')
+
     id: str
     email: str
     default_workspace: str
@@ -44,6 +117,8 @@ class ClockifyUser:
 
 
 class ClockifyWorkspace:
+    __slots__ = ('id', 'name')
+
     id: str
     name: str
 
@@ -59,6 +134,8 @@ class ClockifyWorkspace:
 
 
 class ClockifyProject:
+    __slots__ = ('id', 'name', 'archived')
+
     id: str
     name: str
     archived: bool
@@ -77,6 +154,8 @@ class ClockifyProject:
 
 
 class ClockifyTag:
+    __slots__ = ('id', 'name', 'workspace_id')
+
     id: str
     name: str
     workspace_id: str
@@ -95,6 +174,8 @@ class ClockifyTag:
 
 
 class ClockifyTask:
+    __slots__ = ('id', 'name', 'project_id', 'status', 'assignee_ids')
+
     id: str
     name: str
     project_id: str
@@ -119,6 +200,9 @@ class ClockifyTask:
 
 
 class ClockifyTimeEntry:
+    __slots__ = ('id', 'description', 'project_id', 'tags', 'task', 'time_interval', 'workspace_id',
+                 'user_id')
+
     id: str
     description: str
     project_id: str
@@ -146,21 +230,28 @@ class ClockifyTimeEntry:
         self.workspace_id = workspace_id
         self.user_id = user_id
 
+    def get_fingerprint(self) -> TimeEntryFingerprint:
+        return get_time_entry_fingerprint(self.workspace_id, self.user_id, self.project_id, self.task, self.tags,
+                                          self.time_interval, self.description)
+
     @staticmethod
     def map(entry):
         return ClockifyTimeEntry(
             entry["id"],
             entry["description"],
-            entry['projectId'],
-            entry['tagIds'],
-            entry['taskId'],
+            intern_id(entry['projectId']),
+            [intern_id(tag_id) for tag_id in entry['tagIds']] if entry['tagIds'] is not None else [],
+            intern_id(entry['taskId']),
             ClockifyTimeInterval.map(entry['timeInterval']),
-            entry['workspaceId'],
-            entry['userId']
+            intern_id(entry['workspaceId']),
+            intern_id(entry['userId'])
         )
 
 
 class ClockifyTimeNewEntry:
+    __slots__ = ('id', 'description', 'project_id', 'user_id', 'task_id', 'tag_ids', 'time_interval',
+                 'workspaceId')
+
     id: str
     description: str
     project_id: str
@@ -188,6 +279,10 @@ class ClockifyTimeNewEntry:
         self.time_interval = time_interval
         self.workspaceId = workspace_id
 
+    def get_fingerprint(self) -> TimeEntryFingerprint:
+        return get_time_entry_fingerprint(self.workspaceId, self.user_id, self.project_id, self.task_id, self.tag_ids,
+                                          self.time_interval, self.description)
+
     def __dict__(self):
         return {
             'id': self.id,
@@ -0,0 +1,184 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from kiss.profiler import PROFILER, get_route
+from kiss.user_settings import HttpSettings
+
+RETRIED_STATUS_CODES = [429, 500, 502, 503, 504]
+IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']
+
+
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+    updated_at: float
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise Exception(f'The rate must be strictly positive, but was {rate}.')
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Waits until a token can be used, and returns the time waited (in seconds).
+        """
+        wait = self.reserve()
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+    def reserve(self) -> float:
+        """
+        Reserves a token and returns the time to wait (in seconds) before it can be used.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+            # the token is reserved immediately, callers arriving later will wait for the next ones
+            self.tokens -= 1
+
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+class RetryPolicy:
+    settings: HttpSettings
+
+    def __init__(self, settings: HttpSettings):
+        self.settings = settings
+
+    def can_retry(self, method: str, status_code: int, attempt: int) -> bool:
+        if attempt >= self.settings.max_retries:
+            return False
+
+        if status_code == 429:
+            # the request has not been processed, so it's safe to retry whatever the method
+            return True
+
+        if status_code is not None and status_code not in RETRIED_STATUS_CODES:
+            return False
+
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def get_retry_delay(self, retry_after: str, attempt: int) -> float:
+        retry_after_delay = self.parse_retry_after(retry_after)
+
+        if retry_after_delay is not None:
+            return min(retry_after_delay, self.settings.max_backoff)
+
+        return self.get_backoff_delay(attempt)
+
+    def get_backoff_delay(self, attempt: int) -> float:
+        return min(self.settings.backoff_factor * (2 ** attempt), self.settings.max_backoff)
+
+    @staticmethod
+    def parse_retry_after(value: str) -> float:
+        if value is None:
+            return None
+
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+
+        try:
+            retry_date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        if retry_date.tzinfo is None:
+            retry_date = retry_date.replace(tzinfo=timezone.utc)
+
+        return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+class ClockifySession:
+    settings: HttpSettings
+    session: requests.Session
+    rate_limiter: TokenBucket
+    retry_policy: RetryPolicy
+
+    def __init__(self, settings: HttpSettings):
+        self.settings = settings
+
+        adapter = HTTPAdapter(pool_connections=settings.pool_size, pool_maxsize=settings.pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.rate_limiter = TokenBucket(settings.requests_per_second)
+        self.retry_policy = RetryPolicy(settings)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, data=None, **kwargs) -> requests.Response:
+        return self.request('POST', url, data=data, **kwargs)
+
+    def put(self, url: str, data=None, **kwargs) -> requests.Response:
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        attempt = 0
+
+        while True:
+            throttled = self.rate_limiter.acquire()
+            start = time.perf_counter()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError:
+                if PROFILER.enabled:
+                    self.record_request(method, url, None, start, throttled, kwargs.get('data'))
+
+                if not self.retry_policy.can_retry(method, None, attempt):
+                    raise
+
+                time.sleep(self.retry_policy.get_backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            if PROFILER.enabled:
+                self.record_request(method, url, response, start, throttled, kwargs.get('data'))
+
+            if not self.retry_policy.can_retry(method, response.status_code, attempt):
+                return response
+
+            time.sleep(self.retry_policy.get_retry_delay(response.headers.get('Retry-After'), attempt))
+            attempt += 1
+
+    def record_request(self,
+                       method: str,
+                       url: str,
+                       response: Optional[requests.Response],
+                       start: float,
+                       throttled: float,
+                       data) -> None:
+        PROFILER.record_request(get_route(self.settings.endpoint, method, url),
+                                response.status_code if response is not None else None,
+                                start,
+                                time.perf_counter() - start,
+                                len(data) if data is not None else 0,
+                                len(response.content) if response is not None else 0,
+                                throttled)
+
+    def close(self) -> None:
+        self.session.close()
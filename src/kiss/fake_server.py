@@ -0,0 +1,452 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Dict, List, Optional, Tuple, Pattern
+from urllib.parse import urlparse, parse_qs
+
+BASE_PATH = '/api/v1/'
+
+
+@lru_cache(maxsize=32)
+def compile_route(route: str) -> Pattern:
+    """
+    Compiles a route like "workspaces/{workspace}/tags/", the trailing slash is optional.
+    """
+    return re.compile(re.sub(r'\{(\w+)\}', r'(?P<\1>[^/]+)', route.rstrip('/')) + '/?')
+
+
+def generate_id(*names: str) -> str:
+    """
+    Returns an id looking like a Clockify one, always the same for the same names, so that fixtures don't need ids.
+    """
+    return hashlib.sha1('/'.join(names).encode('utf-8')).hexdigest()[:24]
+
+
+class FakeClockifySettings:
+    latency: float
+    max_page_size: int
+    rate_limit_ratio: float
+    retry_after: int
+    seed: int
+
+    def __init__(self,
+                 latency: float = 0,
+                 max_page_size: int = 5000,
+                 rate_limit_ratio: float = 0,
+                 retry_after: int = None,
+                 seed: int = 0):
+        """
+        :param latency: seconds waited before answering every request
+        :param max_page_size: maximum number of elements of a page, whatever the requested page size, like Clockify
+        does above 5000 elements (clients must not request more to get all the pages)
+        :param rate_limit_ratio: ratio of requests rejected with 429 (Too Many Requests), between 0 and 1
+        :param retry_after: value of the Retry-After header of rejected requests, no header if not specified
+        :param seed: seed of the random rejection of requests, so that runs are reproducible
+        """
+        if not 0 <= rate_limit_ratio <= 1:
+            raise Exception(f'The rate limit ratio must be between 0 and 1, but was {rate_limit_ratio}.')
+
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.seed = seed
+
+
+class FakeClockifyState:
+    """
+    Everything the fake Clockify knows: users (by token), workspaces, projects, tasks, tags and time entries, stored
+    as the raw JSON Clockify returns. Requests of a token that is not part of the fixtures are served for a new user of
+    the default workspace, so that any settings file can be used.
+    """
+    users: Dict[str, dict]
+    workspaces: List[dict]
+    projects: Dict[str, List[dict]]
+    tasks: Dict[str, List[dict]]
+    tags: Dict[str, List[dict]]
+    time_entries: Dict[str, dict]
+
+    def __init__(self, workspaces: List[dict] = None):
+        self.users = {}
+        self.workspaces = workspaces if workspaces is not None else [{'id': generate_id('workspace'), 'name': 'Fake'}]
+        self.projects = {}
+        self.tasks = {}
+        self.tags = {}
+        self.time_entries = {}
+        self.lock = threading.Lock()
+
+    def get_default_workspace(self) -> str:
+        return self.workspaces[0]['id']
+
+    def get_user(self, token: str) -> dict:
+        with self.lock:
+            user = self.users.get(token)
+
+            if user is None:
+                user_id = generate_id('user', token)
+                user = {'id': user_id, 'email': f'{user_id}@fake.clockify',
+                        'defaultWorkspace': self.get_default_workspace()}
+                self.users[token] = user
+
+            return user
+
+    def add_project(self, workspace: str, project: dict) -> None:
+        project = dict(project)
+        project.setdefault('id', generate_id(workspace, 'project', project['name']))
+        project.setdefault('archived', False)
+
+        for task in project.pop('tasks', []):
+            self.add_task(project['id'], task)
+
+        self.projects.setdefault(workspace, []).append(project)
+
+    def add_task(self, project: str, task: dict) -> None:
+        task = dict(task)
+        task.setdefault('id', generate_id(project, 'task', task['name']))
+        task.setdefault('status', 'ACTIVE')
+        task.setdefault('assigneeIds', [])
+        task['projectId'] = project
+
+        self.tasks.setdefault(project, []).append(task)
+
+    def add_tag(self, workspace: str, tag: dict) -> None:
+        tag = dict(tag)
+        tag.setdefault('id', generate_id(workspace, 'tag', tag['name']))
+        tag['workspaceId'] = workspace
+
+        self.tags.setdefault(workspace, []).append(tag)
+
+    def find_time_entries(self, workspace: str, user: str, start: str = None, end: str = None) -> List[dict]:
+        """
+        Returns time entries starting in the specified period, the most recent first like Clockify does. Timestamps
+        are compared as strings, they are all in the same UTC format.
+        """
+        with self.lock:
+            time_entries = [
+                time_entry for time_entry in self.time_entries.values()
+                if time_entry['workspaceId'] == workspace and time_entry['userId'] == user
+                and (start is None or time_entry['timeInterval']['start'] >= start)
+                and (end is None or time_entry['timeInterval']['start'] <= end)
+            ]
+
+        return sorted(time_entries, key=lambda time_entry: time_entry['timeInterval']['start'], reverse=True)
+
+    def save_time_entry(self, workspace: str, user: str, body: dict, time_entry_id: str = None) -> dict:
+        time_entry = {
+            'id': time_entry_id if time_entry_id is not None else uuid.uuid4().hex[:24],
+            'description': body.get('description'),
+            'projectId': body.get('projectId'),
+            'taskId': body.get('taskId'),
+            'tagIds': body.get('tagIds'),
+            'timeInterval': {'start': body['start'], 'end': body.get('end')},
+            'workspaceId': workspace,
+            'userId': user
+        }
+
+        with self.lock:
+            self.time_entries[time_entry['id']] = time_entry
+
+        return time_entry
+
+    def has_time_entry(self, time_entry_id: str) -> bool:
+        with self.lock:
+            return time_entry_id in self.time_entries
+
+    def delete_time_entry(self, time_entry_id: str) -> bool:
+        with self.lock:
+            return self.time_entries.pop(time_entry_id, None) is not None
+
+    @staticmethod
+    def parse_from_dict(dic: dict):
+        """
+        Parses fixtures like:
+        {
+            "workspaces": [{"id": "...", "name": "..."}],
+            "users": [{"token": "...", "id": "...", "email": "...", "defaultWorkspace": "..."}],
+            "projects": [{"name": "...", "workspaceId": "...", "tasks": [{"name": "..."}]}],
+            "tags": [{"name": "...", "workspaceId": "..."}],
+            "timeEntries": [{"description": "...", "projectId": "...", "start": "...", "end": "...", "userId": "..."}]
+        }
+        Everything is optional, ids are generated when missing, and elements belong to the first workspace unless
+        specified otherwise.
+        """
+        state = FakeClockifyState(dic.get('workspaces'))
+        default_workspace = state.get_default_workspace()
+
+        for user in dic.get('users', []):
+            user = dict(user)
+            token = user.pop('token')
+            user.setdefault('id', generate_id('user', token))
+            user.setdefault('email', f'{user["id"]}@fake.clockify')
+            user.setdefault('defaultWorkspace', default_workspace)
+            state.users[token] = user
+
+        for project in dic.get('projects', []):
+            state.add_project(project.get('workspaceId', default_workspace), project)
+
+        for tag in dic.get('tags', []):
+            state.add_tag(tag.get('workspaceId', default_workspace), tag)
+
+        for time_entry in dic.get('timeEntries', []):
+            state.save_time_entry(time_entry.get('workspaceId', default_workspace), time_entry['userId'], time_entry,
+                                  time_entry.get('id'))
+
+        return state
+
+    @staticmethod
+    def load(file: str):
+        with open(file) as fixtures_file:
+            return FakeClockifyState.parse_from_dict(json.load(fixtures_file))
+
+
+class FakeClockifyStats:
+    """
+    Number of requests received per route (eg. "GET workspaces/{workspace}/projects/"), and number of requests
+    rejected because of the injected rate limit.
+    """
+    requests: Dict[str, int]
+    rejected: int
+
+    def __init__(self):
+        self.requests = {}
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def record_request(self, route: str) -> None:
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def record_rejection(self) -> None:
+        with self.lock:
+            self.rejected += 1
+
+    def get_nb_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def __str__(self):
+        lines = [f'{nb}\t{route}' for route, nb in sorted(self.requests.items())]
+        lines.append(f'{self.get_nb_requests()} request(s), {self.rejected} rejected with 429')
+
+        return '\n'.join(lines)
+
+
+class FakeClockifyHandler(BaseHTTPRequestHandler):
+    """
+    Serves the endpoints used by ClockifyApi, relative to BASE_PATH.
+    """
+    ROUTES = [
+        ('GET', 'user', 'get_user'),
+        ('GET', 'workspaces/', 'get_workspaces'),
+        ('GET', 'workspaces/{workspace}/projects/', 'get_projects'),
+        ('GET', 'workspaces/{workspace}/projects/{project}/tasks', 'get_tasks'),
+        ('GET', 'workspaces/{workspace}/tags/', 'get_tags'),
+        ('GET', 'workspaces/{workspace}/user/{user_id}/time-entries', 'get_time_entries'),
+        ('POST', 'workspaces/{workspace}/time-entries', 'add_time_entry'),
+        ('PUT', 'workspaces/{workspace}/time-entries/{time_entry}', 'update_time_entry'),
+        ('DELETE', 'workspaces/{workspace}/time-entries/{time_entry}', 'delete_time_entry'),
+    ]
+
+    # HTTP/1.1 so that connections are kept alive, like with Clockify, without delaying the body sent after the headers
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method: str) -> None:
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        body = self.read_body()
+
+        if self.server.settings.latency > 0:
+            time.sleep(self.server.settings.latency)
+
+        route, handler, parameters = self.find_route(method, url.path)
+        if route is None:
+            return self.send_json(404, {'message': f'Unknown resource {method} {url.path}', 'code': 404})
+
+        self.server.stats.record_request(route)
+
+        if self.server.is_rate_limited():
+            self.server.stats.record_rejection()
+            headers = {'Retry-After': str(self.server.settings.retry_after)} \
+                if self.server.settings.retry_after is not None else {}
+
+            return self.send_json(429, {'message': 'Too many requests', 'code': 429}, headers)
+
+        token = self.headers.get('X-Api-Key')
+        if token is None:
+            return self.send_json(401, {'message': 'Missing API key', 'code': 401})
+
+        getattr(self, handler)(self.server.state.get_user(token), query, body, **parameters)
+
+    def find_route(self, method: str, path: str) -> Tuple[Optional[str], Optional[str], Dict[str, str]]:
+        if not path.startswith(BASE_PATH):
+            return None, None, {}
+
+        path = re.sub('/+', '/', path[len(BASE_PATH):])
+
+        for route_method, route, handler in self.ROUTES:
+            match = compile_route(route).fullmatch(path)
+
+            if route_method == method and match is not None:
+                return f'{method} {route}', handler, match.groupdict()
+
+        return None, None, {}
+
+    def read_body(self) -> Optional[dict]:
+        length = int(self.headers.get('Content-Length') or 0)
+
+        return json.loads(self.rfile.read(length).decode('utf-8')) if length > 0 else None
+
+    def get_user(self, user: dict, query: dict, body: dict) -> None:
+        self.send_json(200, user)
+
+    def get_workspaces(self, user: dict, query: dict, body: dict) -> None:
+        self.send_json(200, self.server.state.workspaces)
+
+    def get_projects(self, user: dict, query: dict, body: dict, workspace: str) -> None:
+        self.send_page(self.server.state.projects.get(workspace, []), query)
+
+    def get_tasks(self, user: dict, query: dict, body: dict, workspace: str, project: str) -> None:
+        self.send_page(self.server.state.tasks.get(project, []), query)
+
+    def get_tags(self, user: dict, query: dict, body: dict, workspace: str) -> None:
+        self.send_page(self.server.state.tags.get(workspace, []), query)
+
+    def get_time_entries(self, user: dict, query: dict, body: dict, workspace: str, user_id: str) -> None:
+        time_entries = self.server.state.find_time_entries(workspace, user_id, query.get('start'), query.get('end'))
+
+        self.send_page(time_entries, query, cacheable=False)
+
+    def add_time_entry(self, user: dict, query: dict, body: dict, workspace: str) -> None:
+        self.send_json(201, self.server.state.save_time_entry(workspace, user['id'], body))
+
+    def update_time_entry(self, user: dict, query: dict, body: dict, workspace: str, time_entry: str) -> None:
+        if not self.server.state.has_time_entry(time_entry):
+            return self.send_json(404, {'message': f'Time entry {time_entry} not found', 'code': 404})
+
+        self.send_json(200, self.server.state.save_time_entry(workspace, user['id'], body, time_entry))
+
+    def delete_time_entry(self, user: dict, query: dict, body: dict, workspace: str, time_entry: str) -> None:
+        if not self.server.state.delete_time_entry(time_entry):
+            return self.send_json(404, {'message': f'Time entry {time_entry} not found', 'code': 404})
+
+        self.send_json(204, None)
+
+    def send_page(self, elements: List[dict], query: dict, cacheable: bool = True) -> None:
+        """
+        Sends the requested page, pages are never larger than the maximum page size of the server. Catalogue pages come with
+        an ETag, so that clients can revalidate them.
+        """
+        page = int(query.get('page', 1))
+        page_size = min(int(query.get('page-size', 50)), self.server.settings.max_page_size)
+        content = elements[(page - 1) * page_size:page * page_size]
+
+        if not cacheable:
+            return self.send_json(200, content)
+
+        etag = '"' + hashlib.sha1(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            return self.send_json(304, None, {'ETag': etag})
+
+        self.send_json(200, content, {'ETag': etag})
+
+    def send_json(self, status: int, content, headers: Dict[str, str] = None) -> None:
+        data = json.dumps(content).encode('utf-8') if content is not None else b''
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeClockifyServer(ThreadingMixIn, HTTPServer):
+    """
+    Local fake of the Clockify endpoints used by ClockifyApi, to run and measure the whole pipeline without Clockify.
+    Clients use it through the "endpoint" HTTP setting, see get_endpoint.
+
+    with FakeClockifyServer(FakeClockifyState.load('fixtures.json')) as server:
+        user_settings.http.endpoint = server.get_endpoint()
+    """
+    daemon_threads = True
+
+    state: FakeClockifyState
+    settings: FakeClockifySettings
+    stats: FakeClockifyStats
+
+    def __init__(self,
+                 state: FakeClockifyState = None,
+                 settings: FakeClockifySettings = None,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        """
+        The port is chosen by the system when not specified.
+        """
+        super().__init__((host, port), FakeClockifyHandler)
+
+        self.state = state if state is not None else FakeClockifyState()
+        self.settings = settings if settings is not None else FakeClockifySettings()
+        self.stats = FakeClockifyStats()
+        self.random = random.Random(self.settings.seed)
+        self.random_lock = threading.Lock()
+        self.thread = None
+
+    def get_endpoint(self) -> str:
+        host, port = self.server_address[:2]
+
+        return f'http://{host}:{port}{BASE_PATH}'
+
+    def is_rate_limited(self) -> bool:
+        if self.settings.rate_limit_ratio == 0:
+            return False
+
+        with self.random_lock:
+            return self.random.random() < self.settings.rate_limit_ratio
+
+    def start(self):
+        """
+        Serves requests in a background thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, Dict
+
+
+class LruCache:
+    """
+    Thread-safe in-memory cache bounded in size, the least recently used element is evicted first. Elements expire
+    after the time-to-live (in seconds) when there is one.
+    """
+    max_size: int
+    ttl: float
+    elements: 'OrderedDict[Hashable, Tuple[float, object]]'
+
+    hits: int
+    misses: int
+
+    def __init__(self, max_size: int = 256, ttl: float = None):
+        if max_size <= 0:
+            raise Exception(f'The maximum size of the cache must be strictly positive, but was {max_size}.')
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.elements = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key) is not None
+
+    def get(self, key: Hashable, default=None):
+        value, expired = self.get_with_expiration(key)
+
+        return value if value is not None and not expired else default
+
+    def get_with_expiration(self, key: Hashable) -> Tuple[object, bool]:
+        """
+        Returns the element, even if it has expired, and whether it has expired. Expired elements are removed.
+        """
+        with self.lock:
+            element = self.elements.get(key)
+
+            if element is None:
+                self.misses += 1
+                return None, False
+
+            stored_at, value = element
+            if self.ttl is not None and (time.monotonic() - stored_at) >= self.ttl:
+                del self.elements[key]
+                self.misses += 1
+                return value, True
+
+            self.elements.move_to_end(key)
+            self.hits += 1
+
+            return value, False
+
+    def put(self, key: Hashable, value) -> None:
+        with self.lock:
+            self.elements[key] = (time.monotonic(), value)
+            self.elements.move_to_end(key)
+
+            while len(self.elements) > self.max_size:
+                self.elements.popitem(last=False)
+
+    def get_or_compute(self,
+                       key: Hashable,
+                       compute: Callable[[], object],
+                       refresh: Callable[[object], object] = None):
+        """
+        Returns the cached element, or computes it when it's missing. When the element has expired and there is a
+        refresh function, the new element is computed from the expired one.
+        """
+        value, expired = self.get_with_expiration(key)
+
+        if value is None or expired:
+            # the computation is done outside the lock, two threads may compute the same element concurrently
+            value = refresh(value) if expired and refresh is not None else compute()
+            self.put(key, value)
+
+        return value
+
+    def snapshot(self, predicate: Callable[[Hashable], bool]) -> Dict[Hashable, object]:
+        """
+        Returns elements that have not expired and whose key matches the predicate, they can be put in another cache
+        (see put_all), for instance in another process.
+        """
+        now = time.monotonic()
+
+        with self.lock:
+            return {
+                key: value
+                for key, (stored_at, value) in self.elements.items()
+                if predicate(key) and (self.ttl is None or (now - stored_at) < self.ttl)
+            }
+
+    def put_all(self, elements: Dict[Hashable, object]) -> None:
+        for key, value in elements.items():
+            self.put(key, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self.lock:
+            self.elements.pop(key, None)
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self.lock:
+            for key in [key for key in self.elements if predicate(key)]:
+                del self.elements[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.elements.clear()
@@ -0,0 +1,189 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from kiss.user_settings import CacheSettings, UserSettings
+
+# caches having changes not written yet, they're written when the interpreter exits if they haven't been flushed before
+DIRTY_CACHES = set()
+
+
+class MetadataCacheEntry:
+    content: object
+    fetched_at: float
+    etag: str
+    last_modified: str
+
+    def __init__(self, content: object, fetched_at: float, etag: str = None, last_modified: str = None):
+        self.content = content
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, ttl: int) -> bool:
+        return (time.time() - self.fetched_at) < ttl
+
+    def get_conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+
+        return headers
+
+    def to_dict(self) -> dict:
+        return {
+            'content': self.content,
+            'fetchedAt': self.fetched_at,
+            'etag': self.etag,
+            'lastModified': self.last_modified
+        }
+
+    @staticmethod
+    def parse_from_dict(dic: dict):
+        return MetadataCacheEntry(dic['content'], dic['fetchedAt'], dic.get('etag'), dic.get('lastModified'))
+
+
+class MetadataCache:
+    """
+    Cache of the Clockify catalogue (user, workspaces, projects, tasks and tags) persisted as a JSON file, so that it
+    survives between invocations. Entries hold the raw JSON returned by Clockify. Changes are kept in memory and the
+    file is written once by flush, at the end of the command or when the interpreter exits.
+    """
+    file: str
+    settings: CacheSettings
+    entries: Dict[str, MetadataCacheEntry]
+    dirty: bool
+
+    hits: int
+    misses: int
+    revalidations: int
+
+    def __init__(self, file: str, settings: CacheSettings):
+        self.file = file
+        self.settings = settings
+        self.entries = None
+        self.dirty = False
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, kind: str, key: str) -> Optional[MetadataCacheEntry]:
+        """
+        Returns the entry even if it's stale, use is_fresh to know if it can be used without revalidation.
+        """
+        if not self.settings.enabled:
+            return None
+
+        with self.lock:
+            return self.load().get(self.get_entry_key(kind, key))
+
+    def is_fresh(self, kind: str, entry: MetadataCacheEntry) -> bool:
+        return entry.is_fresh(self.settings.get_ttl(kind))
+
+    def put(self, kind: str, key: str, content: object, etag: str = None, last_modified: str = None) -> None:
+        if not self.settings.enabled:
+            return
+
+        with self.lock:
+            self.load()[self.get_entry_key(kind, key)] = MetadataCacheEntry(content, time.time(), etag, last_modified)
+            self.mark_dirty()
+
+    def touch(self, kind: str, key: str) -> None:
+        with self.lock:
+            entry = self.load().get(self.get_entry_key(kind, key))
+
+            if entry is not None:
+                entry.fetched_at = time.time()
+                self.mark_dirty()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries = {}
+            self.mark_dirty()
+            self.flush()
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+        DIRTY_CACHES.add(self)
+
+    def flush(self) -> None:
+        """
+        Writes the cache file if entries changed since it has been loaded or written.
+        """
+        with self.lock:
+            if self.dirty:
+                self.save()
+                self.dirty = False
+                DIRTY_CACHES.discard(self)
+
+    def record_hit(self) -> None:
+        with self.lock:
+            self.hits += 1
+
+    def record_miss(self) -> None:
+        with self.lock:
+            self.misses += 1
+
+    def record_revalidation(self) -> None:
+        with self.lock:
+            self.revalidations += 1
+
+    def get_stats(self) -> str:
+        return f'Metadata cache: {self.hits} hit(s), {self.revalidations} revalidation(s), {self.misses} miss(es)'
+
+    def load(self) -> Dict[str, MetadataCacheEntry]:
+        if self.entries is not None:
+            return self.entries
+
+        self.entries = {}
+
+        try:
+            with open(self.file) as cache_file:
+                for key, entry in json.load(cache_file).items():
+                    self.entries[key] = MetadataCacheEntry.parse_from_dict(entry)
+        except (IOError, ValueError, KeyError):
+            # a missing or corrupted cache is simply rebuilt
+            self.entries = {}
+
+        return self.entries
+
+    def save(self) -> None:
+        if not self.settings.enabled:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+
+            temp_file = f'{self.file}.{os.getpid()}.tmp'
+            with open(temp_file, 'w') as cache_file:
+                json.dump({key: entry.to_dict() for key, entry in self.entries.items()}, cache_file)
+
+            os.replace(temp_file, self.file)
+        except (IOError, OSError):
+            # the cache is only an optimization, the tool must keep working on a read-only file system
+            pass
+
+    @staticmethod
+    def get_entry_key(kind: str, key: str) -> str:
+        return f'{kind}:{key}'
+
+    @staticmethod
+    def create(user_settings: UserSettings):
+        settings = user_settings.cache
+
+        return MetadataCache(os.path.join(settings.get_directory(), f'{user_settings.get_token_hash()}.json'), settings)
+
+
+@atexit.register
+def flush_dirty_caches() -> None:
+    for cache in list(DIRTY_CACHES):
+        cache.flush()
@@ -0,0 +1,355 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+# upper bounds in milliseconds of the buckets of latency histograms, the last bucket has no bound
+LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500]
+
+# segments of Clockify URLs followed by an id, replaced by a placeholder to group requests by endpoint
+ROUTE_PARAMETERS = {
+    'workspaces': 'workspace',
+    'projects': 'project',
+    'user': 'user',
+    'time-entries': 'timeEntry'
+}
+ROUTE_PARAMETERS_PATTERN = re.compile(r'(workspaces|projects|user|time-entries)/[^/?]+')
+
+
+def get_route(endpoint: str, method: str, url: str) -> str:
+    """
+    Returns the endpoint of the URL without ids, eg. "GET workspaces/{workspace}/projects/".
+    """
+    path = url[len(endpoint):] if url.startswith(endpoint) else url
+    path = ROUTE_PARAMETERS_PATTERN.sub(lambda match: f'{match.group(1)}/{{{ROUTE_PARAMETERS[match.group(1)]}}}', path)
+
+    return f'{method} {path}'
+
+
+class Span:
+    __slots__ = ('name', 'category', 'start', 'duration', 'children_duration', 'thread_id', 'args')
+
+    name: str
+    category: str
+    start: float
+    duration: float
+    children_duration: float
+    thread_id: int
+    args: dict
+
+    def __init__(self, name: str, category: str, start: float, thread_id: int, args: dict = None):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.duration = 0
+        self.children_duration = 0
+        self.thread_id = thread_id
+        self.args = args
+
+    def get_self_duration(self) -> float:
+        return self.duration - self.children_duration
+
+
+class EndpointStats:
+    """
+    Requests sent to an endpoint, every attempt counts: retried requests are counted once per attempt.
+    """
+    latencies: List[float]
+    statuses: Dict[str, int]
+    bytes_sent: int
+    bytes_received: int
+    throttled: float
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.throttled = 0
+
+    def get_nb_calls(self) -> int:
+        return len(self.latencies)
+
+    def get_nb_errors(self) -> int:
+        return sum([nb for status, nb in self.statuses.items() if status == 'error' or int(status) >= 400])
+
+    def get_percentile(self, percentile: float) -> float:
+        latencies = sorted(self.latencies)
+
+        return latencies[min(int(len(latencies) * percentile), len(latencies) - 1)] if len(latencies) > 0 else 0
+
+    def get_histogram(self) -> List[int]:
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+        for latency in self.latencies:
+            bucket = 0
+            while bucket < len(LATENCY_BUCKETS) and latency * 1000 > LATENCY_BUCKETS[bucket]:
+                bucket += 1
+
+            histogram[bucket] += 1
+
+        return histogram
+
+    def to_dict(self) -> dict:
+        return {
+            'calls': self.get_nb_calls(),
+            'errors': self.get_nb_errors(),
+            'statuses': self.statuses,
+            'latency': {
+                'mean': sum(self.latencies) / len(self.latencies) if len(self.latencies) > 0 else 0,
+                'p50': self.get_percentile(0.5),
+                'p95': self.get_percentile(0.95),
+                'max': max(self.latencies) if len(self.latencies) > 0 else 0,
+                'histogram': dict(zip([f'{bound}ms' for bound in LATENCY_BUCKETS] + ['inf'], self.get_histogram()))
+            },
+            'bytesSent': self.bytes_sent,
+            'bytesReceived': self.bytes_received,
+            'throttled': self.throttled
+        }
+
+
+class Profiler:
+    """
+    Records where the time goes: the wall time of stages (see profiled), the requests sent to Clockify per endpoint,
+    and the hits of caches. Nothing is recorded until the profiler is enabled, so that it costs nothing otherwise.
+    Stages can be nested, the self time of a stage excludes the stages it contains in the same thread.
+    """
+    enabled: bool
+    started_at: float
+    spans: List[Span]
+    endpoints: Dict[str, EndpointStats]
+    caches: Dict[int, tuple]
+    thread_names: Dict[int, str]
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        self.started_at = time.perf_counter()
+        self.spans = []
+        self.endpoints = {}
+        self.caches = {}
+        self.thread_names = {}
+
+    def enable(self) -> None:
+        self.reset()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    @contextmanager
+    def span(self, name: str, category: str = 'stage', **args):
+        stack = self.get_stack()
+        span = Span(name, category, time.perf_counter(), threading.get_ident(), args or None)
+        stack.append(span)
+
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            stack.pop()
+
+            if len(stack) > 0:
+                stack[-1].children_duration += span.duration
+
+            with self.lock:
+                self.spans.append(span)
+                self.thread_names.setdefault(span.thread_id, threading.current_thread().name)
+
+    def get_stack(self) -> List[Span]:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+
+        return self.local.stack
+
+    def record_request(self,
+                       route: str,
+                       status: Optional[int],
+                       start: float,
+                       latency: float,
+                       bytes_sent: int,
+                       bytes_received: int,
+                       throttled: float) -> None:
+        """
+        Records an attempt of a request, the status is None when the connection failed.
+        """
+        status = str(status) if status is not None else 'error'
+        thread_id = threading.get_ident()
+
+        span = Span(route, 'http', start, thread_id, {'status': status, 'bytesReceived': bytes_received})
+        span.duration = latency
+
+        with self.lock:
+            stats = self.endpoints.get(route)
+            if stats is None:
+                stats = self.endpoints[route] = EndpointStats()
+
+            stats.latencies.append(latency)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.throttled += throttled
+
+            self.spans.append(span)
+            self.thread_names.setdefault(thread_id, threading.current_thread().name)
+
+    def register_cache(self, name: str, cache) -> None:
+        """
+        Registers a cache having hits and misses counters (and optionally revalidations), caches shared by several
+        clients are registered once.
+        """
+        with self.lock:
+            self.caches[id(cache)] = (name, cache)
+
+    def get_wall_time(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def get_stages(self) -> Dict[str, dict]:
+        stages = {}
+
+        for span in self.spans:
+            if span.category != 'stage':
+                continue
+
+            stage = stages.setdefault(span.name, {'calls': 0, 'total': 0, 'self': 0})
+            stage['calls'] += 1
+            stage['total'] += span.duration
+            stage['self'] += span.get_self_duration()
+
+        return stages
+
+    def get_caches(self) -> Dict[str, dict]:
+        caches = {}
+
+        for name, cache in self.caches.values():
+            stats = caches.setdefault(name, {'hits': 0, 'revalidations': 0, 'misses': 0})
+            stats['hits'] += cache.hits
+            stats['revalidations'] += getattr(cache, 'revalidations', 0)
+            stats['misses'] += cache.misses
+
+        for stats in caches.values():
+            nb_lookups = stats['hits'] + stats['revalidations'] + stats['misses']
+            stats['hitRatio'] = (stats['hits'] + stats['revalidations']) / nb_lookups if nb_lookups > 0 else None
+
+        return caches
+
+    def to_dict(self) -> dict:
+        return {
+            'wallTime': self.get_wall_time(),
+            'stages': self.get_stages(),
+            'endpoints': {route: stats.to_dict() for route, stats in sorted(self.endpoints.items())},
+            'caches': self.get_caches()
+        }
+
+    def create_table(self) -> str:
+        lines = [f'Profile: {self.get_wall_time() * 1000:.1f} ms', '']
+
+        lines.append(f'{"Stage":<30}{"Calls":>8}{"Total":>14}{"Self":>14}')
+        for name, stage in self.get_stages().items():
+            lines.append(f'{name:<30}{stage["calls"]:>8}{format_duration(stage["total"]):>14}'
+                         f'{format_duration(stage["self"]):>14}')
+
+        if len(self.endpoints) > 0:
+            lines += ['', f'{"Endpoint":<56}{"Calls":>7}{"Errors":>8}{"p50":>11}{"p95":>11}{"Max":>11}'
+                          f'{"Sent":>11}{"Received":>11}{"Throttled":>11}']
+
+            for route, stats in sorted(self.endpoints.items()):
+                lines.append(f'{route:<56}{stats.get_nb_calls():>7}{stats.get_nb_errors():>8}'
+                             f'{format_duration(stats.get_percentile(0.5)):>11}'
+                             f'{format_duration(stats.get_percentile(0.95)):>11}'
+                             f'{format_duration(max(stats.latencies)):>11}'
+                             f'{format_size(stats.bytes_sent):>11}{format_size(stats.bytes_received):>11}'
+                             f'{format_duration(stats.throttled):>11}')
+
+            lines += ['', f'{"Latency histogram":<56}' +
+                      ''.join([f'{"<" + str(bound) + "ms":>8}' for bound in LATENCY_BUCKETS]) + f'{"more":>8}']
+
+            for route, stats in sorted(self.endpoints.items()):
+                lines.append(f'{route:<56}' + ''.join([f'{nb:>8}' for nb in stats.get_histogram()]))
+
+        caches = self.get_caches()
+        if len(caches) > 0:
+            lines += ['', f'{"Cache":<30}{"Hits":>8}{"Revalidated":>14}{"Misses":>8}{"Hit ratio":>12}']
+
+            for name, stats in caches.items():
+                hit_ratio = f'{stats["hitRatio"] * 100:.0f}%' if stats['hitRatio'] is not None else '-'
+                lines.append(f'{name:<30}{stats["hits"]:>8}{stats["revalidations"]:>14}{stats["misses"]:>8}'
+                             f'{hit_ratio:>12}')
+
+        return '\n'.join(lines)
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Returns stages and requests as complete events of the Trace Event Format, to be opened with chrome://tracing
+        or Perfetto.
+        """
+        pid = os.getpid()
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': thread_name}}
+            for thread_id, thread_name in self.thread_names.items()
+        ]
+
+        for span in sorted(self.spans, key=lambda s: s.start):
+            event = {
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': (span.start - self.started_at) * 1e6,
+                'dur': span.duration * 1e6,
+                'pid': pid,
+                'tid': span.thread_id
+            }
+
+            if span.args is not None:
+                event['args'] = span.args
+
+            events.append(event)
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, file: str) -> None:
+        with open(file, 'w') as trace_file:
+            json.dump(self.to_chrome_trace(), trace_file)
+
+
+def format_duration(seconds: float) -> str:
+    return f'{seconds * 1000:.1f} ms'
+
+
+def format_size(nb_bytes: int) -> str:
+    if nb_bytes < 1024:
+        return f'{nb_bytes} B'
+    elif nb_bytes < 1024 * 1024:
+        return f'{nb_bytes / 1024:.1f} kB'
+    else:
+        return f'{nb_bytes / (1024 * 1024):.1f} MB'
+
+
+PROFILER = Profiler()
+
+
+def profiled(name: str):
+    """
+    Records every call of the decorated function as a stage of the profiler, when it's enabled.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+
+            with PROFILER.span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
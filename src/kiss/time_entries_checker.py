@@ -1,6 +1,8 @@
+import heapq
 from datetime import date
-from typing import List
+from typing import List, Dict
 
+from kiss.profiler import profiled
 from kiss.time_entries_diff import DaysTimeEntriesDiff, TimeEntryDiff
 from kiss.time_entries_generator import GeneratedTimeEntry
 from kiss.user_settings import UserSettings
@@ -14,6 +16,54 @@ class TimeEntriesCheckOption:
         self.partial = partial if partial is not None and partial is True else partial
 
 
+class TimeEntriesSummary:
+    """
+    Durations of days (in seconds) and of holidays, and the number of changes of a diff. Deleted entries are not part
+    of durations.
+    """
+    days_duration: Dict[date, int]
+    public_holidays_duration: int
+    personal_holidays_duration: int
+    nb_changes: int
+
+    def __init__(self):
+        self.days_duration = {}
+        self.public_holidays_duration = 0
+        self.personal_holidays_duration = 0
+        self.nb_changes = 0
+
+    def get_day_duration(self, day: date) -> int:
+        return self.days_duration.get(day, 0)
+
+    def get_nb_changes(self) -> int:
+        return self.nb_changes
+
+    @staticmethod
+    def from_diff(time_entries_diff: DaysTimeEntriesDiff, user_settings: UserSettings):
+        """
+        Computes the summary in a single pass over the diff, durations of days are maintained by the generator.
+        """
+        summary = TimeEntriesSummary()
+
+        for day_diff in time_entries_diff.days:
+            summary.days_duration[day_diff.day.day] = day_diff.day.get_time_entries_duration_in_secs()
+
+            for time_entry in day_diff.time_entries:
+                if not time_entry.is_to_keep():
+                    summary.nb_changes += 1
+
+                generated = time_entry.time_entry
+                if generated is None:
+                    continue
+
+                if generated.is_public_holiday(user_settings):
+                    summary.public_holidays_duration += generated.get_time_entries_duration_in_secs()
+                elif generated.is_personal_holiday(user_settings):
+                    summary.personal_holidays_duration += generated.get_time_entries_duration_in_secs()
+
+        return summary
+
+
 class TimeEntriesCheckReport:
     days_duration_warnings: List[date]
     days_duration_errors: List[date]
@@ -25,6 +75,8 @@ class TimeEntriesCheckReport:
     warnings: List[str]
     info: List[str]
 
+    summary: TimeEntriesSummary
+
     def __init__(self):
         self.days_duration_errors = []
         self.days_duration_warnings = []
@@ -36,6 +88,8 @@ class TimeEntriesCheckReport:
         self.warnings = []
         self.info = []
 
+        self.summary = None
+
     def can_apply_diff(self) -> bool:
         return self.errors.__len__() == 0
 
@@ -48,8 +102,10 @@ class TimeEntriesChecker:
         self.user_settings = user_settings
         self.option = option
 
+    @profiled('check')
     def generate_report(self, time_entries_diff: DaysTimeEntriesDiff) -> TimeEntriesCheckReport:
         report = TimeEntriesCheckReport()
+        report.summary = TimeEntriesSummary.from_diff(time_entries_diff, self.user_settings)
 
         self.check_durations(time_entries_diff, report)
         self.check_no_overlap(time_entries_diff, report)
@@ -61,7 +117,7 @@ class TimeEntriesChecker:
         for day_diff in time_entries_diff.days:
             diff_day = day_diff.day
 
-            day_duration = diff_day.get_time_entries_duration_in_secs()
+            day_duration = report.summary.get_day_duration(diff_day.day)
             working_day_expected_duration = self.user_settings.day.get_number_working_secs()
 
             if diff_day.is_working_day():
@@ -115,27 +171,39 @@ class TimeEntriesChecker:
                                              f'or at half of the day ({half_day_time}).')
 
     def check_no_overlap(self, time_entries_diff: DaysTimeEntriesDiff, report: TimeEntriesCheckReport):
+        """
+        Checks that time entries remaining once the diff is applied don't overlap. Entries of a day are swept by start,
+        only entries that are not yet finished are compared with the next one.
+        """
         for day_diff in time_entries_diff.days:
-            i = 0
+            remaining = [time_entry for time_entry in day_diff.time_entries if time_entry.time_entry is not None]
+            remaining.sort(key=lambda time_entry: time_entry.time_entry.interval.from_date)
 
-            while i < len(day_diff.time_entries):
-                j = 0
-                while j < i:
-                    first = day_diff.time_entries[i]
-                    second = day_diff.time_entries[j]
+            ongoing = []
+            for position, first in enumerate(remaining):
+                first_interval = first.time_entry.interval
 
-                    j += 1
+                while len(ongoing) > 0 and ongoing[0][0] <= first_interval.from_date:
+                    heapq.heappop(ongoing)
 
-                    if (first.time_entry is not None) and \
-                            (second.time_entry is not None) and \
-                            first.time_entry.interval.overlap(second.time_entry.interval):
+                for _, _, second in sorted(ongoing, key=lambda element: element[1]):
+                    if first_interval.overlap(second.time_entry.interval):
                         report.time_entry_errors.append(first)
                         report.time_entry_errors.append(second)
 
-                        report.errors.append(f'The added time entry {first.time_entry.interval} '
-                                             f'overlaps with the time entry: {second.time_entry.interval}')
+                        report.errors.append(f'The {self.get_status(first)} time entry {first_interval} overlaps with '
+                                             f'the {self.get_status(second)} time entry: {second.time_entry.interval}')
+
+                heapq.heappush(ongoing, (first_interval.to_date, position, first))
 
-                i += 1
+    @staticmethod
+    def get_status(time_entry: TimeEntryDiff) -> str:
+        if time_entry.is_to_keep():
+            return 'existing'
+        elif time_entry.is_to_update():
+            return 'updated'
+        else:
+            return 'added'
 
     def is_personal_holiday(self, time_entry: GeneratedTimeEntry) -> bool:
         return time_entry.is_personal_holiday(self.user_settings)
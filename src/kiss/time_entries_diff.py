@@ -1,31 +1,37 @@
-from datetime import time
-from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, Executor
+from datetime import time, timedelta, date
+from queue import Queue, Full
+from threading import Event
+from typing import List, Callable, Iterator, Dict, Tuple, Optional
 
 from kiss.clockify_api import ClockifyApi
-from kiss.clockify_model import ClockifyTimeEntry
-from kiss.time_entries_file import DateTimeInterval
+from kiss.clockify_model import ClockifyTimeEntry, TimeEntryFingerprint, ClockifyTimeInterval
+from kiss.profiler import profiled
+from kiss.time_entries_file import DateTimeInterval, DateInterval
 from kiss.time_entries_generator import GeneratedDaysTimeEntries, GeneratedDayTimeEntries, GeneratedTimeEntry
 from kiss.user_settings import UserSettings
 from kiss.utils import from_datetime_to_zulu_string, set_date_at_time
 
 
 class TimeEntryDiff:
+    __slots__ = ('time_entry', 'matching_entry', 'updated', 'applied', 'applied_entry')
+
     time_entry: GeneratedTimeEntry
     matching_entry: ClockifyTimeEntry
+    updated: bool
+    applied: bool
+    applied_entry: ClockifyTimeEntry
 
     def __init__(self, time_entry: GeneratedTimeEntry = None):
         self.time_entry = time_entry
         self.matching_entry = None
+        self.updated = False
+        self.applied = False
+        self.applied_entry = None
 
     def compare_with_existing_entry(self, existing_task: ClockifyTimeEntry) -> bool:
-        return (self.time_entry.clockify_entry.workspaceId == existing_task.workspace_id) \
-               and (self.time_entry.clockify_entry.user_id == existing_task.user_id) \
-               and (self.time_entry.clockify_entry.project_id == existing_task.project_id) \
-               and (self.time_entry.clockify_entry.task_id == existing_task.task) \
-               and (self.time_entry.clockify_entry.tag_ids == existing_task.tags) \
-               and (self.time_entry.clockify_entry.time_interval.start == existing_task.time_interval.start) \
-               and (self.time_entry.clockify_entry.time_interval.end == existing_task.time_interval.end) \
-               and (self.time_entry.clockify_entry.description == existing_task.description)
+        return self.time_entry.clockify_entry.get_fingerprint() == existing_task.get_fingerprint()
 
     def get_time_interval_as_z_time(self) -> DateTimeInterval:
         if self.matching_entry:
@@ -37,7 +43,13 @@ class TimeEntryDiff:
         if (self.time_entry is None) and (self.matching_entry is None):
             raise Exception('A generated time entry and/or an existing entry must be provided.')
 
-        return self.matching_entry is not None and self.time_entry is not None
+        return self.matching_entry is not None and self.time_entry is not None and not self.updated
+
+    def is_to_update(self):
+        if (self.time_entry is None) and (self.matching_entry is None):
+            raise Exception('A generated time entry and/or an existing entry must be provided.')
+
+        return self.matching_entry is not None and self.time_entry is not None and self.updated
 
     def is_to_delete(self):
         if (self.time_entry is None) and (self.matching_entry is None):
@@ -51,75 +63,379 @@ class TimeEntryDiff:
 
         return self.matching_entry is None
 
+    def is_in_sync(self) -> bool:
+        return self.is_to_keep() or self.applied
+
+    def get_entry(self) -> Optional[ClockifyTimeEntry]:
+        """
+        Returns the Clockify time entry once in sync, None if there is no such entry.
+        """
+        if self.is_to_keep():
+            return self.matching_entry
+        elif self.applied_entry is not None:
+            return self.applied_entry
+        else:
+            return None
+
 
 class DayTimeEntriesDiff:
     day: GeneratedDayTimeEntries
     time_entries: List[TimeEntryDiff]
+    unmatched_time_entries: Dict[TimeEntryFingerprint, List[TimeEntryDiff]]
 
     def __init__(self, day: GeneratedDayTimeEntries):
         self.day = day
         self.time_entries = [TimeEntryDiff(time_entry) for time_entry in day.time_entries]
+        self.unmatched_time_entries = {}
 
-    def add_existing_entry(self, existing: ClockifyTimeEntry):
         for time_entry in self.time_entries:
-            if time_entry.time_entry is not None and time_entry.compare_with_existing_entry(existing):
-                time_entry.matching_entry = existing
-                return
+            fingerprint = time_entry.time_entry.clockify_entry.get_fingerprint()
+            self.unmatched_time_entries.setdefault(fingerprint, []).append(time_entry)
+
+    def add_existing_entry(self, existing: ClockifyTimeEntry):
+        candidates = self.unmatched_time_entries.get(existing.get_fingerprint())
+
+        if candidates:
+            candidates.pop(0).matching_entry = existing
+            return
 
         time_entry_diff = TimeEntryDiff()
         time_entry_diff.matching_entry = existing
         self.time_entries.append(time_entry_diff)
 
+    def pair_near_matches(self):
+        """
+        Pairs every remaining existing entry with a remaining generated entry having the same interval, the existing
+        entry is then updated rather than deleted and added again.
+        """
+        unmatched_by_interval = {}
+        for candidates in self.unmatched_time_entries.values():
+            for time_entry in candidates:
+                clockify_entry = time_entry.time_entry.clockify_entry
+                unmatched_by_interval.setdefault(self.get_interval_key(clockify_entry.workspaceId,
+                                                                       clockify_entry.user_id,
+                                                                       clockify_entry.time_interval), deque()) \
+                    .append(time_entry)
+
+        paired = set()
+
+        for to_delete in [time_entry for time_entry in self.time_entries if time_entry.time_entry is None]:
+            existing = to_delete.matching_entry
+            candidates = unmatched_by_interval.get(
+                self.get_interval_key(existing.workspace_id, existing.user_id, existing.time_interval)
+            )
+
+            if candidates:
+                to_update = candidates.popleft()
+                to_update.matching_entry = existing
+                to_update.updated = True
+
+                paired.add(to_update)
+                paired.add(to_delete)
+
+        # paired entries are dropped in a single pass, rather than removed one by one from the lists
+        if len(paired) > 0:
+            self.time_entries = [time_entry for time_entry in self.time_entries if time_entry.time_entry is not None
+                                 or time_entry not in paired]
+            self.unmatched_time_entries = {
+                fingerprint: [time_entry for time_entry in candidates if time_entry not in paired]
+                for fingerprint, candidates in self.unmatched_time_entries.items()
+            }
+
+    def is_in_sync(self) -> bool:
+        return all([time_entry.is_in_sync() for time_entry in self.time_entries])
+
+    def get_entries(self) -> List[ClockifyTimeEntry]:
+        return [time_entry.get_entry() for time_entry in self.time_entries if time_entry.get_entry() is not None]
+
+    @staticmethod
+    def get_interval_key(workspace_id: str, user_id: str, time_interval: ClockifyTimeInterval) -> Tuple:
+        return workspace_id, user_id, time_interval.start_at, time_interval.end_at
+
 
 class DaysTimeEntriesDiff:
     days_time_entries: GeneratedDaysTimeEntries
     days: List[DayTimeEntriesDiff]
+    days_by_date: Dict[date, DayTimeEntriesDiff]
 
     def __init__(self, days_time_entries: GeneratedDaysTimeEntries):
         self.days_time_entries = days_time_entries
         self.days = []
+        self.days_by_date = {}
 
         for day_time_entry in days_time_entries.get_days_time_entries():
-            self.days.append(DayTimeEntriesDiff(day_time_entry))
+            day_diff = DayTimeEntriesDiff(day_time_entry)
+            self.days.append(day_diff)
+            self.days_by_date[day_time_entry.day] = day_diff
 
     def add_existing_entry(self, existing: ClockifyTimeEntry):
+        day_time_entry = self.days_by_date.get(existing.time_interval.as_datetime_interval().from_date.date())
+
+        if day_time_entry is None:
+            raise Exception(f'Cannot add time entry {existing.id}, there is no matching day')
+
+        day_time_entry.add_existing_entry(existing)
+
+    def has_day(self, existing: ClockifyTimeEntry) -> bool:
+        return existing.time_interval.as_datetime_interval().from_date.date() in self.days_by_date
+
+    def pair_near_matches(self):
         for day_time_entry in self.days:
-            if day_time_entry.day.day == existing.time_interval.as_datetime_interval().from_date.date():
-                day_time_entry.add_existing_entry(existing)
-                return
+            day_time_entry.pair_near_matches()
 
-        raise Exception(f'Cannot add time entry {existing.id}, there is no matching day')
+    def get_time_entries(self) -> List[TimeEntryDiff]:
+        return [time_entry for day_time_entries in self.days for time_entry in day_time_entries.time_entries]
+
+    def get_nb_changes(self) -> int:
+        return len([time_entry for time_entry in self.get_time_entries()
+                    if time_entry.is_to_add() or time_entry.is_to_update() or time_entry.is_to_delete()])
+
+
+class TimeEntryApplyFailure:
+    time_entry: TimeEntryDiff
+    error: Exception
+
+    def __init__(self, time_entry: TimeEntryDiff, error: Exception):
+        self.time_entry = time_entry
+        self.error = error
+
+    def __str__(self):
+        if self.time_entry.is_to_delete():
+            return f'Cannot delete the time entry {self.time_entry.matching_entry.id}: {self.error}'
+        elif self.time_entry.is_to_update():
+            return f'Cannot update the time entry {self.time_entry.matching_entry.id}: {self.error}'
+        else:
+            return f'Cannot add the time entry {self.time_entry.time_entry.interval}: {self.error}'
+
+
+class TimeEntriesApplyReport:
+    applied: List[TimeEntryDiff]
+    failures: List[TimeEntryApplyFailure]
+
+    def __init__(self):
+        self.applied = []
+        self.failures = []
+
+    def is_successful(self) -> bool:
+        return self.failures.__len__() == 0
 
 
 class TimeEntriesDiffComputer:
     api: ClockifyApi
     user_settings: UserSettings
+    fetch_window: str
+    parallelism: int
+    update: bool
+
+    FETCH_WINDOWS = ['day', 'week', 'month']
+
+    def __init__(self,
+                 api: ClockifyApi,
+                 user_settings: UserSettings,
+                 fetch_window: str = 'month',
+                 parallelism: int = 4,
+                 update: bool = True):
+        if fetch_window not in TimeEntriesDiffComputer.FETCH_WINDOWS:
+            raise Exception(f'The fetch window must be one of {TimeEntriesDiffComputer.FETCH_WINDOWS}, '
+                            f'but was {fetch_window}.')
 
-    def __init__(self, api: ClockifyApi, user_settings: UserSettings):
         self.api = api
         self.user_settings = user_settings
-
-    def compute(self, days_time_entries: GeneratedDaysTimeEntries) -> DaysTimeEntriesDiff:
+        self.fetch_window = fetch_window
+        self.parallelism = parallelism
+        self.update = update
+
+    @profiled('diff')
+    def compute(self,
+                days_time_entries: GeneratedDaysTimeEntries,
+                existing_entries: List[ClockifyTimeEntry] = None) -> DaysTimeEntriesDiff:
+        """
+        Compares generated time entries with the existing ones, fetched from Clockify unless they're specified (then
+        existing entries of days that haven't been generated are ignored).
+        """
         days_time_entry_diff = DaysTimeEntriesDiff(days_time_entries)
-        existing_time_entries = self.find_existing_entries(days_time_entries)
 
-        for existing in existing_time_entries:
+        if existing_entries is None:
+            existing_entries = self.iter_existing_entries(days_time_entries.get_intervals())
+        else:
+            existing_entries = [existing for existing in existing_entries if days_time_entry_diff.has_day(existing)]
+
+        for existing in existing_entries:
             days_time_entry_diff.add_existing_entry(existing)
 
+        if self.update:
+            days_time_entry_diff.pair_near_matches()
+
         return days_time_entry_diff
 
-    def apply(self, diff: DaysTimeEntriesDiff):
-        for day_time_entries in diff.days:
-            for time_entry in day_time_entries.time_entries:
-                if time_entry.is_to_add():
-                    self.api.add_time_entry(time_entry.time_entry.clockify_entry)
-                if time_entry.is_to_delete():
-                    self.api.delete_time_entry(time_entry.matching_entry.id, time_entry.matching_entry.workspace_id)
-
-    def find_existing_entries(self, days_time_entries) -> List[ClockifyTimeEntry]:
-        start = from_datetime_to_zulu_string(
-            set_date_at_time(days_time_entries.interval.from_date, time(hour=0, minute=0, second=0)))
-        end = from_datetime_to_zulu_string(
-            set_date_at_time(days_time_entries.interval.to_date, time(hour=23, minute=59, second=59)))
-
-        return self.api.find_time_entries(self.api.get_user().default_workspace, start, end)
+    @profiled('apply')
+    def apply(self,
+              diff: DaysTimeEntriesDiff,
+              parallelism: int = 1,
+              on_progress: Callable[[TimeEntryDiff], None] = None) -> TimeEntriesApplyReport:
+        report = TimeEntriesApplyReport()
+        time_entries = diff.get_time_entries()
+
+        with ThreadPoolExecutor(max_workers=max(parallelism, 1)) as executor:
+            # all the deletions are done before the additions, so a new entry never coexists with the one it replaces
+            self.apply_all(executor,
+                           [time_entry for time_entry in time_entries if time_entry.is_to_delete()],
+                           self.delete_time_entry,
+                           report,
+                           on_progress)
+
+            # days where an entry is still there are left untouched, their new entries would overlap it
+            blocked_days = [day for day in diff.days
+                            if any([time_entry.is_to_delete() and not time_entry.applied
+                                    for time_entry in day.time_entries])]
+            blocked_time_entries = set()
+
+            for day in blocked_days:
+                for time_entry in day.time_entries:
+                    if time_entry.is_to_update() or time_entry.is_to_add():
+                        blocked_time_entries.add(time_entry)
+                        error = Exception(f'Skipped since a time entry of {day.day.day} could not be deleted')
+                        report.failures.append(TimeEntryApplyFailure(time_entry, error))
+
+                        if on_progress is not None:
+                            on_progress(time_entry)
+
+            self.apply_all(executor,
+                           [time_entry for time_entry in time_entries
+                            if time_entry.is_to_update() and time_entry not in blocked_time_entries],
+                           self.update_time_entry,
+                           report,
+                           on_progress)
+            self.apply_all(executor,
+                           [time_entry for time_entry in time_entries
+                            if time_entry.is_to_add() and time_entry not in blocked_time_entries],
+                           self.add_time_entry,
+                           report,
+                           on_progress)
+
+        return report
+
+    def apply_all(self,
+                  executor: Executor,
+                  time_entries: List[TimeEntryDiff],
+                  action: Callable[[TimeEntryDiff], Optional[ClockifyTimeEntry]],
+                  report: TimeEntriesApplyReport,
+                  on_progress: Callable[[TimeEntryDiff], None]):
+        futures = {executor.submit(action, time_entry): time_entry for time_entry in time_entries}
+
+        for future in as_completed(futures):
+            time_entry = futures[future]
+
+            try:
+                time_entry.applied_entry = future.result()
+                time_entry.applied = True
+                report.applied.append(time_entry)
+            except Exception as ex:
+                report.failures.append(TimeEntryApplyFailure(time_entry, ex))
+
+            if on_progress is not None:
+                on_progress(time_entry)
+
+    def add_time_entry(self, time_entry: TimeEntryDiff) -> ClockifyTimeEntry:
+        return self.api.add_time_entry(time_entry.time_entry.clockify_entry)
+
+    def update_time_entry(self, time_entry: TimeEntryDiff) -> ClockifyTimeEntry:
+        return self.api.update_time_entry(time_entry.matching_entry.id, time_entry.time_entry.clockify_entry)
+
+    def delete_time_entry(self, time_entry: TimeEntryDiff) -> None:
+        self.api.delete_time_entry(time_entry.matching_entry.id, time_entry.matching_entry.workspace_id)
+
+    def find_existing_entries(self, intervals: List[DateInterval]) -> List[ClockifyTimeEntry]:
+        return list(self.iter_existing_entries(intervals))
+
+    def iter_existing_entries(self, intervals: List[DateInterval]) -> Iterator[ClockifyTimeEntry]:
+        """
+        Intervals are split in windows (see fetch_window) fetched concurrently, time entries are streamed page by page
+        as they're fetched: only a few pages per window are kept in memory, whatever the size of the intervals.
+        """
+        windows = [window for interval in intervals for window in self.split_interval(interval)]
+        pages = Queue(maxsize=2 * max(self.parallelism, 1))
+        closed = Event()
+        found_ids = set()
+        nb_running = len(windows)
+
+        with ThreadPoolExecutor(max_workers=max(min(self.parallelism, len(windows)), 1)) as executor:
+            for window in windows:
+                executor.submit(self.stream_window_existing_entries, window, pages, closed)
+
+            try:
+                while nb_running > 0:
+                    page = pages.get()
+
+                    if page is None:
+                        nb_running -= 1
+                    elif isinstance(page, Exception):
+                        raise page
+                    else:
+                        for existing in page:
+                            # an entry spanning two windows is returned twice
+                            if existing.id not in found_ids:
+                                found_ids.add(existing.id)
+                                yield existing
+            finally:
+                # stops the windows still being fetched when the iteration is interrupted
+                closed.set()
+
+    @profiled('fetch existing entries')
+    def stream_window_existing_entries(self, window: DateInterval, pages: Queue, closed: Event) -> None:
+        if closed.is_set():
+            return
+
+        page = []
+
+        try:
+            for existing in self.find_window_existing_entries(window):
+                page.append(existing)
+
+                if len(page) == self.api.page_size:
+                    if not self.put_page(page, pages, closed):
+                        return
+
+                    page = []
+
+            if len(page) == 0 or self.put_page(page, pages, closed):
+                self.put_page(None, pages, closed)
+        except Exception as ex:
+            self.put_page(ex, pages, closed)
+
+    @staticmethod
+    def put_page(page, pages: Queue, closed: Event) -> bool:
+        while not closed.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def find_window_existing_entries(self, window: DateInterval) -> Iterator[ClockifyTimeEntry]:
+        start = from_datetime_to_zulu_string(set_date_at_time(window.from_date, time(hour=0, minute=0, second=0)))
+        end = from_datetime_to_zulu_string(set_date_at_time(window.to_date, time(hour=23, minute=59, second=59)))
+
+        yield from self.api.iter_time_entries(self.api.get_user().default_workspace, start, end)
+
+    def split_interval(self, interval: DateInterval) -> List[DateInterval]:
+        windows = []
+        window_start = interval.from_date
+
+        while window_start <= interval.to_date:
+            window_end = min(self.get_window_end(window_start), interval.to_date)
+            windows.append(DateInterval(window_start, window_end))
+            window_start = window_end + timedelta(days=1)
+
+        return windows
+
+    def get_window_end(self, day: date) -> date:
+        if self.fetch_window == 'day':
+            return day
+        elif self.fetch_window == 'week':
+            return day + timedelta(days=6 - day.weekday())
+        else:
+            next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+            return next_month - timedelta(days=1)
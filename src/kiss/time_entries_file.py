@@ -1,7 +1,7 @@
 import json
-from datetime import date
+from datetime import date, timedelta
 from datetime import datetime
-from typing import List
+from typing import List, Iterable
 
 from kiss.utils import from_datetime_to_user, parse_user_date, parse_user_datetime
 
@@ -16,6 +16,8 @@ class Month:
 
 
 class DateInterval:
+    __slots__ = ('from_date', 'to_date')
+
     from_date: date
     to_date: date
 
@@ -33,8 +35,25 @@ class DateInterval:
     def parse_from_dict(dic: dict):
         return DateInterval(parse_user_date(dic['fromDate']), parse_user_date(dic['toDate']))
 
+    @staticmethod
+    def from_days(days: Iterable[date]):
+        """
+        Returns the smallest list of intervals covering exactly the specified days.
+        """
+        intervals = []
+
+        for day in sorted(set(days)):
+            if len(intervals) > 0 and intervals[-1].to_date + timedelta(days=1) == day:
+                intervals[-1].to_date = day
+            else:
+                intervals.append(DateInterval(day, day))
+
+        return intervals
+
 
 class DateTimeInterval:
+    __slots__ = ('from_date', 'to_date')
+
     from_date: datetime
     to_date: datetime
 
@@ -46,8 +65,10 @@ class DateTimeInterval:
         self.to_date = to_date
 
     def overlap(self, other):
-        return ((self.from_date >= other.from_date) and (self.to_date <= other.to_date)) \
-               or ((other.from_date >= self.from_date) and (other.to_date <= self.to_date))
+        """
+        Returns whether both intervals share some time, intervals that only touch each other don't overlap.
+        """
+        return (self.from_date < other.to_date) and (other.from_date < self.to_date)
 
     def __str__(self):
         return f'[{from_datetime_to_user(self.from_date)} => {from_datetime_to_user(self.to_date)}]'
@@ -1,16 +1,23 @@
+import hashlib
+import json
 import uuid
+from bisect import bisect_left, bisect_right
 from datetime import date, timedelta, datetime, time
-from typing import List
+from typing import List, Dict, Iterable, Set, Tuple, Optional
 
 from kiss.clockify_api import ClockifyApi
 from kiss.clockify_model import ClockifyTimeNewEntry, ClockifyTimeInterval
+from kiss.profiler import profiled
 from kiss.time_entries_file import TimeEntriesFile, DateTimeInterval, DateInterval
-from kiss.user_settings import DaySettings
+from kiss.time_entries_resolver import TimeEntryResolver, TimeEntryNames
+from kiss.user_settings import DaySettings, TaskSettings
 from kiss.user_settings import UserSettings
-from kiss.utils import from_datetime_to_zulu_string, set_date_at_time, get_duration_in_secs
+from kiss.utils import set_date_at_time, get_duration_in_secs
 
 
 class GeneratedTimeEntry:
+    __slots__ = ('project', 'task', 'description', 'interval', 'tags', 'clockify_entry')
+
     project: str
     task: str
     description: str
@@ -45,48 +52,87 @@ class GeneratedTimeEntry:
 
 
 class GeneratedDayTimeEntries:
+    """
+    Time entries of a day, sorted by start (then end). The duration of the day is maintained as entries are added.
+    """
+    __slots__ = ('day', 'time_entries', 'intervals', 'duration_in_secs')
+
     day: date
     time_entries: List[GeneratedTimeEntry]
+    intervals: List[Tuple[datetime, datetime]]
+    duration_in_secs: int
 
     def __init__(self, day: date):
         self.day = day
         self.time_entries = []
+        self.intervals = []
+        self.duration_in_secs = 0
 
     def add_time_entry(self, new_time_entry: GeneratedTimeEntry) -> None:
-        closest_to = self.find_time_entry_closest_to(new_time_entry.interval.to_date)
+        interval = (new_time_entry.interval.from_date, new_time_entry.interval.to_date)
+        position = bisect_right(self.intervals, interval)
+
+        self.intervals.insert(position, interval)
+        self.time_entries.insert(position, new_time_entry)
+        self.duration_in_secs += new_time_entry.get_time_entries_duration_in_secs()
+
+    def find_time_entry_closest_to(self, start_date: datetime) -> Optional[GeneratedTimeEntry]:
+        """
+        Returns the first time entry starting at, or after, the specified date.
+        """
+        position = bisect_left(self.intervals, (start_date,))
+
+        return self.time_entries[position] if position < len(self.time_entries) else None
 
-        if closest_to is None:
-            self.time_entries.append(new_time_entry)
-        else:
-            self.time_entries.insert(self.time_entries.index(closest_to), new_time_entry)
+    def find_gaps(self, start_date: datetime, end_date: datetime) -> List[DateTimeInterval]:
+        """
+        Returns intervals between the specified dates that are not covered by any time entry.
+        """
+        gaps = []
+        current_start_date = start_date
 
-    def find_time_entry_closest_to(self, start_date: datetime) -> GeneratedTimeEntry:
-        closest = None
+        for from_date, to_date in self.intervals:
+            if current_start_date >= end_date:
+                break
 
-        for time_entry in self.time_entries:
-            if (closest is None or closest.interval.from_date >= time_entry.interval.from_date) and (
-                    time_entry.interval.from_date >= start_date):
-                closest = time_entry
+            if from_date > current_start_date:
+                gaps.append(DateTimeInterval(current_start_date, min(from_date, end_date)))
 
-        return closest
+            current_start_date = max(current_start_date, to_date)
+
+        if current_start_date < end_date:
+            gaps.append(DateTimeInterval(current_start_date, end_date))
+
+        return gaps
 
     def is_working_day(self) -> bool:
         return self.day.weekday() < 5
 
     def get_time_entries_duration_in_secs(self) -> int:
-        duration = 0
-        for time_entry in self.time_entries:
-            duration += time_entry.get_time_entries_duration_in_secs()
-
-        return duration
+        return self.duration_in_secs
 
 
 class GeneratedDaysTimeEntries:
     interval: DateInterval
-    days = {}
+    days: Dict[date, GeneratedDayTimeEntries]
+    selected_days: Set[date]
 
-    def __init__(self, interval: DateInterval):
+    def __init__(self, interval: DateInterval, selected_days: Iterable[date] = None):
         self.interval = interval
+        self.days = {}
+        self.selected_days = set(selected_days) if selected_days is not None else None
+
+    def is_selected(self, day: date) -> bool:
+        return self.selected_days is None or day in self.selected_days
+
+    def get_intervals(self) -> List[DateInterval]:
+        """
+        Returns the intervals covering the generated days, the whole period unless only some days are generated.
+        """
+        if self.selected_days is None:
+            return [self.interval]
+
+        return DateInterval.from_days([day for day in self.selected_days if self.interval.include(day)])
 
     def get_or_create(self, day: date) -> GeneratedDayTimeEntries:
         if self.interval.include(day) is False:
@@ -111,60 +157,101 @@ class TimeEntriesGenerator:
     time_entries_file: TimeEntriesFile
     user_settings: UserSettings
     api: ClockifyApi
+    resolver: TimeEntryResolver
 
     def __init__(self, time_entries_file: TimeEntriesFile, api: ClockifyApi, user_settings: UserSettings):
         self.time_entries_file = time_entries_file
         self.api = api
         self.user_settings = user_settings
+        self.resolver = TimeEntryResolver(api)
+
+    @profiled('generate')
+    def generate(self, days: Iterable[date] = None) -> GeneratedDaysTimeEntries:
+        """
+        Generates time entries of all the days of the period, or only of the specified days.
+        """
+        self.resolver.validate(self.get_time_entries_names())
 
-    def generate(self) -> GeneratedDaysTimeEntries:
-        days_time_entries: GeneratedDaysTimeEntries = self.initialize_day_time_entries()
+        days_time_entries: GeneratedDaysTimeEntries = self.initialize_day_time_entries(days)
         self.generate_time_entries(days_time_entries)
 
         return days_time_entries
 
-    def initialize_day_time_entries(self) -> GeneratedDaysTimeEntries:
+    def initialize_day_time_entries(self, days: Iterable[date] = None) -> GeneratedDaysTimeEntries:
         period_interval = self.time_entries_file.period
-        day_time_entries = GeneratedDaysTimeEntries(period_interval)
+        day_time_entries = GeneratedDaysTimeEntries(period_interval, days)
 
         for current_date in self.generate_days(period_interval.from_date, period_interval.to_date):
-            day_time_entries.get_or_create(current_date)
+            if day_time_entries.is_selected(current_date):
+                day_time_entries.get_or_create(current_date)
 
         return day_time_entries
 
+    @profiled('hash inputs')
+    def get_days_inputs_hash(self) -> Dict[date, str]:
+        """
+        Returns, for every day of the period, a hash of everything the time entries of the day are generated from.
+        """
+        file = self.time_entries_file
+        days_inputs = {day: [] for day in self.generate_days(file.period.from_date, file.period.to_date)}
+
+        def add_inputs(from_date: date, to_date: date, kind: str, inputs) -> None:
+            for day in self.generate_days(from_date, to_date):
+                if day in days_inputs:
+                    days_inputs[day].append((kind, inputs))
+
+        for public_holiday in file.public_holidays:
+            add_inputs(public_holiday, public_holiday, 'publicHoliday', public_holiday)
+
+        for personal_holiday in file.personal_holidays:
+            add_inputs(personal_holiday.interval.from_date.date(), personal_holiday.interval.to_date.date(),
+                       'personalHoliday', personal_holiday)
+
+        for task in file.tasks:
+            add_inputs(task.interval.from_date.date(), task.interval.to_date.date(), 'task', task)
+
+        for default_task in file.default_tasks:
+            add_inputs(default_task.interval.from_date, default_task.interval.to_date, 'defaultTask', default_task)
+
+        settings = [self.user_settings.day, self.user_settings.public_holiday, self.user_settings.personal_holiday]
+
+        return {
+            day: hashlib.sha256(
+                json.dumps([settings, inputs], default=self.to_hashable, sort_keys=True).encode('utf-8')
+            ).hexdigest()
+            for day, inputs in days_inputs.items()
+        }
+
+    @staticmethod
+    def to_hashable(value):
+        if hasattr(value, '__slots__'):
+            return {name: getattr(value, name) for name in value.__slots__}
+
+        return vars(value) if hasattr(value, '__dict__') else str(value)
+
     def generate_time_entries(self, days_time_entries: GeneratedDaysTimeEntries):
         self.generate_public_holidays_time_entries(days_time_entries)
         self.generate_personal_holidays_time_entries(days_time_entries)
         self.generate_specific_time_entries(days_time_entries)
         self.generate_default_time_entries(days_time_entries)
 
-    def get_project_id(self, project_name: str) -> str:
-        projects = self.api.get_projects_by_name(project_name)
-
-        if projects.__len__() != 1:
-            raise Exception(
-                f'One and only project must match the name [{project_name}], but {projects.__len__()} found.')
+    def get_time_entries_names(self) -> List[TimeEntryNames]:
+        names = []
+        file = self.time_entries_file
 
-        return projects[0].id
+        if file.public_holidays.__len__() > 0:
+            names.append(self.get_task_settings_names(self.user_settings.public_holiday))
 
-    def get_task_id(self, project_name: str, task_name: str) -> str:
-        if task_name is None:
-            return None
+        if file.personal_holidays.__len__() > 0:
+            names.append(self.get_task_settings_names(self.user_settings.personal_holiday))
 
-        tasks = self.api.get_project_task_by_name(self.get_project_id(project_name), task_name)
+        for task in file.tasks + file.default_tasks:
+            names.append(TimeEntryResolver.get_names(task.project, task.task, task.tags))
 
-        if tasks.__len__() != 1:
-            raise Exception(f'One and only task must match the name [{task_name}], but {tasks.__len__()} found.')
+        return names
 
-        return tasks[0].id
-
-    def get_tag_ids(self, tag_names: []) -> List[str]:
-        tag_ids = []
-        for tag in self.api.get_tags():
-            if tag_names.__contains__(tag.name):
-                tag_ids.append(tag.id)
-
-        return tag_ids
+    def get_task_settings_names(self, task_settings: TaskSettings) -> TimeEntryNames:
+        return TimeEntryResolver.get_names(task_settings.project, task_settings.task, task_settings.tags)
 
     def create_time_entry(self,
                           project: str,
@@ -172,6 +259,8 @@ class TimeEntriesGenerator:
                           description: str,
                           interval: DateTimeInterval,
                           tag_names: List[str]) -> GeneratedTimeEntry:
+        resolved = self.resolver.resolve(project, task, tag_names)
+
         return GeneratedTimeEntry(
             project,
             task,
@@ -181,20 +270,20 @@ class TimeEntriesGenerator:
             ClockifyTimeNewEntry(
                 uuid.uuid1().__str__(),
                 description if description is not None else 'TASK',
-                self.get_project_id(project),
-                self.api.get_user().id,
-                self.get_task_id(project, task),
-                self.get_tag_ids(tag_names),
-                ClockifyTimeInterval(
-                    from_datetime_to_zulu_string(interval.from_date),
-                    from_datetime_to_zulu_string(interval.to_date)
-                ),
-                self.api.get_user().default_workspace
+                resolved.project_id,
+                resolved.user_id,
+                resolved.task_id,
+                resolved.tag_ids,
+                ClockifyTimeInterval.from_datetimes(interval.from_date, interval.to_date),
+                resolved.workspace_id
             )
         )
 
     def generate_public_holidays_time_entries(self, day_time_entries: GeneratedDaysTimeEntries):
         for public_holiday in self.time_entries_file.public_holidays:
+            if not day_time_entries.is_selected(public_holiday):
+                continue
+
             day_time_entries.get_or_create(public_holiday).add_time_entry(
                 self.create_time_entry(
                     self.user_settings.public_holiday.project,
@@ -213,6 +302,9 @@ class TimeEntriesGenerator:
         for personal_holiday in self.time_entries_file.personal_holidays:
             personal_holiday_days = self.split_datetime_interval(personal_holiday.interval, self.user_settings.day)
             for day in personal_holiday_days:
+                if not day_time_entries.is_selected(day.from_date.date()):
+                    continue
+
                 if day_time_entries.get_or_create(day.from_date.date()).get_time_entries_duration_in_secs() == 0:
                     day_time_entries.get_or_create(day.from_date.date()).add_time_entry(
                         self.create_time_entry(
@@ -228,6 +320,9 @@ class TimeEntriesGenerator:
         for task in self.time_entries_file.tasks:
             task_days = self.split_datetime_interval(task.interval, self.user_settings.day)
             for day in task_days:
+                if not day_time_entries.is_selected(day.from_date.date()):
+                    continue
+
                 day_time_entries.get_or_create(day.from_date.date()).add_time_entry(
                     self.create_time_entry(
                         task.project,
@@ -242,6 +337,9 @@ class TimeEntriesGenerator:
         for default_task in self.time_entries_file.default_tasks:
             days = self.split_date_interval(default_task.interval, self.user_settings.day)
             for day in days:
+                if not days_time_entries.is_selected(day.from_date.date()):
+                    continue
+
                 day_time_entries = days_time_entries.get_or_create(day.from_date.date())
 
                 if day_time_entries.is_working_day():
@@ -291,28 +389,11 @@ class TimeEntriesGenerator:
         return split
 
     def find_missing_interval(self, day_time_entries: GeneratedDayTimeEntries) -> List[DateTimeInterval]:
-        intervals = []
-
         if day_time_entries.get_time_entries_duration_in_secs() >= self.user_settings.day.get_number_working_secs():
-            return intervals
-
-        current_start_date = datetime.combine(day_time_entries.day, self.user_settings.day.start_at)
-
-        while current_start_date.time() < self.user_settings.day.end_at:
-            closest = day_time_entries.find_time_entry_closest_to(current_start_date)
-
-            if closest is not None:
-                if closest.interval.from_date == current_start_date:
-                    current_start_date = closest.interval.to_date
-                else:
-                    intervals.append(DateTimeInterval(current_start_date, closest.interval.from_date))
-                    current_start_date = closest.interval.to_date
-            else:
-                end_date = datetime.combine(day_time_entries.day, self.user_settings.day.end_at)
-                intervals.append(DateTimeInterval(current_start_date, end_date))
-                current_start_date = end_date
+            return []
 
-        return intervals
+        return day_time_entries.find_gaps(datetime.combine(day_time_entries.day, self.user_settings.day.start_at),
+                                          datetime.combine(day_time_entries.day, self.user_settings.day.end_at))
 
     def generate_days(self, from_date: date, to_date: date) -> List[date]:
         num_days = (to_date - from_date).days + 1
@@ -1,8 +1,12 @@
+import csv
+import json
 import os
 import sys
-from typing import List
+from functools import lru_cache
+from typing import List, Iterator, TextIO, Dict, Set
 
 from kiss.clockify_api import ClockifyApi
+from kiss.profiler import profiled
 from kiss.time_entries_checker import TimeEntriesCheckReport
 from kiss.time_entries_diff import DaysTimeEntriesDiff, DayTimeEntriesDiff, TimeEntryDiff
 from kiss.time_entries_file import DateTimeInterval
@@ -10,46 +14,203 @@ from kiss.user_settings import UserSettings
 from kiss.utils import RESET_FORMAT, COLOR_YELLOW, COLOR_RED, COLOR_GREEN, BOLD, from_seconds_to_hours, from_seconds_to_days
 
 
+@lru_cache(maxsize=8)
+def load_logo(logo_file: str) -> str:
+    try:
+        with open(logo_file) as logo:
+            return logo.read()
+    except IOError:
+        return None
+
+
+class CatalogueNames:
+    """
+    Names of projects, tasks and tags by id, built once for a whole diff.
+    """
+    projects: Dict[str, str]
+    tasks: Dict[str, str]
+    tags: Dict[str, str]
+
+    def __init__(self, projects: Dict[str, str], tasks: Dict[str, str], tags: Dict[str, str]):
+        self.projects = projects
+        self.tasks = tasks
+        self.tags = tags
+
+    def get_project_name(self, project_id: str) -> str:
+        return self.projects.get(project_id) if project_id is not None else None
+
+    def get_task_name(self, task_id: str) -> str:
+        return self.tasks.get(task_id) if task_id is not None else None
+
+    def get_tag_names(self, tag_ids: List[str]) -> List[str]:
+        return [self.tags[tag_id] for tag_id in tag_ids if tag_id in self.tags]
+
+    @staticmethod
+    def create(api: ClockifyApi, time_entries_diff: DaysTimeEntriesDiff):
+        # tasks are only needed for projects of existing time entries, generated ones already have names
+        project_ids = set([time_entry.matching_entry.project_id for time_entry in time_entries_diff.get_time_entries()
+                           if time_entry.matching_entry is not None and time_entry.matching_entry.task is not None])
+
+        return CatalogueNames(
+            {project.id: project.name for project in api.get_projects()},
+            {task.id: task.name for project_id in project_ids for task in api.get_project_tasks(project_id)},
+            {tag.id: tag.name for tag in api.get_tags()}
+        )
+
+
 class TimeEntriesReporter:
     api: ClockifyApi
     user_settings: UserSettings
 
+    FORMATS = ['text', 'jsonl', 'csv']
+
+    # fields of the records of machine-readable formats
+    RECORD_FIELDS = ['day', 'status', 'id', 'project', 'task', 'description', 'tags', 'start', 'end', 'check']
+
     def __init__(self, api: ClockifyApi, user_settings: UserSettings):
         self.api = api
         self.user_settings = user_settings
 
+    @profiled('report')
     def create_report(self, time_entries_diff: DaysTimeEntriesDiff, report: TimeEntriesCheckReport) -> str:
-        concatenated = []
+        return ''.join(self.iter_report(time_entries_diff, report))
+
+    def write(self,
+              time_entries_diff: DaysTimeEntriesDiff,
+              report: TimeEntriesCheckReport,
+              output_format: str,
+              stream: TextIO,
+              messages_stream: TextIO):
+        """
+        Writes the report in the specified format. With jsonl or csv, errors and warnings are written on the messages
+        stream, so that the stream only holds records.
+        """
+        if output_format == 'text':
+            self.write_report(time_entries_diff, report, stream)
+            stream.write('\n')
+            return
+
+        self.write_records(time_entries_diff, report, stream, output_format)
+
+        for error in report.errors:
+            messages_stream.write(f'{COLOR_RED}[ERROR]\t\t{error}{RESET_FORMAT}\n')
+
+        for warning in report.warnings:
+            messages_stream.write(f'{COLOR_YELLOW}[WARNING]\t{warning}{RESET_FORMAT}\n')
+
+        messages_stream.flush()
+
+    @profiled('report')
+    def write_report(self, time_entries_diff: DaysTimeEntriesDiff, report: TimeEntriesCheckReport, stream: TextIO):
+        """
+        Writes the report day by day, every day is visible as soon as it has been rendered.
+        """
+        for chunk in self.iter_report(time_entries_diff, report):
+            stream.write(chunk)
+            stream.flush()
+
+    @profiled('report')
+    def write_records(self,
+                      time_entries_diff: DaysTimeEntriesDiff,
+                      report: TimeEntriesCheckReport,
+                      stream: TextIO,
+                      output_format: str):
+        """
+        Writes one record per time entry, as JSON lines (tags are a list) or CSV (tags are separated by ";").
+        """
+        if output_format == 'jsonl':
+            for record in self.iter_records(time_entries_diff, report):
+                stream.write(json.dumps(record) + '\n')
+        elif output_format == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=TimeEntriesReporter.RECORD_FIELDS, lineterminator='\n')
+            writer.writeheader()
+
+            for record in self.iter_records(time_entries_diff, report):
+                record['tags'] = ';'.join(record['tags'])
+                writer.writerow(record)
+        else:
+            raise Exception(f'The format must be one of {TimeEntriesReporter.FORMATS}, but was {output_format}.')
+
+        stream.flush()
+
+    def iter_records(self, time_entries_diff: DaysTimeEntriesDiff, report: TimeEntriesCheckReport) -> Iterator[dict]:
+        names = CatalogueNames.create(self.api, time_entries_diff)
+        errors = set([id(time_entry) for time_entry in report.time_entry_errors])
+        warnings = set([id(time_entry) for time_entry in report.time_entry_warnings])
+
+        for day_diff in time_entries_diff.days:
+            for time_entry in self.sort_day_time_entries(day_diff.time_entries):
+                yield self.create_time_entry_record(day_diff, time_entry, names, errors, warnings)
+
+    def create_time_entry_record(self,
+                                 day_diff: DayTimeEntriesDiff,
+                                 time_entries_diff: TimeEntryDiff,
+                                 names: CatalogueNames,
+                                 errors: Set[int],
+                                 warnings: Set[int]) -> dict:
+        time_entry = time_entries_diff.time_entry
+        matching_entry = time_entries_diff.matching_entry
 
-        try:
-            with open(self.get_logo_file()) as logo_file:
-                concatenated.append(logo_file.read())
-                concatenated.append('\n\n')
-        except IOError as e:
-            concatenated.append('')
+        if time_entry is not None:
+            time_interval = time_entry.clockify_entry.time_interval
+            project_name = time_entry.project
+            task_name = time_entry.task
+            description = time_entry.description
+            tag_names = list(time_entry.tags)
+        else:
+            time_interval = matching_entry.time_interval
+            project_name = names.get_project_name(matching_entry.project_id)
+            task_name = names.get_task_name(matching_entry.task)
+            description = matching_entry.description
+            tag_names = names.get_tag_names(matching_entry.tags)
 
-        concatenated.append(self.create_days_report(time_entries_diff, report))
-        concatenated.append('\n\n')
+        if id(time_entries_diff) in errors:
+            check = 'error'
+        elif id(time_entries_diff) in warnings:
+            check = 'warning'
+        else:
+            check = None
+
+        return {
+            'day': day_diff.day.day.isoformat(),
+            'status': self.get_time_entry_status(time_entries_diff),
+            'id': matching_entry.id if matching_entry is not None else None,
+            'project': project_name,
+            'task': task_name,
+            'description': description,
+            'tags': tag_names,
+            'start': time_interval.start,
+            'end': time_interval.end,
+            'check': check
+        }
+
+    def iter_report(self, time_entries_diff: DaysTimeEntriesDiff, report: TimeEntriesCheckReport) -> Iterator[str]:
+        logo = load_logo(self.get_logo_file())
+        if logo is not None:
+            yield f'{logo}\n\n'
+
+        for day_report in self.iter_days_report(time_entries_diff, report):
+            yield day_report
+
+        yield '\n\n'
 
         if len(report.errors) > 0 or len(report.warnings) > 0:
-            concatenated.append('==========\n')
-            concatenated.append('= REPORT =\n')
-            concatenated.append('==========\n\n')
+            concatenated = ['==========\n', '= REPORT =\n', '==========\n\n']
             for error in report.errors:
                 concatenated.append(f'{COLOR_RED}[ERROR]\t\t{error}{RESET_FORMAT}\n')
 
             for error in report.warnings:
                 concatenated.append(f'{COLOR_YELLOW}[WARNING]\t{error}{RESET_FORMAT}\n')
 
-        concatenated.append('===========\n')
-        concatenated.append('= SUMMARY =\n')
-        concatenated.append('===========\n\n')
-        concatenated.append(f'{self.create_diff_summary(time_entries_diff)}\n')
-        concatenated.append(f'{self.create_duration_summary(report)}\n')
-        concatenated.append(f'{self.create_nb_public_holiday_summary(time_entries_diff)}\n')
-        concatenated.append(f'{self.create_nb_personal_holiday_summary(time_entries_diff)}\n')
+            yield ''.join(concatenated)
 
-        return ''.join(concatenated)
+        yield '===========\n' \
+              '= SUMMARY =\n' \
+              '===========\n\n' \
+              f'{self.create_diff_summary(report)}\n' \
+              f'{self.create_duration_summary(report)}\n' \
+              f'{self.create_nb_public_holiday_summary(report)}\n' \
+              f'{self.create_nb_personal_holiday_summary(report)}\n'
 
     def get_logo_file(self):
         if getattr(sys, 'frozen', True):
@@ -58,17 +219,18 @@ class TimeEntriesReporter:
             return 'kiss/logo.txt'
 
     def create_days_report(self, time_entries_diff: DaysTimeEntriesDiff, report: TimeEntriesCheckReport) -> str:
-        concatenated = []
+        return ''.join(self.iter_days_report(time_entries_diff, report))
 
+    def iter_days_report(self,
+                         time_entries_diff: DaysTimeEntriesDiff,
+                         report: TimeEntriesCheckReport) -> Iterator[str]:
         for day_time_entries in time_entries_diff.days:
-            concatenated.append(f'{self.create_day_report(day_time_entries, report)}\n\n\n')
+            day_report = f'{self.create_day_report(day_time_entries, report)}\n\n\n'
 
             if day_time_entries.day.day.weekday() == 6:
-                concatenated.append(f'============\n')
-                concatenated.append(f'= NEW WEEK =\n')
-                concatenated.append(f'============\n\n\n')
+                day_report += '============\n= NEW WEEK =\n============\n\n\n'
 
-        return ''.join(concatenated)
+            yield day_report
 
     def create_day_report(self, day_diff: DayTimeEntriesDiff, report: TimeEntriesCheckReport) -> str:
         entries_report = []
@@ -109,12 +271,11 @@ class TimeEntriesReporter:
         return f'[{status_string}]\t{project_name} - {task_name} "{description}" {tag_names}: ' \
                f'{datetime_interval} {check_flag}'
 
-    def create_diff_summary(self, time_entries_diff: DaysTimeEntriesDiff) -> str:
-        status = f'{BOLD}{COLOR_GREEN}YES{RESET_FORMAT}'
-        for day_time_entry_diff in time_entries_diff.days:
-            for time_entry_diff in day_time_entry_diff.time_entries:
-                if time_entry_diff.is_to_add() or time_entry_diff.is_to_delete():
-                    status = f'{BOLD}{COLOR_YELLOW}NO{RESET_FORMAT}'
+    def create_diff_summary(self, report: TimeEntriesCheckReport) -> str:
+        if report.summary.get_nb_changes() > 0:
+            status = f'{BOLD}{COLOR_YELLOW}NO{RESET_FORMAT}'
+        else:
+            status = f'{BOLD}{COLOR_GREEN}YES{RESET_FORMAT}'
 
         return f'Up-to-date with Clockify: {status}'
 
@@ -129,26 +290,14 @@ class TimeEntriesReporter:
 
         return f'Duration issue(s): {status}'
 
-    def create_nb_public_holiday_summary(self, time_entries_diff: DaysTimeEntriesDiff) -> str:
-        nb = 0
-
-        for day_time_entries in time_entries_diff.days:
-            for time_entry in day_time_entries.time_entries:
-                generated_time_entry = time_entry.time_entry
-                if (generated_time_entry is not None) and generated_time_entry.is_public_holiday(self.user_settings):
-                    nb += generated_time_entry.get_time_entries_duration_in_secs()
+    def create_nb_public_holiday_summary(self, report: TimeEntriesCheckReport) -> str:
+        nb = report.summary.public_holidays_duration
 
         return f'Number public holidays in day(s): ' \
                f'{BOLD}{from_seconds_to_days(nb, self.user_settings.day.get_number_working_secs())}{RESET_FORMAT}'
 
-    def create_nb_personal_holiday_summary(self, time_entries_diff: DaysTimeEntriesDiff) -> str:
-        nb = 0
-
-        for day_time_entries in time_entries_diff.days:
-            for time_entry in day_time_entries.time_entries:
-                generated_time_entry = time_entry.time_entry
-                if (generated_time_entry is not None) and generated_time_entry.is_personal_holiday(self.user_settings):
-                    nb += generated_time_entry.get_time_entries_duration_in_secs()
+    def create_nb_personal_holiday_summary(self, report: TimeEntriesCheckReport) -> str:
+        nb = report.summary.personal_holidays_duration
 
         return f'Number personal holidays in day(s): ' \
                f'{BOLD}{from_seconds_to_days(nb, self.user_settings.day.get_number_working_secs())}{RESET_FORMAT}'
@@ -170,8 +319,10 @@ class TimeEntriesReporter:
             return 0
         if time_entry_diff.is_to_delete():
             return 1
-        if time_entry_diff.is_to_add():
+        if time_entry_diff.is_to_update():
             return 2
+        if time_entry_diff.is_to_add():
+            return 3
 
     def get_project_name(self, project_id: str) -> str:
         if project_id is None:
@@ -186,11 +337,23 @@ class TimeEntriesReporter:
         return self.api.get_project_task(project_id, task_id).name
 
     def get_tag_names(self, tag_ids: List[str]) -> List[str]:
-        return [tag.name for tag in self.api.get_tags() if tag_ids.__contains__(tag.id)]
+        return [tag.name for tag in self.api.get_tags_by_ids(tag_ids)]
+
+    def get_time_entry_status(self, time_entry_diff: TimeEntryDiff) -> str:
+        if time_entry_diff.is_to_keep():
+            return 'KEEP'
+        elif time_entry_diff.is_to_update():
+            return 'UPD'
+        elif time_entry_diff.is_to_add():
+            return 'ADD'
+        else:
+            return 'DEL'
 
     def get_time_entry_status_string(self, time_entry_diff: TimeEntryDiff) -> str:
         if time_entry_diff.is_to_keep():
             return f'{BOLD}KEEP{RESET_FORMAT}'
+        elif time_entry_diff.is_to_update():
+            return f'{COLOR_YELLOW}{BOLD}UPD{RESET_FORMAT}'
         elif time_entry_diff.is_to_add():
             return f'{COLOR_GREEN}{BOLD}ADD{RESET_FORMAT}'
         elif time_entry_diff.is_to_delete():
@@ -199,7 +362,7 @@ class TimeEntriesReporter:
             raise Exception('Invalid state, cannot determine the status.')
 
     def get_duration_string(self, day_diff: DayTimeEntriesDiff, report: TimeEntriesCheckReport):
-        hours = from_seconds_to_hours(day_diff.day.get_time_entries_duration_in_secs())
+        hours = from_seconds_to_hours(report.summary.get_day_duration(day_diff.day.day))
         if report.days_duration_errors.__contains__(day_diff.day.day):
             return f'{COLOR_RED}{hours}{RESET_FORMAT}'
         elif report.days_duration_warnings.__contains__(day_diff.day.day):
@@ -0,0 +1,101 @@
+from typing import List, Dict, Tuple, Iterable
+
+from kiss.clockify_api import ClockifyApi
+from kiss.profiler import profiled
+
+TimeEntryNames = Tuple[str, str, Tuple[str, ...]]
+
+
+class ResolvedTimeEntry:
+    project_id: str
+    task_id: str
+    tag_ids: List[str]
+    user_id: str
+    workspace_id: str
+
+    def __init__(self, project_id: str, task_id: str, tag_ids: List[str], user_id: str, workspace_id: str):
+        self.project_id = project_id
+        self.task_id = task_id
+        self.tag_ids = tag_ids
+        self.user_id = user_id
+        self.workspace_id = workspace_id
+
+
+class TimeEntryResolver:
+    """
+    Resolves project, task and tag names to Clockify ids. Every distinct combination of names is resolved only once.
+    """
+    api: ClockifyApi
+    resolved: Dict[TimeEntryNames, ResolvedTimeEntry]
+
+    def __init__(self, api: ClockifyApi):
+        self.api = api
+        self.resolved = {}
+
+    def resolve(self, project_name: str, task_name: str, tag_names: List[str]) -> ResolvedTimeEntry:
+        names = self.get_names(project_name, task_name, tag_names)
+
+        if names not in self.resolved:
+            resolved, errors = self.try_resolve(names)
+
+            if len(errors) > 0:
+                raise Exception(errors[0])
+
+            self.resolved[names] = resolved
+
+        return self.resolved[names]
+
+    @profiled('resolve names')
+    def validate(self, all_names: Iterable[TimeEntryNames]) -> None:
+        """
+        Resolves all the specified names at once, every name that cannot be resolved is reported in the raised
+        exception.
+        """
+        errors = []
+
+        for names in dict.fromkeys(all_names):
+            if names in self.resolved:
+                continue
+
+            resolved, names_errors = self.try_resolve(names)
+
+            if len(names_errors) > 0:
+                errors += [error for error in names_errors if error not in errors]
+            else:
+                self.resolved[names] = resolved
+
+        if len(errors) > 0:
+            raise Exception('Cannot resolve time entries:\n' + '\n'.join([f' - {error}' for error in errors]))
+
+    def try_resolve(self, names: TimeEntryNames) -> Tuple[ResolvedTimeEntry, List[str]]:
+        project_name, task_name, tag_names = names
+        errors = []
+
+        projects = self.api.get_projects_by_name(project_name)
+        if projects.__len__() != 1:
+            errors.append(f'One and only project must match the name [{project_name}], but {projects.__len__()} found.')
+
+        task_id = None
+        if task_name is not None and projects.__len__() == 1:
+            tasks = self.api.get_project_task_by_name(projects[0].id, task_name)
+
+            if tasks.__len__() != 1:
+                errors.append(f'One and only task must match the name [{task_name}] in the project [{project_name}], '
+                              f'but {tasks.__len__()} found.')
+            else:
+                task_id = tasks[0].id
+
+        tags = self.api.get_tags_by_names(tag_names)
+        for missing_tag in sorted(set(tag_names) - set([tag.name for tag in tags])):
+            errors.append(f'There is no tag named [{missing_tag}].')
+
+        if len(errors) > 0:
+            return None, errors
+
+        user = self.api.get_user()
+
+        return ResolvedTimeEntry(projects[0].id, task_id, [tag.id for tag in tags], user.id, user.default_workspace), []
+
+    @staticmethod
+    def get_names(project_name: str, task_name: str, tag_names: List[str]) -> TimeEntryNames:
+        return project_name, task_name, tuple(tag_names)
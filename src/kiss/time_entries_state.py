@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import time
+from datetime import date
+from typing import Dict, List, Iterable
+
+from kiss.clockify_model import ClockifyTimeEntry
+from kiss.time_entries_diff import DaysTimeEntriesDiff, TimeEntriesDiffComputer
+from kiss.time_entries_file import DateInterval
+from kiss.user_settings import CacheSettings, UserSettings
+from kiss.utils import parse_user_date
+
+
+def get_entry_fingerprint(entry: ClockifyTimeEntry) -> str:
+    """
+    Returns the hash of the fingerprint of the time entry, an entry edited in Clockify gets another hash.
+    """
+    return hashlib.sha1(json.dumps(entry.get_fingerprint()).encode('utf-8')).hexdigest()
+
+
+def get_entries_fingerprints(entries: Iterable[ClockifyTimeEntry]) -> Dict[str, str]:
+    return {entry.id: get_entry_fingerprint(entry) for entry in entries}
+
+
+class DayState:
+    inputs_hash: str
+    entries: Dict[str, str]
+    verified_at: float
+
+    def __init__(self, inputs_hash: str, entries: Dict[str, str], verified_at: float):
+        self.inputs_hash = inputs_hash
+        self.entries = entries
+        self.verified_at = verified_at
+
+    def is_fresh(self, ttl: int) -> bool:
+        return (time.time() - self.verified_at) < ttl
+
+    def to_dict(self) -> dict:
+        return {
+            'inputsHash': self.inputs_hash,
+            'entries': self.entries,
+            'verifiedAt': self.verified_at
+        }
+
+    @staticmethod
+    def parse_from_dict(dic: dict):
+        return DayState(dic['inputsHash'], dic['entries'], dic['verifiedAt'])
+
+
+class TimeEntriesState:
+    """
+    State of the last fill of a period, persisted as a JSON file. For every day in sync with Clockify, it keeps the hash
+    of the inputs the day has been generated from and the fingerprints of its Clockify time entries. A day is considered
+    in sync as long as its inputs don't change, its state is fresh (see the time-to-live of the "state" kind), and its
+    time entries in Clockify are still the recorded ones.
+    """
+    file: str
+    settings: CacheSettings
+    days: Dict[date, DayState]
+
+    def __init__(self, file: str, settings: CacheSettings):
+        self.file = file
+        self.settings = settings
+        self.days = None
+
+    def get(self, day: date) -> DayState:
+        return self.load().get(day)
+
+    def is_in_sync(self, day: date, inputs_hash: str, entries: Dict[str, str] = None) -> bool:
+        """
+        Returns whether the day is in sync, the fingerprints of its time entries currently in Clockify are compared
+        with the recorded ones when they're specified.
+        """
+        day_state = self.get(day)
+
+        return day_state is not None and day_state.inputs_hash == inputs_hash \
+            and day_state.is_fresh(self.settings.get_ttl('state')) \
+            and (entries is None or day_state.entries == entries)
+
+    def find_changed_days(self,
+                          days_inputs_hash: Dict[date, str],
+                          existing_entries: Iterable[ClockifyTimeEntry] = None) -> List[date]:
+        """
+        Returns days to fill again: their inputs changed, their state is stale, or, when existing time entries of the
+        period are specified, their time entries have been added, edited or deleted in Clockify since the last fill.
+        Existing time entries are consumed one by one, only their fingerprints are kept.
+        """
+        days_entries = None
+
+        if existing_entries is not None:
+            days_entries = {}
+
+            for existing in existing_entries:
+                days_entries.setdefault(existing.time_interval.as_datetime_interval().from_date.date(), {})[existing.id] \
+                    = get_entry_fingerprint(existing)
+
+        return sorted([
+            day for day, inputs_hash in days_inputs_hash.items()
+            if not self.is_in_sync(day, inputs_hash, days_entries.get(day, {}) if days_entries is not None else None)
+        ])
+
+    def find_days_to_fill(self,
+                          days_inputs_hash: Dict[date, str],
+                          diff_computer: TimeEntriesDiffComputer) -> List[date]:
+        """
+        Returns changed days (see find_changed_days). Days that would be skipped are still compared with Clockify,
+        where their time entries may have changed: only their time entries are fetched, the other days are fetched by
+        the diff.
+        """
+        days = self.find_changed_days(days_inputs_hash)
+        skipped_days = [day for day in days_inputs_hash.keys() if day not in days]
+
+        if len(skipped_days) == 0:
+            return days
+
+        return self.find_changed_days(days_inputs_hash,
+                                      diff_computer.iter_existing_entries(DateInterval.from_days(skipped_days)))
+
+    def record(self, day: date, inputs_hash: str, entries: Iterable[ClockifyTimeEntry]) -> None:
+        self.load()[day] = DayState(inputs_hash, get_entries_fingerprints(entries), time.time())
+
+    def forget(self, day: date) -> None:
+        self.load().pop(day, None)
+
+    def record_diff(self, diff: DaysTimeEntriesDiff, days_inputs_hash: Dict[date, str]) -> None:
+        """
+        Records days of the diff that are now in sync with Clockify, the other ones are forgotten.
+        """
+        for day_diff in diff.days:
+            if day_diff.is_in_sync():
+                self.record(day_diff.day.day, days_inputs_hash[day_diff.day.day], day_diff.get_entries())
+            else:
+                self.forget(day_diff.day.day)
+
+        self.save()
+
+    def load(self) -> Dict[date, DayState]:
+        if self.days is not None:
+            return self.days
+
+        self.days = {}
+
+        try:
+            with open(self.file) as state_file:
+                for day, day_state in json.load(state_file).items():
+                    self.days[parse_user_date(day)] = DayState.parse_from_dict(day_state)
+        except Exception:
+            # a missing or corrupted state only means that all the days are filled again
+            self.days = {}
+
+        return self.days
+
+    def save(self) -> None:
+        if not self.settings.enabled:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+
+            temp_file = f'{self.file}.{os.getpid()}.tmp'
+            with open(temp_file, 'w') as state_file:
+                json.dump({day.isoformat(): day_state.to_dict() for day, day_state in self.load().items()}, state_file)
+
+            os.replace(temp_file, self.file)
+        except (IOError, OSError):
+            pass
+
+    @staticmethod
+    def create(user_settings: UserSettings, from_date: date, to_date: date):
+        settings = user_settings.cache
+
+        return TimeEntriesState(
+            os.path.join(settings.get_directory(), 'state', user_settings.get_token_hash(),
+                         f'{from_date.isoformat()}_{to_date.isoformat()}.json'),
+            settings
+        )
@@ -0,0 +1,50 @@
+import calendar
+import time
+from datetime import datetime, timezone, tzinfo
+from functools import lru_cache
+
+# datetime.fromisoformat is only available since Python 3.7
+HAS_FROM_ISO_FORMAT = hasattr(datetime, 'fromisoformat')
+
+ZULU_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+@lru_cache(maxsize=1)
+def get_local_zone() -> tzinfo:
+    """
+    Returns the local time zone, looked up once per process. tzlocal is imported on first use, since it is slow to
+    import.
+    """
+    import tzlocal
+
+    return tzlocal.get_localzone()
+
+
+def parse_zulu(datetime_string: str) -> datetime:
+    """
+    Parses a Clockify UTC date time (eg. "2019-04-16T05:15:32Z") as a naive datetime.
+    """
+    if HAS_FROM_ISO_FORMAT and len(datetime_string) == 20 and datetime_string[-1] == 'Z':
+        return datetime.fromisoformat(datetime_string[:-1])
+
+    return datetime.strptime(datetime_string, ZULU_FORMAT)
+
+
+def from_zulu_to_epoch(datetime_string: str) -> int:
+    return calendar.timegm(parse_zulu(datetime_string).utctimetuple())
+
+
+def from_epoch_to_zulu(epoch: int) -> str:
+    return '%04d-%02d-%02dT%02d:%02d:%02dZ' % time.gmtime(epoch)[:6]
+
+
+def from_datetime_to_epoch(moment: datetime) -> int:
+    return int(moment.timestamp())
+
+
+def from_epoch_to_local(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, get_local_zone())
+
+
+def from_utc_to_local(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc).astimezone(get_local_zone())
@@ -1,6 +1,8 @@
+import hashlib
 import json
+import os
 from datetime import time, timedelta, datetime, date
-from typing import List
+from typing import List, Dict, Optional
 
 from kiss.utils import parse_user_time
 
@@ -48,17 +50,155 @@ class DaySettings:
         return DaySettings(parse_user_time(dic['startAt']), parse_user_time(dic['endAt']))
 
 
+class HttpSettings:
+    pool_size: int
+    max_retries: int
+    backoff_factor: float
+    max_backoff: float
+    requests_per_second: float
+    page_size: int
+    endpoint: str
+    max_page_size: Optional[int]
+
+    DEFAULT_ENDPOINT = 'https://api.clockify.me/api/v1/'
+
+    # largest page returned by Clockify, whatever the requested page size
+    CLOCKIFY_MAX_PAGE_SIZE = 5000
+
+    # Clockify documents a limit of 50 requests per second
+    def __init__(self,
+                 pool_size: int = 10,
+                 max_retries: int = 5,
+                 backoff_factor: float = 0.5,
+                 max_backoff: float = 30,
+                 requests_per_second: float = 50,
+                 page_size: int = 200,
+                 endpoint: str = DEFAULT_ENDPOINT,
+                 max_page_size: int = None):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.requests_per_second = requests_per_second
+        self.page_size = page_size
+        self.endpoint = endpoint if endpoint.endswith('/') else endpoint + '/'
+        self.max_page_size = max_page_size
+
+    def is_default_endpoint(self) -> bool:
+        return self.endpoint == HttpSettings.DEFAULT_ENDPOINT
+
+    def get_max_page_size(self) -> Optional[int]:
+        """
+        Returns the largest page returned by the endpoint, None if it's unknown (another endpoint than Clockify without
+        maxPageSize).
+        """
+        if self.max_page_size is not None:
+            return self.max_page_size
+        elif self.is_default_endpoint():
+            return HttpSettings.CLOCKIFY_MAX_PAGE_SIZE
+        else:
+            return None
+
+    @staticmethod
+    def parse_from_dict(dic: dict):
+        default = HttpSettings()
+
+        return HttpSettings(
+            dic.get('poolSize', default.pool_size),
+            dic.get('maxRetries', default.max_retries),
+            dic.get('backoffFactor', default.backoff_factor),
+            dic.get('maxBackoff', default.max_backoff),
+            dic.get('requestsPerSecond', default.requests_per_second),
+            dic.get('pageSize', default.page_size),
+            dic.get('endpoint', default.endpoint),
+            dic.get('maxPageSize', default.max_page_size)
+        )
+
+
+class CacheSettings:
+    enabled: bool
+    directory: str
+    ttls: Dict[str, int]
+    memory_size: int
+    memory_ttl: int
+
+    # time-to-live in seconds of every kind of cached element
+    DEFAULT_TTLS = {
+        'user': 24 * 3600,
+        'workspaces': 24 * 3600,
+        'projects': 3600,
+        'tasks': 3600,
+        'tags': 3600,
+        'state': 24 * 3600
+    }
+
+    def __init__(self,
+                 enabled: bool = True,
+                 directory: str = None,
+                 ttls: Dict[str, int] = None,
+                 memory_size: int = 256,
+                 memory_ttl: int = 600):
+        self.enabled = enabled
+        self.directory = directory
+        self.ttls = dict(CacheSettings.DEFAULT_TTLS)
+        self.memory_size = memory_size
+        self.memory_ttl = memory_ttl
+
+        if ttls is not None:
+            self.ttls.update(ttls)
+
+    def get_ttl(self, kind: str) -> int:
+        return self.ttls.get(kind, 0)
+
+    def get_directory(self) -> str:
+        if self.directory is not None:
+            return os.path.expanduser(self.directory)
+
+        return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'clockify-kiss')
+
+    @staticmethod
+    def parse_from_dict(dic: dict):
+        default = CacheSettings()
+
+        return CacheSettings(
+            dic.get('enabled', default.enabled),
+            dic.get('directory', default.directory),
+            dic.get('ttl'),
+            dic.get('memorySize', default.memory_size),
+            dic.get('memoryTtl', default.memory_ttl)
+        )
+
+
 class UserSettings:
     token: str
     public_holiday: TaskSettings
     personal_holiday: TaskSettings
     day: DaySettings
-
-    def __init__(self, token: str, public_holiday: TaskSettings, personal_holiday: TaskSettings, day: DaySettings):
+    http: HttpSettings
+    cache: CacheSettings
+
+    def __init__(self,
+                 token: str,
+                 public_holiday: TaskSettings,
+                 personal_holiday: TaskSettings,
+                 day: DaySettings,
+                 http: HttpSettings = None,
+                 cache: CacheSettings = None):
         self.token = token
         self.public_holiday = public_holiday
         self.personal_holiday = personal_holiday
         self.day = day
+        self.http = http if http is not None else HttpSettings()
+        self.cache = cache if cache is not None else CacheSettings()
+
+    def get_token_hash(self) -> str:
+        """
+        Identifies the account of the token, the token itself must never be written on the disk. Accounts of another
+        endpoint (eg. the fake server) are distinct, so that they don't share cached elements with Clockify.
+        """
+        account = self.token if self.http.is_default_endpoint() else f'{self.http.endpoint} {self.token}'
+
+        return hashlib.sha256(account.encode('utf-8')).hexdigest()[:16]
 
     @staticmethod
     def load_user_settings(file_content):
@@ -68,5 +208,7 @@ class UserSettings:
             dic['token'],
             TaskSettings.parse_from_dict(dic['publicHoliday']),
             TaskSettings.parse_from_dict(dic['personalHoliday']),
-            DaySettings.parse_from_dict(dic['day'])
+            DaySettings.parse_from_dict(dic['day']),
+            HttpSettings.parse_from_dict(dic.get('http', {})),
+            CacheSettings.parse_from_dict(dic.get('cache', {}))
         )
@@ -1,7 +1,6 @@
 from datetime import datetime, time, timezone, date, timedelta
 
-import pytz
-import tzlocal
+from kiss.timestamps import parse_zulu, from_utc_to_local
 
 COLOR_GREEN = '\033[92m'
 RESET_FORMAT = '\033[0m'
@@ -32,7 +31,7 @@ def parse_user_datetime(datetime_string: str) -> datetime:
 
 
 def parse_z_datetime(datetime_string: str) -> datetime:
-    return datetime.strptime(datetime_string, '%Y-%m-%dT%H:%M:%SZ')
+    return parse_zulu(datetime_string)
 
 
 def from_datetime_to_zulu_string(day: datetime) -> str:
@@ -48,7 +47,7 @@ def set_date_at_time(day: date, at_time: time) -> datetime:
 
 
 def from_z_datetime_to_local(day: datetime) -> datetime:
-    return day.replace(tzinfo=pytz.utc).astimezone(tzlocal.get_localzone())
+    return from_utc_to_local(day)
 
 
 def from_seconds_to_hours(seconds: int) -> str:
@@ -0,0 +1,85 @@
+import json
+
+from kiss.clockify_api import ClockifyApi
+from kiss.fake_server import FakeClockifyServer, FakeClockifySettings, FakeClockifyState
+from kiss.user_settings import UserSettings
+
+TOKEN = 'XXXX'
+
+TIME_ENTRIES_ROUTE = 'GET workspaces/{workspace}/user/{user_id}/time-entries'
+TAGS_ROUTE = 'GET workspaces/{workspace}/tags/'
+
+
+def create_state(nb_time_entries: int, nb_tags: int = 0) -> FakeClockifyState:
+    state = FakeClockifyState()
+    user = state.get_user(TOKEN)
+
+    for position in range(nb_time_entries):
+        state.save_time_entry(state.get_default_workspace(), user['id'],
+                              {'description': f'entry {position}',
+                               'start': f'2020-01-{position + 1:02}T08:00:00Z',
+                               'end': f'2020-01-{position + 1:02}T16:00:00Z'})
+
+    for position in range(nb_tags):
+        state.add_tag(state.get_default_workspace(), {'name': f'tag {position}'})
+
+    return state
+
+
+def create_api(server: FakeClockifyServer, page_size: int, max_page_size: int = None) -> ClockifyApi:
+    http = {'endpoint': server.get_endpoint(), 'pageSize': page_size}
+
+    if max_page_size is not None:
+        http['maxPageSize'] = max_page_size
+
+    return ClockifyApi(UserSettings.load_user_settings(json.dumps({
+        'token': TOKEN,
+        'publicHoliday': {'project': 'ALL_Absence', 'task': 'Public Holiday', 'description': 'OFF', 'tags': []},
+        'personalHoliday': {'project': 'ALL_Absence', 'task': 'Vacations', 'description': 'OFF', 'tags': []},
+        'day': {'startAt': '08:00:00', 'endAt': '16:00:00'},
+        'http': http,
+        'cache': {'enabled': False}
+    })))
+
+
+def test_exact_multiple_of_the_page_size():
+    with FakeClockifyServer(create_state(6)) as server:
+        api = create_api(server, page_size=3, max_page_size=5000)
+
+        time_entries = list(api.iter_time_entries())
+
+        # the last page is full, only an empty page tells that there is nothing more
+        assert len(time_entries) == 6
+        assert len({time_entry.id for time_entry in time_entries}) == 6
+        assert server.stats.requests[TIME_ENTRIES_ROUTE] == 3
+
+
+def test_short_last_page():
+    with FakeClockifyServer(create_state(7)) as server:
+        api = create_api(server, page_size=3, max_page_size=5000)
+
+        assert len(list(api.iter_time_entries())) == 7
+        assert server.stats.requests[TIME_ENTRIES_ROUTE] == 3
+
+
+def test_known_max_page_size_below_the_page_size():
+    with FakeClockifyServer(create_state(7, nb_tags=5), FakeClockifySettings(max_page_size=2)) as server:
+        api = create_api(server, page_size=3, max_page_size=2)
+
+        assert api.page_size == 2
+        assert len(list(api.iter_time_entries())) == 7
+        assert server.stats.requests[TIME_ENTRIES_ROUTE] == 4
+        assert len(api.get_tags()) == 5
+
+
+def test_unknown_max_page_size_below_the_page_size():
+    with FakeClockifyServer(create_state(7, nb_tags=5), FakeClockifySettings(max_page_size=2)) as server:
+        api = create_api(server, page_size=3)
+
+        # pages are shorter than requested, so every page is fetched until an empty one
+        time_entries = list(api.iter_time_entries())
+
+        assert len(time_entries) == 7
+        assert len({time_entry.id for time_entry in time_entries}) == 7
+        assert server.stats.requests[TIME_ENTRIES_ROUTE] == 5
+        assert len(api.get_tags()) == 5
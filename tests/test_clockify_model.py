@@ -0,0 +1,63 @@
+import json
+from datetime import datetime
+
+from kiss import default_serializer
+from kiss.clockify_model import ClockifyTimeEntry
+from kiss.timestamps import get_local_zone
+
+RUNNING_ENTRY = {
+    'id': '5e1c3a5d7a1b2c3d4e5f6d00',
+    'description': 'Sprint review',
+    'projectId': '5e1c3a5d7a1b2c3d4e5f6c00',
+    'tagIds': None,
+    'taskId': None,
+    'timeInterval': {'start': '2020-01-01T10:00:00Z', 'end': None},
+    'workspaceId': '5e1c3a5d7a1b2c3d4e5f6a00',
+    'userId': '5e1c3a5d7a1b2c3d4e5f6b00'
+}
+
+
+def test_map_running_entry():
+    entry = ClockifyTimeEntry.map(RUNNING_ENTRY)
+
+    assert entry.time_interval.is_running()
+    assert entry.time_interval.end_at is None
+    assert entry.time_interval.start == '2020-01-01T10:00:00Z'
+    assert entry.time_interval.end is None
+
+
+def test_running_entry_to_json():
+    entry = ClockifyTimeEntry.map(RUNNING_ENTRY)
+
+    serialized = json.loads(json.dumps(entry, default=default_serializer))
+
+    assert serialized['time_interval'] == {'start': '2020-01-01T10:00:00Z', 'end': None}
+
+
+def test_running_entry_fingerprint():
+    entry = ClockifyTimeEntry.map(RUNNING_ENTRY)
+
+    fingerprint = entry.get_fingerprint()
+
+    assert fingerprint[5:7] == (1577872800, None)
+    assert hash(fingerprint) == hash(ClockifyTimeEntry.map(RUNNING_ENTRY).get_fingerprint())
+
+
+def test_running_entry_ends_now():
+    entry = ClockifyTimeEntry.map(RUNNING_ENTRY)
+
+    before = datetime.now(get_local_zone())
+    interval = entry.time_interval.as_datetime_interval()
+    after = datetime.now(get_local_zone())
+
+    assert interval.from_date.timestamp() == 1577872800
+    assert before <= interval.to_date <= after
+
+
+def test_map_ended_entry():
+    entry = ClockifyTimeEntry.map(dict(RUNNING_ENTRY, timeInterval={'start': '2020-01-01T10:00:00Z',
+                                                                    'end': '2020-01-01T12:00:00Z'}))
+
+    assert not entry.time_interval.is_running()
+    assert entry.time_interval.end == '2020-01-01T12:00:00Z'
+    assert entry.time_interval.as_datetime_interval().to_date.timestamp() == 1577880000
@@ -0,0 +1,77 @@
+from datetime import date, datetime
+
+from kiss.clockify_model import ClockifyTimeEntry, ClockifyTimeInterval, ClockifyTimeNewEntry
+from kiss.time_entries_checker import TimeEntriesChecker, TimeEntriesCheckOption, TimeEntriesCheckReport
+from kiss.time_entries_diff import DaysTimeEntriesDiff
+from kiss.time_entries_file import DateInterval, DateTimeInterval
+from kiss.time_entries_generator import GeneratedDaysTimeEntries, GeneratedTimeEntry
+
+DAY = date(2020, 1, 2)
+
+
+def at(hour: int) -> datetime:
+    return datetime(DAY.year, DAY.month, DAY.day, hour)
+
+
+def create_diff(generated, existing=()) -> DaysTimeEntriesDiff:
+    """
+    Generates a time entry for every (from hour, to hour), existing entries are in another project.
+    """
+    days = GeneratedDaysTimeEntries(DateInterval(DAY, DAY))
+
+    for position, (from_hour, to_hour) in enumerate(generated):
+        clockify_entry = ClockifyTimeNewEntry(f'g{position}', 'TASK', 'p1', 'u1', None, [],
+                                              ClockifyTimeInterval.from_datetimes(at(from_hour), at(to_hour)), 'ws1')
+        days.get_or_create(DAY).add_time_entry(
+            GeneratedTimeEntry('p1', None, 'TASK', DateTimeInterval(at(from_hour), at(to_hour)), [], clockify_entry))
+
+    diff = DaysTimeEntriesDiff(days)
+
+    for position, (from_hour, to_hour) in enumerate(existing):
+        diff.add_existing_entry(ClockifyTimeEntry(f'e{position}', 'TASK', 'p2', [], None,
+                                                  ClockifyTimeInterval.from_datetimes(at(from_hour), at(to_hour)),
+                                                  'ws1', 'u1'))
+
+    return diff
+
+
+def check_no_overlap(diff: DaysTimeEntriesDiff) -> TimeEntriesCheckReport:
+    report = TimeEntriesCheckReport()
+    TimeEntriesChecker(None, TimeEntriesCheckOption()).check_no_overlap(diff, report)
+
+    return report
+
+
+def test_touching_intervals_dont_overlap():
+    assert not DateTimeInterval(at(8), at(10)).overlap(DateTimeInterval(at(10), at(12)))
+    assert not DateTimeInterval(at(10), at(12)).overlap(DateTimeInterval(at(8), at(10)))
+
+    assert len(check_no_overlap(create_diff([(8, 10), (10, 12)])).errors) == 0
+
+
+def test_partially_overlapping_intervals_overlap():
+    assert DateTimeInterval(at(8), at(11)).overlap(DateTimeInterval(at(10), at(12)))
+    assert DateTimeInterval(at(10), at(12)).overlap(DateTimeInterval(at(8), at(11)))
+
+    report = check_no_overlap(create_diff([(8, 11), (10, 12)]))
+
+    assert len(report.errors) == 1
+    assert len(report.time_entry_errors) == 2
+
+
+def test_nested_intervals_overlap():
+    assert DateTimeInterval(at(8), at(16)).overlap(DateTimeInterval(at(10), at(11)))
+    assert DateTimeInterval(at(10), at(11)).overlap(DateTimeInterval(at(8), at(16)))
+
+    # the long entry overlaps both short ones, which don't overlap each other
+    report = check_no_overlap(create_diff([(8, 16), (9, 10), (11, 12)]))
+
+    assert len(report.errors) == 2
+    assert all(['added time entry' in error for error in report.errors])
+
+
+def test_deleted_entries_are_ignored():
+    diff = create_diff([(8, 12)], existing=[(9, 10)])
+
+    assert any([time_entry.time_entry is None for time_entry in diff.get_time_entries()])
+    assert len(check_no_overlap(diff).errors) == 0
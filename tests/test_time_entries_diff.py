@@ -0,0 +1,133 @@
+from datetime import date, datetime
+
+from kiss.clockify_model import ClockifyTimeEntry, ClockifyTimeInterval, ClockifyTimeNewEntry
+from kiss.time_entries_diff import DaysTimeEntriesDiff, TimeEntriesDiffComputer
+from kiss.time_entries_file import DateInterval, DateTimeInterval
+from kiss.time_entries_generator import GeneratedDaysTimeEntries, GeneratedTimeEntry
+
+WORKSPACE = 'ws1'
+USER = 'u1'
+PROJECT = 'p1'
+OTHER_PROJECT = 'p2'
+
+DAY = date(2020, 1, 2)
+OTHER_DAY = date(2020, 1, 3)
+
+
+class FakeApi:
+    """
+    Records the changes applied, deletions of the specified ids fail.
+    """
+
+    def __init__(self, failing_deletions=()):
+        self.failing_deletions = failing_deletions
+        self.calls = []
+
+    def delete_time_entry(self, time_entry_id: str, workspace_id: str = None):
+        self.calls.append(('delete', time_entry_id))
+
+        if time_entry_id in self.failing_deletions:
+            raise Exception('Server error')
+
+    def update_time_entry(self, time_entry_id: str, time_entry: ClockifyTimeNewEntry):
+        self.calls.append(('update', time_entry_id))
+
+        return create_existing_entry(time_entry_id, time_entry.project_id, time_entry.time_interval)
+
+    def add_time_entry(self, time_entry: ClockifyTimeNewEntry):
+        self.calls.append(('add', time_entry.id))
+
+        return create_existing_entry(time_entry.id, time_entry.project_id, time_entry.time_interval)
+
+
+def create_interval(day: date, from_hour: int, to_hour: int) -> ClockifyTimeInterval:
+    return ClockifyTimeInterval.from_datetimes(datetime(day.year, day.month, day.day, from_hour),
+                                               datetime(day.year, day.month, day.day, to_hour))
+
+
+def create_existing_entry(id: str, project: str, time_interval: ClockifyTimeInterval) -> ClockifyTimeEntry:
+    return ClockifyTimeEntry(id, 'TASK', project, [], None, time_interval, WORKSPACE, USER)
+
+
+def create_days(*entries) -> GeneratedDaysTimeEntries:
+    """
+    Generates a time entry for every (id, project, day, from hour, to hour).
+    """
+    days = GeneratedDaysTimeEntries(DateInterval(DAY, OTHER_DAY))
+
+    for id, project, day, from_hour, to_hour in entries:
+        interval = DateTimeInterval(datetime(day.year, day.month, day.day, from_hour),
+                                    datetime(day.year, day.month, day.day, to_hour))
+        clockify_entry = ClockifyTimeNewEntry(id, 'TASK', project, USER, None, [],
+                                              create_interval(day, from_hour, to_hour), WORKSPACE)
+
+        days.get_or_create(day).add_time_entry(GeneratedTimeEntry(project, None, 'TASK', interval, [], clockify_entry))
+
+    return days
+
+
+def compute_diff(days: GeneratedDaysTimeEntries, existing_entries) -> DaysTimeEntriesDiff:
+    diff = DaysTimeEntriesDiff(days)
+
+    for existing in existing_entries:
+        diff.add_existing_entry(existing)
+
+    diff.pair_near_matches()
+
+    return diff
+
+
+def test_exact_match_is_kept():
+    diff = compute_diff(create_days(('g1', PROJECT, DAY, 8, 12)),
+                        [create_existing_entry('e1', PROJECT, create_interval(DAY, 8, 12))])
+
+    time_entries = diff.get_time_entries()
+
+    assert len(time_entries) == 1
+    assert time_entries[0].is_to_keep()
+    assert time_entries[0].matching_entry.id == 'e1'
+    assert diff.get_nb_changes() == 0
+
+
+def test_near_match_is_updated():
+    diff = compute_diff(create_days(('g1', PROJECT, DAY, 8, 12)),
+                        [create_existing_entry('e1', OTHER_PROJECT, create_interval(DAY, 8, 12))])
+
+    time_entries = diff.get_time_entries()
+
+    assert len(time_entries) == 1
+    assert time_entries[0].is_to_update()
+    assert time_entries[0].matching_entry.id == 'e1'
+    assert time_entries[0].time_entry.clockify_entry.id == 'g1'
+    assert diff.get_nb_changes() == 1
+
+
+def test_near_candidates_beyond_the_targets_are_deleted():
+    diff = compute_diff(create_days(('g1', PROJECT, DAY, 8, 12)),
+                        [create_existing_entry('e1', OTHER_PROJECT, create_interval(DAY, 8, 12)),
+                         create_existing_entry('e2', OTHER_PROJECT, create_interval(DAY, 8, 12))])
+
+    updated = [time_entry for time_entry in diff.get_time_entries() if time_entry.is_to_update()]
+    deleted = [time_entry for time_entry in diff.get_time_entries() if time_entry.is_to_delete()]
+
+    assert [time_entry.matching_entry.id for time_entry in updated] == ['e1']
+    assert [time_entry.matching_entry.id for time_entry in deleted] == ['e2']
+    assert len([time_entry for time_entry in diff.get_time_entries() if time_entry.is_to_add()]) == 0
+
+
+def test_failed_deletion_blocks_changes_of_its_day():
+    diff = compute_diff(create_days(('g1', PROJECT, DAY, 8, 12),
+                                    ('g2', PROJECT, DAY, 13, 16),
+                                    ('g3', PROJECT, OTHER_DAY, 8, 12)),
+                        [create_existing_entry('e1', OTHER_PROJECT, create_interval(DAY, 8, 12)),
+                         create_existing_entry('e2', PROJECT, create_interval(DAY, 12, 13))])
+    api = FakeApi(failing_deletions=['e2'])
+
+    report = TimeEntriesDiffComputer(api, None, parallelism=1).apply(diff)
+
+    # the update and the addition of the day are skipped, the addition of the other day is applied
+    assert api.calls == [('delete', 'e2'), ('add', 'g3')]
+    assert not report.is_successful()
+    assert len(report.failures) == 3
+    assert len([failure for failure in report.failures if 'could not be deleted' in str(failure.error)]) == 2
+    assert [time_entry.time_entry.clockify_entry.id for time_entry in report.applied] == ['g3']
@@ -0,0 +1,66 @@
+import json
+from datetime import date, datetime
+
+from kiss.time_entries_file import DateTimeInterval
+from kiss.time_entries_generator import GeneratedDayTimeEntries, GeneratedTimeEntry, TimeEntriesGenerator
+from kiss.user_settings import UserSettings
+
+DAY = date(2020, 1, 2)
+
+SETTINGS = {
+    'token': 'XXXX',
+    'publicHoliday': {'project': 'ALL_Absence', 'task': 'Public Holiday', 'description': 'OFF', 'tags': []},
+    'personalHoliday': {'project': 'ALL_Absence', 'task': 'Vacations', 'description': 'OFF', 'tags': []},
+    'day': {'startAt': '08:00:00', 'endAt': '16:00:00'}
+}
+
+
+def at(hour: int, minute: int = 0) -> datetime:
+    return datetime(DAY.year, DAY.month, DAY.day, hour, minute)
+
+
+def create_day(*intervals) -> GeneratedDayTimeEntries:
+    day = GeneratedDayTimeEntries(DAY)
+
+    for from_hour, to_hour in intervals:
+        day.add_time_entry(GeneratedTimeEntry('p1', None, 'TASK', DateTimeInterval(at(from_hour), at(to_hour)), [], None))
+
+    return day
+
+
+def as_hours(intervals):
+    return [(interval.from_date.hour, interval.to_date.hour) for interval in intervals]
+
+
+def test_entries_are_inserted_sorted():
+    day = create_day((13, 16), (8, 10), (10, 12), (8, 9))
+
+    assert as_hours([time_entry.interval for time_entry in day.time_entries]) == [(8, 9), (8, 10), (10, 12), (13, 16)]
+    assert day.get_time_entries_duration_in_secs() == (1 + 2 + 2 + 3) * 3600
+    assert day.find_time_entry_closest_to(at(9)).interval.from_date == at(10)
+    assert day.find_time_entry_closest_to(at(17)) is None
+
+
+def test_gaps_are_clipped_to_the_working_day():
+    day = create_day((7, 9), (15, 17))
+
+    assert as_hours(day.find_gaps(at(8), at(16))) == [(9, 15)]
+
+
+def test_entries_outside_the_working_day_leave_it_empty():
+    day = create_day((6, 7), (17, 18))
+
+    assert as_hours(day.find_gaps(at(8), at(16))) == [(8, 16)]
+
+
+def test_nested_entries_dont_open_gaps():
+    day = create_day((9, 14), (10, 11), (12, 13))
+
+    assert as_hours(day.find_gaps(at(8), at(16))) == [(8, 9), (14, 16)]
+
+
+def test_covered_day_has_no_missing_interval():
+    generator = TimeEntriesGenerator(None, None, UserSettings.load_user_settings(json.dumps(SETTINGS)))
+
+    assert generator.find_missing_interval(create_day((8, 12), (11, 16))) == []
+    assert as_hours(generator.find_missing_interval(create_day((8, 12), (13, 16)))) == [(12, 13)]